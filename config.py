@@ -6,10 +6,19 @@ all configurations required for consistent and maintainable transaction processi
 such as column mappings, file naming conventions, category translations, and timezone settings.
 
 Constants:
+    - LOG_LEVEL (int): Level of the application loggers.
+    - LOG_FORMAT (str): "text" for tab-separated log lines, "json" for one JSON object per record.
+    - LOG_MAX_PAYLOAD (int): Messages longer than this are truncated; logged lists and dicts are shortened.
+    - LOG_SAMPLE_EVERY (int): Per-row events are logged once every this many occurrences.
     - DATE_FILTER (str): Sets the starting date for filtering transactions in the format "YYYY-MM-DD".
+    - SETTINGS_FILE (str): TOML file overriding the deployment settings, read from the working directory.
+    - SETTINGS_ENV_PREFIX (str): Prefix of the environment variables overriding settings, e.g. BUDGET_SYNC_DATE_FILTER.
+    - BATCH_PARALLELISM (int): Number of profiles the `batch` command syncs at once.
     - COLUMN_MAPPING (dict): Maps database column names to their corresponding export CSV column names for clarity.
     - COLUMN_ORDER (list): Defines the desired order of columns in the export CSV based on the mapped column names.
+    - HOUSEHOLD_COLUMN_ORDER (list): Columns of the CSV files of household and imported rows: COLUMN_ORDER, then the person.
     - CATEGORY_MAPPING (dict): Maps category foreign keys (`category_fk`) to human-readable category labels for better interpretation.
+    - CATEGORY_ALIASES (dict): Maps Cashew category names (case-insensitive) to export categories; other names become "inne".
     - DB_FILE_PREFIX (str): Prefix that database `.sql` files must start with to be identified during file processing.
     - DB_FILE_SUFFIX (str): File extension for database files (typically "sql") used in file filtering.
     - SQL_FILE_NAME_REGEX (str): Regular expression pattern for matching database file names based on specific conventions.
@@ -17,6 +26,30 @@ Constants:
     - NEW_TRANSACTION_FILE (str): Name of the CSV file where new transaction data is exported.
     - TRANSACTION_HISTORY_FILE (str): Name of the file that consolidates historical transaction data across exports.
     - PREVIOUS_TRANSACTION_HISTORY_FILE (str): Name of the backup file for transaction history prior to updates or deletions.
+    - HISTORY_COMPRESSION (str): Compression of the history and backup files: "" (plain), "gzip" or "zstd" (needs `zstandard`).
+    - MIRROR_FILE (str): Name of the SQLite mirror of exported transactions (`--mirror`, `query`).
+    - CHECKPOINT_FILE (str): Name of the progress of a Google Sheets backfill (`--checkpoint`), per spreadsheet; its
+      planned IDs are kept next to it with a `.plan` suffix.
+    - RUN_LOCK_FILE (str): Lock file keeping overlapping syncs from writing the same output directory at once.
+    - SHEET_LOCK_FILE (str): Lock file, in the system temporary directory, of the syncs of one spreadsheet.
+    - SUMMARY_FILE (str): Name of the CSV file holding monthly totals by category and person.
+    - SUMMARY_COLUMNS (list): Header of the summary CSV file and tab.
+    - SUMMARY_MARK_LABEL (str): First cell of the last summary row, which holds the high-water mark of the rows it covers.
+    - PARTITION_FILE_NAME (str): Name template of the per-partition CSV files written by partitioned exports.
+    - PARTITION_PERIOD (str): Default period ("day", "month" or "year") used to partition exports.
+    - PIPELINE_BATCH_SIZE (int): Number of database rows read, filtered and mapped together by the row pipeline.
+    - SNAPSHOT_DIFF_FILE (str): CSV file the changes between two backups are written to by `diff --snapshot`.
+    - SNAPSHOT_DIFF_COLUMNS (list): Header of the snapshot diff: the change, the transaction and its previous values.
+    - SNAPSHOT_DIFF_TAB (str): Google Sheets tab the changes between two backups are appended to.
+    - SHEET_TAB_NAME (str): Name template of the Google Sheets tabs transactions are routed to by date.
+    - SHEET_TAB_CELLS (str): Cell range, without the tab name, holding transactions in every routed tab.
+    - SHEET_FINGERPRINT_COLUMN (str): Sheet column storing each row's content fingerprint for change detection.
+    - SHEET_INDEX_TAB (str): Name template of the hidden tab indexing the IDs of a transaction tab (`--sheet-index`).
+    - SHEET_INDEX_BUCKETS (int): Number of hash buckets (rows) of an ID index tab.
+    - SHEET_INDEX_MAX_LOOKUP (int): Largest number of index buckets read one by one instead of reading the whole index.
+    - SHEET_READ_CHUNK_ROWS (int): Number of ID column rows read per request when a memory budget is set.
+    - SUMMARY_TAB_NAME (str): Google Sheets tab holding the monthly totals.
+    - SUMMARY_TAB_CELLS (str): Cell range of the summary, header row included, within its tab.
 
 Usage:
     Import this module to access configuration constants for database interaction,
@@ -27,6 +60,9 @@ import logging
 from src.utils.enums import Categories
 
 LOG_LEVEL = logging.ERROR
+LOG_FORMAT: str = "text"  # "json" writes one JSON object per record
+LOG_MAX_PAYLOAD: int = 2000  # Longest logged message, in characters
+LOG_SAMPLE_EVERY: int = 1000  # Only every n-th per-row event (e.g. a skipped row) is logged
 
 # Constants for file lookup
 DB_FILE_PREFIX: str = "cashew"  # Prefix for database `.sql` files
@@ -48,10 +84,29 @@ CSV_DELIMITER = "\t"
 NEW_TRANSACTION_FILE: str = "transactions.csv"
 TRANSACTION_HISTORY_FILE: str = "transactions_history.csv"
 PREVIOUS_TRANSACTION_HISTORY_FILE: str = "previous_transactions_history.csv"
+HISTORY_COMPRESSION: str = ""  # "gzip" stores the history as transactions_history.csv.gz
+MIRROR_FILE: str = "transactions_mirror.sqlite"
+CHECKPOINT_FILE: str = "sheets_checkpoint_{spreadsheet_id}.json"
+RUN_LOCK_FILE: str = ".budget_sync.lock"
+SHEET_LOCK_FILE: str = "budget_sync_{spreadsheet_id}.lock"  # Shared by every output directory syncing the sheet
+SUMMARY_FILE: str = "transactions_summary.csv"
+SUMMARY_COLUMNS = ['miesiąc', 'kategoria', 'kto', 'suma', 'liczba']
+SUMMARY_MARK_LABEL = '#pokrycie'  # Followed by the history size in bytes (CSV) or the number of sheet IDs (tab)
+PARTITION_FILE_NAME: str = "transactions_{period}.csv"  # {period} is replaced by e.g. "2025-01"
+PARTITION_PERIOD: str = "month"
+PIPELINE_BATCH_SIZE: int = 1000
+SNAPSHOT_DIFF_FILE: str = "transactions_changes.csv"
+SNAPSHOT_DIFF_COLUMNS = ['zmiana', 'id', 'opis', 'kwota', 'kategoria', 'data',
+                         'poprzedni_opis', 'poprzednia_kwota', 'poprzednia_kategoria', 'poprzednia_data']
 
 # Constants for the configuration
 DATE_FILTER: str = '2025-01-01'
 
+# Settings file and environment variables overriding the deployment settings (see src/utils/settings.py)
+SETTINGS_FILE: str = "budget_sync.toml"
+SETTINGS_ENV_PREFIX: str = "BUDGET_SYNC_"
+BATCH_PARALLELISM: int = 4  # Profiles synced at once by `main.py batch`
+
 # Define the timezone for the project
 TIMEZONE: str = "Europe/Warsaw"
 
@@ -66,14 +121,29 @@ COLUMN_MAPPING = {
 
 # Desired column order for the export (mapped names)
 COLUMN_ORDER = ['id', 'opis', 'kwota', 'kategoria', 'data']
+# Household and imported rows carry the person after the exported columns
+HOUSEHOLD_COLUMN_ORDER = COLUMN_ORDER + ['kto']
 CATEGORIES = Categories.get()
 
+# Cashew category names exported as one of CATEGORIES; unlisted names are exported as "inne" (see the README)
+CATEGORY_ALIASES: dict = {}
+
 # Allow these scopes for the app
 WYDATKI_FILE_ID = '1Cqed7-_t6TFt1V6PPuM6hCFzcUAYZQ7Zg_FnotHfdTQ'
 WYDATKI_DEFAULT_RANGE = 'wydatki_2025!G2:M'
 GOOGLE_API_USE_SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 MY_SPREADSHEET_ID = WYDATKI_FILE_ID
 MY_DEFAULT_RANGE = WYDATKI_DEFAULT_RANGE
+SHEET_TAB_NAME = 'wydatki_{period}'  # {period} is replaced by e.g. "2025" or "2025-01"
+SHEET_TAB_CELLS = 'G2:M'
+SHEET_FINGERPRINT_COLUMN = 'N'  # Kept outside the transaction range, next to the exported IDs' rows
+SHEET_INDEX_TAB = '_indeks_{tab}'  # {tab} is the title of the indexed transaction tab
+SHEET_INDEX_BUCKETS = 1024
+SHEET_INDEX_MAX_LOOKUP = 100  # About a tenth of the buckets; larger deltas read the whole index in one range
+SHEET_READ_CHUNK_ROWS = 5000  # Rows of the ID column read per request under a memory budget (--max-memory)
+SUMMARY_TAB_NAME = 'podsumowanie'
+SNAPSHOT_DIFF_TAB = 'zmiany'
+SUMMARY_TAB_CELLS = 'A1:E'  # Header in the first row
 MY_SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/" + MY_SPREADSHEET_ID + "/edit"
 # Path to your service account key file
 GSHEETS_AUTH_CREDENTIALS_FILE = "credentials.json"  # File downloaded from Google Cloud Console
@@ -1,14 +1,29 @@
+import argparse
 import os
 import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
-from config import MY_SPREADSHEET_ID, GSHEETS_AUTH_CREDENTIALS_FILE
+from config import (BATCH_PARALLELISM, CHECKPOINT_FILE, CSV_DELIMITER, MIRROR_FILE, RUN_LOCK_FILE, SETTINGS_ENV_PREFIX,
+                    SETTINGS_FILE, SHEET_LOCK_FILE, SNAPSHOT_DIFF_COLUMNS)
+from src.handlers.db_handler import TransactionCache
 from src.handlers.file_handler import FileHandler
 from src.handlers.google_sheets_handler import GoogleSheetsHandler
+from src.handlers.import_handler import ImportHandler
+from src.handlers.mirror_handler import GROUP_BY_EXPRESSIONS, MirrorHandler, SINK_CSV, SINK_SHEETS
+from src.handlers.sheets_emulator import SheetsEmulator
 from src.transaction_entity import TransactionEntity
 from src.transaction_exporter import TransactionExporter
-from src.utils.enums import Categories
+from src.utils.enums import Categories, Period
+from src.utils.fomatter import Formatter
 from src.utils.logger import setup_logger
+from src.utils.run_lock import RunLock
+from src.utils.settings import Settings
 
 """
 main.py
@@ -18,19 +33,40 @@ Exports transaction data from the database to Google Sheets or CSV files.
 Features:
 - Identifies the latest SQL database file with a defined prefix in the specified directory.
 - Supports appending new transaction data to a Google Sheets document.
-- Optionally supports exporting data to CSV files (this feature is currently inactive).
-- (Optional) Adds custom transactions to the Google Sheet (add_custom function is defined but not called).
+- Supports exporting data to CSV files.
+- Adds custom transactions to the Google Sheet.
+- Imports custom transactions from CSV/JSONL files (`--import`) into the same batched writes as the database rows.
+- Prints the new-row diff with per-stage timings without authenticating or writing (`diff` / `--dry-run`).
+- Syncs a whole household in one run: `--household NAME=PATH` reads several backups concurrently, stamps each row
+  with its owner and writes one merged, deduplicated stream.
+- Streams the transactions added, removed and modified between two backups (`diff --snapshot`) to stdout or sinks.
+- Answers total/grouping questions from the local SQLite mirror of exported rows (`query`, see `--mirror`).
+- Syncs several settings profiles in one process (`batch`), sharing the authentication and the backup reads.
+- Bounds the dedup set and the buffered rows to a memory budget (`--max-memory MB`), spilling them to temporary
+  SQLite tables, and prints the peak RSS of every stage.
+- Locks the output directory and the spreadsheet of a sync; an overlapping run of the same sync is coalesced into
+  the running one, which runs once more when it finishes.
 
 Usage:
-    python main.py [db_directory]
+    python main.py sync-sheets [db_directory] [--date-from D] [--date-to D] [--batch-size N] [--sinks ...]
+    python main.py sync-sheets [db_directory] --import adjustments.csv [--import more.jsonl ...]
+    python main.py export-csv --household Ala=/backups/ala --household Olek=/backups/olek/cashew.sql
+    python main.py export-csv [db_directory] [--output-dir DIR] [--partition month] [--workers N] [--dry-run]
+    python main.py add --description TEXT --amount X --category NAME --date D [--who NAME ...]
+    python main.py diff [db_directory] [--output-dir DIR]
+    python main.py diff [db_directory] --snapshot [--old FILE] [--new FILE] [--sinks csv sheets]
+    python main.py query [--output-dir DIR] [--group-by month] [--date-from D] [--date-to D] [--category C] [--who W]
+    python main.py batch [--config FILE] [--profiles NAME ...] [--parallel N] [--sinks ...]
 
 Arguments:
     db_directory: Path to the directory containing SQL database files.
                   Defaults to ./db (if it exists) or ./ (current working directory).
 
-Optional Features:
-    - `fetch_and_export()`: Exports data to CSV files (currently commented out).
-    - `add_custom()`: Adds predefined transactions to the Google Sheets document (currently commented out).
+Calling `python main.py [db_directory]` without a subcommand runs `sync-sheets`.
+
+The sheet, range, credentials, date bounds and directories come from `budget_sync.toml` and `BUDGET_SYNC_*`
+environment variables when set (see `src/utils/settings.py`); `--config FILE --profile NAME` selects another file
+or profile.
 """
 
 logger = setup_logger(__name__)
@@ -40,7 +76,6 @@ logger.debug("Setting up dynamic sys.path for the parent directory of 'src'.")
 current_dir = os.path.dirname(os.path.abspath(__file__))  # Get the current file's directory
 parent_dir = os.path.abspath(os.path.join(current_dir, ".."))  # Navigate one level up
 work_dir = os.getcwd()
-auth_file = str(os.path.join(current_dir, GSHEETS_AUTH_CREDENTIALS_FILE))
 
 logger.debug(f"Current dir: {current_dir}, Parent dir: {parent_dir}, Work dir: {work_dir}")
 
@@ -49,27 +84,43 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 
-def add_custom():
+SINKS = (SINK_SHEETS, SINK_CSV)
+COMMANDS = ("sync-sheets", "export-csv", "add", "diff", "query", "batch")
+
+
+def add_custom(args: argparse.Namespace) -> None:
     """
     Adds custom transactions to the Google Sheets using the GoogleSheetsHandler.
 
+    One row is created for every `--who` entry, or a single row when nobody is given.
+
+    :param args: Parsed `add` command-line arguments.
     :return: None
     """
     logger.debug("Entering add_custom() function.")
 
-    logger.debug("Initializing GoogleSheetsHandler with MY_SPREADSHEET_ID.")
-    g_handler = GoogleSheetsHandler(MY_SPREADSHEET_ID)
+    logger.debug("Creating custom transaction entities from the command-line arguments.")
+    rows = [
+        TransactionEntity('', args.description, args.amount, args.category, args.date, who).to_list()
+        for who in (args.who or [None])
+    ]
+
+    if args.dry_run:
+        logger.debug("Dry run requested, printing the custom transactions instead of appending them.")
+        _print_rows(rows)
+        return
 
-    logger.debug("Creating custom transaction entities (examples).")
-    r1 = TransactionEntity('', 'wyrównanie', -7.5, Categories.PRZYJEMNOŚCI.value, datetime(2025, 1, 20), 'Michał')
-    r2 = TransactionEntity('', 'wyrównanie', -7.5, Categories.PRZYJEMNOŚCI.value, datetime(2025, 1, 20), 'Daga')
+    settings = _settings(args)
+    logger.debug("Initializing GoogleSheetsHandler with the configured spreadsheet ID.")
+    g_handler = GoogleSheetsHandler(settings.spreadsheet_id, credentials_file=_auth_file(settings),
+                                    default_range=settings.default_range)
 
     logger.debug("Appending the transaction entities to Google Sheets.")
-    g_handler.append_transactions([r1.to_list(), r2.to_list()])
+    g_handler.append_transactions(rows)
     logger.debug("Custom transactions successfully added to Google Sheets.")
 
 
-def fetch_and_export():
+def fetch_and_export(args: Optional[argparse.Namespace] = None) -> None:
     """
     Locates the latest SQL database file and exports transaction data to CSV files.
 
@@ -78,12 +129,16 @@ def fetch_and_export():
     2. Ensure the output directory exists.
     3. Find the latest SQL database file in the specified directory.
     4. Initialize the TransactionExporter and export transaction data.
+
+    :param args: Parsed command-line arguments, defaults to those of a bare `export-csv`.
     """
     logger.debug("Entering fetch_and_export() function.")
+    args = args if args is not None else build_parser().parse_args(["export-csv"])
 
     logger.debug("Retrieving database and output directory paths from command-line arguments.")
-    db_directory = FileHandler.get_db_directory(sys.argv)
-    output_directory = FileHandler.get_output_directory(sys.argv)
+    settings = _settings(args)
+    db_directory = FileHandler.get_db_directory(args.db_directory or settings.db_directory)
+    output_directory = FileHandler.get_output_directory(args.output_dir or settings.output_dir)
 
     logger.info(f"Searching for database files in: {db_directory}")
     logger.info(f"Output files will be stored in: {output_directory}")
@@ -93,14 +148,23 @@ def fetch_and_export():
 
     try:
         logger.debug("Finding the most recent SQL file matching the defined prefix and suffix.")
-        latest_sql_file = FileHandler.find_latest_sql_file(db_directory)
+        latest_sql_file = _latest_database(args, db_directory)
         logger.info(f"Located latest database file: {latest_sql_file}")
 
         logger.debug("Initializing TransactionExporter with the found database file.")
-        exporter = TransactionExporter(latest_sql_file, output_directory)
-
-        logger.debug("Calling fetch_and_export() method of TransactionExporter.")
-        exporter.fetch_and_export()
+        exporter = _create_exporter(latest_sql_file, args, output_directory)
+
+        if args.partition:
+            logger.debug("Calling fetch_and_export_partitioned() method of TransactionExporter.")
+            counts = exporter.fetch_and_export_partitioned(Period(args.partition), args.workers)
+            logger.info(f"Exported {sum(counts.values())} transactions into {len(counts)} partitions.")
+        elif args.upsert:
+            logger.debug("Calling fetch_and_upsert_csv() method of TransactionExporter.")
+            exporter.fetch_and_upsert_csv()
+        else:
+            logger.debug("Calling fetch_and_export() method of TransactionExporter.")
+            exporter.fetch_and_export()
+            _print_memory_report(SINK_CSV, exporter)
 
     except FileNotFoundError as e:
         logger.error(f"Database file missing: {e}")
@@ -110,7 +174,7 @@ def fetch_and_export():
         sys.exit(1)
 
 
-def fetch_and_append():
+def fetch_and_append(args: Optional[argparse.Namespace] = None) -> None:
     """
     Locates the latest SQL database file and appends new transactions to Google Sheets.
 
@@ -119,30 +183,41 @@ def fetch_and_append():
     2. Locate the latest SQL database file matching the specified prefix and suffix.
     3. Initialize the Google Sheets handler and transaction exporter.
     4. Fetch and append new transactions to the Google Sheet.
+
+    :param args: Parsed command-line arguments, defaults to those of a bare `sync-sheets`.
     """
     logger.debug("Entering fetch_and_append() function.")
+    args = args if args is not None else build_parser().parse_args(["sync-sheets"])
 
     logger.debug("Retrieving database directory from command-line arguments.")
-    db_directory = FileHandler.get_db_directory(sys.argv)
+    settings = _settings(args)
+    db_directory = FileHandler.get_db_directory(args.db_directory or settings.db_directory)
+    auth_file = _auth_file(settings)
     logger.info(f"Searching for database files in: {db_directory}")
 
     try:
         logger.debug("Finding the most recent SQL file in the database directory.")
-        latest_sql_file = FileHandler.find_latest_sql_file(db_directory)
+        latest_sql_file = _latest_database(args, db_directory)
         logger.info(f"Located latest database file: {latest_sql_file}")
 
-        logger.debug(
-            f"Initializing GoogleSheetsHandler with sheet ID: {MY_SPREADSHEET_ID} and credentials file: {auth_file}")
-        g_handler = GoogleSheetsHandler(MY_SPREADSHEET_ID, credentials_file=auth_file)
+        g_handler = _sheets_handler(args, settings)
         logger.info(
-            f"GoogleSheetsHandler initialized for sheet ID: {MY_SPREADSHEET_ID} and credentials file: {auth_file}")
+            f"GoogleSheetsHandler initialized for sheet ID: {settings.spreadsheet_id} and credentials file: {auth_file}")
 
         logger.debug("Initializing TransactionExporter with the database file.")
-        exporter = TransactionExporter(latest_sql_file)
+        exporter = _create_exporter(latest_sql_file, args)
         logger.info(f"TransactionExporter initialized for database file: {latest_sql_file}")
 
-        logger.debug("Calling fetch_and_append() method of TransactionExporter to update Google Sheets.")
-        exporter.fetch_and_append(latest_sql_file, g_handler)
+        if args.tab_period:
+            logger.debug("Calling fetch_and_append_by_tab() method of TransactionExporter to update Google Sheets.")
+            exporter.fetch_and_append_by_tab(latest_sql_file, g_handler, Period(args.tab_period))
+        elif args.upsert:
+            logger.debug("Calling upsert_to_sheet() method of TransactionExporter to update Google Sheets.")
+            exporter.upsert_to_sheet(latest_sql_file, g_handler, args.sheet_range)
+        else:
+            logger.debug("Calling fetch_and_append() method of TransactionExporter to update Google Sheets.")
+            exporter.fetch_and_append(latest_sql_file, g_handler, args.sheet_range)
+            _print_memory_report(SINK_SHEETS, exporter)
 
         logger.info("New transactions successfully appended to Google Sheets.")
 
@@ -154,17 +229,536 @@ def fetch_and_append():
         sys.exit(1)
 
 
-def main() -> None:
-    logger.debug("Entering main() function. Starting the main program flow.")
+def show_diff(args: argparse.Namespace) -> None:
+    """
+    Prints the transactions a sync would write, followed by the time spent in each pipeline stage.
+
+    Nothing is authenticated or written: rows are diffed against the local CSV history in the output
+    directory (every row is new when there is none), so the local pipeline can be profiled in isolation.
+
+    :param args: Parsed command-line arguments.
+    """
+    logger.debug("Entering show_diff() function.")
+    if getattr(args, "snapshot", False) or getattr(args, "old", None) or getattr(args, "new", None):
+        show_snapshot_diff(args)
+        return
+    settings = _settings(args)
+    db_directory = FileHandler.get_db_directory(args.db_directory or settings.db_directory)
+    output_directory = FileHandler.get_output_directory(args.output_dir or settings.output_dir)
+
+    try:
+        latest_sql_file = _latest_database(args, db_directory)
+        logger.info(f"Located latest database file: {latest_sql_file}")
+    except FileNotFoundError as e:
+        logger.error(f"Database file missing: {e}")
+        sys.exit(1)
+
+    exporter = _create_exporter(latest_sql_file, args, output_directory)
+    history_file = exporter.readable_history_file(exporter.define_file_paths()['history_file'])
+    rows, timings = exporter.preview_new_transactions(history_file)
+
+    _print_rows(rows)
+    print(f"{len(rows)} new transactions")
+    for stage, seconds in timings.items():
+        print(f"{stage}: {seconds * 1000:.1f} ms")
+
+
+def show_snapshot_diff(args: argparse.Namespace) -> None:
+    """
+    Streams the transactions added, removed and modified between two backups.
+
+    The two most recent backups of the database directory are compared unless `--old`/`--new` name them. The
+    changes are printed, or written to the sinks given with `--sinks`, followed by the number of each kind.
+
+    :param args: Parsed `diff` command-line arguments.
+    """
+    settings = _settings(args)
+    db_directory = FileHandler.get_db_directory(args.db_directory or settings.db_directory)
+    output_directory = FileHandler.get_output_directory(args.output_dir or settings.output_dir)
+    try:
+        old_file, new_file = _snapshot_backups(args, db_directory, settings)
+    except FileNotFoundError as e:
+        logger.error(f"Database file missing: {e}")
+        sys.exit(1)
+    logger.info(f"Comparing {old_file} with {new_file}")
+
+    exporter = _create_exporter(new_file, args, output_directory)
+    counts: Counter = Counter()
+    if not args.sinks:
+        print(CSV_DELIMITER.join(SNAPSHOT_DIFF_COLUMNS))
+        _print_rows(exporter.iter_snapshot_diff(old_file, counts))
+    else:
+        os.makedirs(output_directory, exist_ok=True)
+        for sink in dict.fromkeys(args.sinks):
+            sheet_handler = _sheets_handler(args, settings) if sink == SINK_SHEETS else None
+            counts = Counter(exporter.write_snapshot_diff(old_file, sink, sheet_handler))
+    print(f"{counts['added']} added, {counts['removed']} removed, {counts['modified']} modified")
+
+
+def _snapshot_backups(args: argparse.Namespace, db_directory: str, settings: Settings) -> Tuple[str, str]:
+    """Returns the (older, newer) backups to diff: those given with `--old`/`--new`, else the latest ones."""
+    if args.old and args.new:
+        return os.path.abspath(args.old), os.path.abspath(args.new)
+    backups = FileHandler.find_sql_files(db_directory, settings)
+    new_file = os.path.abspath(args.new) if args.new else backups[-1]
+    if args.old:
+        return os.path.abspath(args.old), new_file
+    earlier = [backup for backup in backups if backup != new_file]
+    if not earlier:
+        raise FileNotFoundError(f"Diffing needs two backups in {db_directory}, found {len(backups)}.")
+    return earlier[-1], new_file
+
+
+def query_mirror(args: argparse.Namespace) -> None:
+    """
+    Prints totals from the local mirror of exported transactions, grouped by day, month, category or person.
+
+    :param args: Parsed `query` command-line arguments.
+    """
+    logger.debug("Entering query_mirror() function.")
+    mirror_file = _mirror_file(args)
+    if not os.path.exists(mirror_file):
+        logger.error(f"No mirror found at {mirror_file}; run a sync with --mirror first.")
+        sys.exit(1)
 
-    # logger.debug("Calling add_custom() to add transactions to Google Sheets.")
-    # add_custom()
-    #
-    # logger.debug("Preparing to call fetch_and_export() to handle CSV export.")
-    # fetch_and_export()  # Uncomment if needed
+    with MirrorHandler(mirror_file) as mirror:
+        start = time.perf_counter()
+        totals = mirror.totals(args.group_by, args.date_from, args.date_to, args.category, args.who)
+        elapsed = time.perf_counter() - start
 
-    logger.debug("Preparing to call fetch_and_append() to handle appending data to Google Sheets.")
-    fetch_and_append()
+    for group, cents, count in totals:
+        print(CSV_DELIMITER.join([group, Formatter.format_cents(cents), str(count)]))
+    print(f"{Formatter.format_cents(sum(cents for _, cents, _ in totals))} in {sum(count for _, _, count in totals)} "
+          f"transactions ({elapsed * 1000:.2f} ms)")
+
+
+def run_batch(args: argparse.Namespace) -> None:
+    """
+    Syncs several settings profiles in one process, e.g. one per household or spreadsheet, instead of one cron entry
+    (with its own start-up and authentication) each.
+
+    The profiles authenticate once per credentials file and reuse one Sheets service per worker thread, each backup
+    is read once however many profiles use it, and at most `--parallel` profiles run at once. A failing profile does
+    not stop the others; the outcome and time of every profile are printed at the end.
+
+    :param args: Parsed `batch` command-line arguments.
+    """
+    logger.debug("Entering run_batch() function.")
+    names = args.profiles or Settings.profiles(args.config)
+    if not names:
+        logger.error("No profiles to sync: define [profiles.<name>] tables in the settings file or pass --profiles.")
+        sys.exit(1)
+
+    cache = TransactionCache()
+    sheets_service = _shared_sheets_service(args)
+    databases: Dict[tuple, str] = {}
+    jobs = []
+    for name in names:
+        settings = Settings.load(args.config, name)  # Every profile is validated before any is synced
+        profile_args = argparse.Namespace(**{**vars(args), "profile": name, "settings": settings,
+                                             "transaction_cache": cache, "sheets_service": sheets_service})
+        if not args.household:
+            db_directory = FileHandler.get_db_directory(args.db_directory or settings.db_directory)
+            key = (db_directory, settings.db_file_prefix, settings.db_file_suffix)
+            try:
+                if key not in databases:
+                    databases[key] = FileHandler.find_latest_sql_file(db_directory, settings)
+                profile_args.database_file = databases[key]
+                cache.reserve(databases[key], args.date_from or settings.date_filter, args.date_to or settings.date_to)
+            except FileNotFoundError:
+                pass  # The profile reports the missing backup when it runs
+        jobs.append(profile_args)
+
+    # Profiles writing local files must not share them
+    if SINK_CSV in args.sinks or args.mirror:
+        outputs = Counter(_local_output(profile_args) for profile_args in jobs)
+        shared = [path for path, count in outputs.items() if count > 1]
+        if shared:
+            logger.error(f"Profiles share the local output {', '.join(shared)}; give each its own output_dir.")
+            sys.exit(1)
+
+    with ThreadPoolExecutor(max_workers=min(args.parallel, len(jobs))) as pool:
+        results = list(pool.map(_run_profile, jobs))
+
+    for name, (succeeded, seconds) in zip(names, results):
+        print(CSV_DELIMITER.join([name, "ok" if succeeded else "failed", f"{seconds * 1000:.1f} ms"]))
+    failed = sum(not succeeded for succeeded, _ in results)
+    print(f"{len(results) - failed} of {len(results)} profiles synced")
+    if failed:
+        sys.exit(1)
+
+
+def _run_profile(args: argparse.Namespace) -> Tuple[bool, float]:
+    """Syncs one profile of a batch, returning whether it succeeded and how long it took."""
+    start = time.perf_counter()
+    try:
+        sync(args)
+        succeeded = True
+    except SystemExit:  # The sync flows log their error and exit; only this profile fails
+        succeeded = False
+    except Exception as e:
+        logger.error(f"Profile '{args.profile}' failed: {e}")
+        succeeded = False
+    seconds = time.perf_counter() - start
+    logger.info(f"Profile '{args.profile}' {'synced' if succeeded else 'failed'} in {seconds:.2f} s.")
+    return succeeded, seconds
+
+
+def _shared_sheets_service(args: argparse.Namespace) -> Callable[[Settings], Any]:
+    """
+    Returns the Sheets service factory of a batch: a single emulator, or credentials loaded once per credentials
+    file with one service per worker thread (services are not thread-safe), reused by the profiles it runs.
+    """
+    if args.sheets_emulator:
+        emulator = SheetsEmulator(persist_path=args.sheets_emulator)
+        return lambda settings: emulator
+
+    credentials: Dict[str, Any] = {}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def service(settings: Settings) -> Any:
+        auth_file = _auth_file(settings)
+        with lock:  # Profiles starting together still authenticate once
+            if auth_file not in credentials:
+                credentials[auth_file] = GoogleSheetsHandler(settings.spreadsheet_id,
+                                                             credentials_file=auth_file).load_credentials()
+        services = local.__dict__.setdefault("services", {})
+        if auth_file not in services:
+            services[auth_file] = GoogleSheetsHandler.build_service(credentials[auth_file])
+        return services[auth_file]
+
+    return service
+
+
+def _local_output(args: argparse.Namespace) -> str:
+    """Returns the local file or directory a profile writes: its mirror, or its CSV output directory."""
+    if args.mirror:
+        return _mirror_file(args)
+    return FileHandler.get_output_directory(args.output_dir or _settings(args).output_dir)
+
+
+def sync(args: argparse.Namespace) -> None:
+    """
+    Runs every selected sink under the locks of the output directory and the spreadsheet it writes.
+
+    When the same sync is already running (e.g. a cron run overlapping the previous one), it is asked to run once
+    more after it finishes instead, and this invocation returns at once; a different sync writing the same targets
+    is waited for.
+
+    :param args: Parsed `sync-sheets` or `export-csv` command-line arguments.
+    """
+    if args.dry_run:
+        show_diff(args)
+        return
+
+    if not RunLock(_lock_files(args), _job_key(args)).run(lambda: _run_sinks(args)):
+        print("This sync is already running; it will run again once it finishes.")
+
+
+def _run_sinks(args: argparse.Namespace) -> None:
+    """Runs every selected sink, concurrently when more than one worker is allowed."""
+    runners = {SINK_SHEETS: fetch_and_append, SINK_CSV: fetch_and_export}
+    sinks = list(dict.fromkeys(args.sinks))  # Drop duplicates, keep the given order
+    workers = args.workers or 1
+    if workers == 1 or len(sinks) == 1:
+        for sink in sinks:
+            runners[sink](args)
+        return
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(sinks))) as pool:
+        futures = [pool.submit(runners[sink], args) for sink in sinks]
+        for future in futures:
+            future.result()
+
+
+def _lock_files(args: argparse.Namespace) -> List[str]:
+    """Returns the lock files of a sync: its output directory when it writes local files, and its spreadsheet."""
+    settings = _settings(args)
+    lock_files = []
+    if SINK_CSV in args.sinks or args.mirror or args.checkpoint or SINK_SHEETS not in args.sinks:
+        output_directory = FileHandler.get_output_directory(args.output_dir or settings.output_dir)
+        os.makedirs(output_directory, exist_ok=True)
+        lock_files.append(os.path.join(output_directory, RUN_LOCK_FILE))
+    if SINK_SHEETS in args.sinks:
+        lock_files.append(os.path.join(tempfile.gettempdir(),
+                                       SHEET_LOCK_FILE.format(spreadsheet_id=settings.spreadsheet_id)))
+    return lock_files
+
+
+def _job_key(args: argparse.Namespace) -> str:
+    """Describes a sync by its options, so overlapping runs of the same command line (and profile) are coalesced."""
+    options = {key: value for key, value in vars(args).items()
+               if isinstance(value, (str, int, float, bool, list, tuple, type(None)))}
+    return repr(sorted(options.items()))
+
+
+def _create_exporter(db_file: str, args: argparse.Namespace,
+                     output_directory: Optional[str] = None) -> TransactionExporter:
+    """Creates a TransactionExporter configured with the date range and batch size options."""
+    return TransactionExporter(db_file, output_directory, date_from=args.date_from, date_to=args.date_to,
+                               batch_size=args.batch_size, backup_history=args.backup_history,
+                               summary=args.summary, mirror_file=_mirror_file(args) if args.mirror else None,
+                               sources=_household_sources(args), imported=_imported_rows(args),
+                               settings=_settings(args), cache=getattr(args, "transaction_cache", None),
+                               checkpoint_file=_checkpoint_file(args) if getattr(args, "checkpoint", False) else None,
+                               sheet_index=getattr(args, "sheet_index", False),
+                               max_memory=args.max_memory * 2**20 if getattr(args, "max_memory", None) else None)
+
+
+def _sheets_handler(args: argparse.Namespace, settings: Settings) -> GoogleSheetsHandler:
+    """Creates the handler of the profile's sheet, on the service shared by a batch, the emulator or the API."""
+    shared_service = getattr(args, "sheets_service", None)
+    if shared_service is not None:
+        service = shared_service(settings)
+    elif args.sheets_emulator:
+        logger.debug(f"Initializing GoogleSheetsHandler backed by the emulator state in {args.sheets_emulator}")
+        service = SheetsEmulator(persist_path=args.sheets_emulator)
+    else:
+        logger.debug(f"Initializing GoogleSheetsHandler with sheet ID: {settings.spreadsheet_id} and "
+                     f"credentials file: {_auth_file(settings)}")
+        return GoogleSheetsHandler(settings.spreadsheet_id, credentials_file=_auth_file(settings),
+                                   default_range=settings.default_range)
+    if isinstance(service, SheetsEmulator):
+        service.ensure_tab(settings.spreadsheet_id, settings.default_range.split('!')[0])
+    return GoogleSheetsHandler(settings.spreadsheet_id, service=service, default_range=settings.default_range)
+
+
+def _settings(args: argparse.Namespace) -> Settings:
+    """Returns the settings selected with `--config`/`--profile`, loaded once per parsed command line."""
+    settings = getattr(args, "settings", None)
+    if settings is None:
+        config_file, profile = getattr(args, "config", None), getattr(args, "profile", None)
+        settings = Settings.load(config_file, profile) if config_file or profile else Settings.current()
+        args.settings = settings
+    return settings
+
+
+def _auth_file(settings: Settings) -> str:
+    """Returns the credentials file of the settings, relative paths being resolved next to main.py."""
+    return str(os.path.join(current_dir, settings.credentials_file))
+
+
+def _imported_rows(args: argparse.Namespace) -> List[tuple]:
+    """Loads and validates the custom transactions of every `--import` file."""
+    return [row for file_path in getattr(args, "import_files", None) or [] for row in ImportHandler.load(file_path, zone=_settings(args).zone)]
+
+
+def _household_sources(args: argparse.Namespace) -> Dict[str, str]:
+    """Resolves the `--household` entries to database files; a directory resolves to its latest backup."""
+    return {who: FileHandler.find_latest_sql_file(path) if os.path.isdir(path) else os.path.abspath(path)
+            for who, path in getattr(args, "household", None) or []}
+
+
+def _latest_database(args: argparse.Namespace, db_directory: str) -> str:
+    """Returns the backup resolved by a batch, the first household backup, or the latest database file in `db_directory`."""
+    if getattr(args, "database_file", None):
+        return args.database_file
+    sources = _household_sources(args)
+    return next(iter(sources.values())) if sources else FileHandler.find_latest_sql_file(db_directory)
+
+
+def _checkpoint_file(args: argparse.Namespace) -> str:
+    """Returns the backfill checkpoint of the profile's spreadsheet, kept in the output directory."""
+    settings = _settings(args)
+    output_directory = FileHandler.get_output_directory(args.output_dir or settings.output_dir)
+    return os.path.join(output_directory, CHECKPOINT_FILE.format(spreadsheet_id=settings.spreadsheet_id))
+
+
+def _mirror_file(args: argparse.Namespace) -> str:
+    """Returns the mirror database path: `--mirror-file`, or `MIRROR_FILE` in the output directory."""
+    if getattr(args, "mirror_file", None):
+        return os.path.abspath(args.mirror_file)
+    output_dir = args.output_dir or (_settings(args).output_dir if getattr(args, "settings", None) else None)
+    return os.path.join(FileHandler.get_output_directory(output_dir), MIRROR_FILE)
+
+
+def _print_rows(rows: Iterable[List[str]]) -> None:
+    """Prints rows using the configured CSV delimiter."""
+    for row in rows:
+        print(CSV_DELIMITER.join(row))
+
+
+def _check_memory_budget(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Rejects `--max-memory` with the options whose working sets are still held in memory."""
+    if not getattr(args, "max_memory", None):
+        return
+    unsupported = [option for option, value in (("--checkpoint", args.checkpoint), ("--sheet-index", args.sheet_index),
+                                                ("--upsert", args.upsert), ("--tab-period", args.tab_period),
+                                                ("--partition", args.partition)) if value]
+    if unsupported:
+        parser.error(f"--max-memory cannot be combined with {', '.join(unsupported)}.")
+
+
+def _print_memory_report(sink: str, exporter: TransactionExporter) -> None:
+    """Prints the peak RSS of every stage of a sync run with `--max-memory`, one line per stage."""
+    if exporter.memory_report is not None:
+        for line in exporter.memory_report.format():
+            print(f"{sink}\t{line}")
+
+
+def _date_argument(value: str) -> str:
+    """Validates a 'YYYY-MM-DD' command-line date and returns it unchanged."""
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+    return value
+
+
+def _household_argument(value: str) -> Tuple[str, str]:
+    """Parses a 'NAME=PATH' household backup into the person and the database file or directory."""
+    who, separator, path = value.partition("=")
+    if not separator or not who.strip() or not path:
+        raise argparse.ArgumentTypeError(f"Invalid household backup '{value}', expected NAME=PATH.")
+    if not os.path.exists(path):
+        raise argparse.ArgumentTypeError(f"Household backup '{path}' does not exist.")
+    return who.strip(), path
+
+
+def _positive_int(value: str) -> int:
+    """Parses a strictly positive integer command-line value."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid number '{value}'.")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"Expected a positive number, got {number}.")
+    return number
+
+
+def _add_pipeline_arguments(parser: argparse.ArgumentParser, default_sinks: List[str]) -> None:
+    """Adds the options shared by the commands that read the database."""
+    parser.add_argument("db_directory", nargs="?", default=None,
+                        help="Directory containing the database files (defaults to ./db, ./workdir/db or ./).")
+    parser.add_argument("--output-dir", default=None,
+                        help="Directory for CSV output files (defaults to ./output or ./).")
+    parser.add_argument("--household", metavar="NAME=PATH", type=_household_argument, action="append", default=None,
+                        help="Backup of one household member (a database file, or a directory holding their "
+                             "backups); repeat to merge several backups, stamping each row with NAME.")
+    parser.add_argument("--import", dest="import_files", metavar="FILE", action="append", default=None,
+                        help="CSV or JSONL file of custom transactions to merge into the export; repeatable.")
+    parser.add_argument("--config", metavar="FILE", default=None,
+                        help=f"TOML settings file (default: ${SETTINGS_ENV_PREFIX}CONFIG or ./{SETTINGS_FILE}).")
+    parser.add_argument("--profile", default=None, help="Profile of the settings file to sync.")
+    parser.add_argument("--date-from", type=_date_argument, default=None,
+                        help="Export transactions created from this date on (default: the date_filter setting).")
+    parser.add_argument("--date-to", type=_date_argument, default=None,
+                        help="Export transactions created up to this date (default: the date_to setting, if any).")
+    parser.add_argument("--batch-size", type=_positive_int, default=None,
+                        help="Maximum number of rows per Google Sheets append request.")
+    parser.add_argument("--workers", type=_positive_int, default=None,
+                        help="Number of workers used to run the selected sinks or partitions "
+                             "(default: one per CPU for partitioned exports, 1 otherwise).")
+    parser.add_argument("--sinks", nargs="+", choices=SINKS, default=default_sinks,
+                        help=f"Output sinks to write to (default: {' '.join(default_sinks) or 'none, print'}).")
+    parser.add_argument("--range", dest="sheet_range", default=None,
+                        help="Google Sheets range in A1 notation used to look up existing rows.")
+    parser.add_argument("--sheets-emulator", metavar="STATE_FILE", default=None,
+                        help="Sync against a local Google Sheets emulator persisted in STATE_FILE instead of the API.")
+    parser.add_argument("--tab-period", choices=[Period.YEAR.value, Period.MONTH.value], default=None,
+                        help="Route Google Sheets rows to one tab per year or month, creating missing tabs.")
+    parser.add_argument("--upsert", action="store_true",
+                        help="Also rewrite transactions edited since their export, detected with content fingerprints.")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Checkpoint Google Sheets appends after every written batch and resume an interrupted "
+                             "backfill from its checkpoint (kept in the output directory).")
+    parser.add_argument("--sheet-index", action="store_true",
+                        help="Find the IDs already in the sheet through a hidden, hashed ID index tab, looking up "
+                             "small deltas instead of downloading the whole ID column.")
+    parser.add_argument("--max-memory", metavar="MB", type=_positive_int, default=None,
+                        help="Bound the dedup set and the buffered rows to about MB MiB, spilling the rest to "
+                             "temporary SQLite tables, and print the peak RSS of every stage.")
+    parser.add_argument("--backup-history", action="store_true",
+                        help="Copy the CSV history to its backup file before appending to it.")
+    parser.add_argument("--summary", action="store_true",
+                        help="Maintain monthly totals by category and person in a summary CSV file or tab.")
+    parser.add_argument("--mirror", action="store_true",
+                        help="Mirror exported rows to a local SQLite database and use it to find new rows.")
+    parser.add_argument("--mirror-file", default=None,
+                        help=f"Mirror database path (default: {MIRROR_FILE} in the output directory).")
+    parser.add_argument("--partition", choices=[period.value for period in Period], default=None,
+                        help="Write one CSV file per day, month or year instead of the incremental export.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print the new-row diff with timings without authenticating or writing.")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Builds the command-line parser with the `sync-sheets`, `export-csv`, `add`, `diff`, `query` and `batch` subcommands."""
+    parser = argparse.ArgumentParser(prog="main.py", description="Exports Cashew transactions to Google Sheets "
+                                                                 "or CSV files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = subparsers.add_parser("sync-sheets", help="Append new transactions to Google Sheets.")
+    _add_pipeline_arguments(sync_parser, [SINK_SHEETS])
+    sync_parser.set_defaults(func=sync)
+
+    export_parser = subparsers.add_parser("export-csv", help="Export new transactions to CSV files.")
+    _add_pipeline_arguments(export_parser, [SINK_CSV])
+    export_parser.set_defaults(func=sync)
+
+    diff_parser = subparsers.add_parser("diff", help="Print the new-row diff with timings without writing, or the "
+                                                     "changes between two backups.")
+    _add_pipeline_arguments(diff_parser, [])
+    diff_parser.add_argument("--snapshot", action="store_true",
+                             help="Print the transactions added, removed and modified between the two latest "
+                                  "backups, or write them to the sinks given with --sinks.")
+    diff_parser.add_argument("--old", metavar="FILE", default=None,
+                             help="Older backup of --snapshot (default: the one before the newer backup).")
+    diff_parser.add_argument("--new", metavar="FILE", default=None,
+                             help="Newer backup of --snapshot (default: the latest backup).")
+    diff_parser.set_defaults(func=show_diff)
+
+    query_parser = subparsers.add_parser("query", help="Print totals from the local mirror of exported rows.")
+    query_parser.add_argument("--output-dir", default=None, help="Directory holding the mirror database.")
+    query_parser.add_argument("--mirror-file", default=None,
+                              help=f"Mirror database path (default: {MIRROR_FILE} in the output directory).")
+    query_parser.add_argument("--group-by", choices=list(GROUP_BY_EXPRESSIONS), default="month",
+                              help="Grouping of the totals (default: month).")
+    query_parser.add_argument("--date-from", type=_date_argument, default=None,
+                              help="First day included, YYYY-MM-DD.")
+    query_parser.add_argument("--date-to", type=_date_argument, default=None, help="Last day included, YYYY-MM-DD.")
+    query_parser.add_argument("--category", choices=Categories.get(), default=None, help="Only this category.")
+    query_parser.add_argument("--who", default=None, help="Only this person.")
+    query_parser.set_defaults(func=query_mirror)
+
+    batch_parser = subparsers.add_parser("batch", help="Sync several settings profiles in one process.")
+    _add_pipeline_arguments(batch_parser, [SINK_SHEETS])
+    batch_parser.add_argument("--profiles", nargs="+", default=None,
+                              help="Profiles of the settings file to sync (default: all of them).")
+    batch_parser.add_argument("--parallel", type=_positive_int, default=BATCH_PARALLELISM,
+                              help=f"Number of profiles synced at once (default: {BATCH_PARALLELISM}).")
+    batch_parser.set_defaults(func=run_batch)
+
+    add_parser = subparsers.add_parser("add", help="Add a custom transaction to Google Sheets.")
+    add_parser.add_argument("--description", required=True, help="Transaction description.")
+    add_parser.add_argument("--amount", type=float, required=True, help="Transaction amount.")
+    add_parser.add_argument("--category", choices=Categories.get(), default=Categories.INNE.value,
+                            help="Transaction category.")
+    add_parser.add_argument("--date", type=lambda value: datetime.strptime(_date_argument(value), "%Y-%m-%d"),
+                            default=datetime.now(), help="Transaction date in YYYY-MM-DD format (default: today).")
+    add_parser.add_argument("--who", action="append", default=None,
+                            help="Person the transaction belongs to; repeat to add one row per person.")
+    add_parser.add_argument("--dry-run", action="store_true", help="Print the rows instead of appending them.")
+    add_parser.set_defaults(func=add_custom)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    logger.debug("Entering main() function. Starting the main program flow.")
+    argv = sys.argv[1:] if argv is None else argv
+
+    # Keep `python main.py [db_directory]` working by defaulting to the Google Sheets sync
+    if not argv or argv[0] not in COMMANDS + ("-h", "--help"):
+        logger.debug("No subcommand given, defaulting to sync-sheets.")
+        argv = ["sync-sheets", *argv]
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    _check_memory_budget(parser, args)
+    logger.debug(f"Running command '{args.command}'.")
+    args.func(args)
 
 
 if __name__ == "__main__":
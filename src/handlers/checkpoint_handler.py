@@ -0,0 +1,157 @@
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from src.utils.logger import Logging
+
+"""
+checkpoint_handler.py
+
+This module persists the progress of Google Sheets backfills, so an interrupted sync resumes where it stopped.
+
+A backfill is planned once: the IDs to write, in order, are saved to a plan file next to the checkpoint. After every
+acknowledged write the checkpoint records only how many of them are in the sheet, the last one and the next free row,
+so a restart writes only the rest, at known rows, without reading the sheet back or diffing again, and a chunk costs
+a write of a few bytes whatever the size of the backfill.
+
+Classes:
+    Checkpoint: The planned IDs of a backfill and its progress.
+    CheckpointHandler: Loads, updates and removes the checkpoint file of a sheet range.
+"""
+
+
+@dataclass
+class Checkpoint:
+    """
+    Progress of a backfill of one sheet range.
+
+    Attributes:
+        target (str): Spreadsheet and range the rows are written to, e.g. "<spreadsheet id>|wydatki_2025!G2:M".
+        ids (List[str]): Transaction IDs to write, in write order.
+        written (int): Number of `ids` confirmed written.
+        next_row (int): Sheet row the next pending ID is written to.
+    """
+    target: str
+    ids: List[str]
+    written: int
+    next_row: int
+
+    @property
+    def pending_ids(self) -> List[str]:
+        """IDs not confirmed written yet."""
+        return self.ids[self.written:]
+
+    @property
+    def last_id(self) -> Optional[str]:
+        """Last ID confirmed written, None before the first write."""
+        return self.ids[self.written - 1] if self.written else None
+
+
+class CheckpointHandler(Logging):
+    """
+    Stores the checkpoint of a sheet range in two JSON files: the plan, written once, and the progress, rewritten
+    atomically after every acknowledged write.
+
+    The progress holds the number of planned IDs and the last written one, so a progress file left over from another
+    plan (e.g. a crash between writing a new plan and its progress) is told apart and ignored.
+    """
+
+    def __init__(self, file_path: str, target: str):
+        """
+        Args:
+            file_path (str): Path of the checkpoint file.
+            target (str): Spreadsheet and range of the backfill; a checkpoint of another target is ignored.
+        """
+        super().__init__()
+        self.file_path = file_path
+        self.plan_path = f"{file_path}.plan"
+        self.target = target
+
+    def load(self) -> Optional[Checkpoint]:
+        """
+        Returns the unfinished checkpoint of the target, or None when there is nothing to resume.
+
+        Returns:
+            Optional[Checkpoint]: The checkpoint, or None when the file is missing, unreadable or of another target.
+        """
+        if not os.path.exists(self.file_path) or not os.path.exists(self.plan_path):
+            return None
+        try:
+            with open(self.plan_path, encoding='utf-8') as file:
+                plan = json.load(file)
+            with open(self.file_path, encoding='utf-8') as file:
+                progress = json.load(file)
+            checkpoint = Checkpoint(plan['target'], list(plan['ids']), int(progress['written']),
+                                    int(progress['next_row']))
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            self.logger.warning(f"Ignoring unreadable checkpoint {self.file_path}: {e}")
+            return None
+        if checkpoint.target != self.target or progress.get('target') != self.target:
+            self.logger.warning(f"Ignoring checkpoint {self.file_path} of another target: {checkpoint.target}")
+            return None
+        if progress.get('planned') != len(checkpoint.ids) or not 0 <= checkpoint.written <= len(checkpoint.ids) \
+                or progress.get('last_id') != checkpoint.last_id:
+            self.logger.warning(f"Ignoring checkpoint {self.file_path} whose progress does not match its plan.")
+            return None
+        return checkpoint
+
+    def start(self, ids: List[str], next_row: int) -> Checkpoint:
+        """
+        Saves the plan of a backfill, and its empty progress, before its first write.
+
+        Args:
+            ids (List[str]): Transaction IDs to write, in write order.
+            next_row (int): Sheet row the first ID is written to.
+
+        Returns:
+            Checkpoint: The saved checkpoint.
+        """
+        checkpoint = Checkpoint(self.target, list(ids), 0, next_row)
+        self._save(self.plan_path, {'target': self.target, 'ids': checkpoint.ids})
+        self._save_progress(checkpoint)
+        self.logger.info(f"Planned a backfill of {len(ids)} rows from row {next_row}, checkpointed in {self.file_path}.")
+        return checkpoint
+
+    def acknowledge(self, checkpoint: Checkpoint, count: int) -> None:
+        """
+        Records that the next `count` pending IDs were written, rewriting only the progress file.
+
+        Args:
+            checkpoint (Checkpoint): The checkpoint of the backfill, updated in place.
+            count (int): Number of rows the acknowledged write contained.
+        """
+        checkpoint.written += count
+        checkpoint.next_row += count
+        self._save_progress(checkpoint)
+        self.logger.debug(f"Checkpointed {checkpoint.written}/{len(checkpoint.ids)} rows, last ID {checkpoint.last_id}.")
+
+    def clear(self) -> None:
+        """Removes the checkpoint and its plan once the backfill is complete."""
+        for path in (self.file_path, self.plan_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _save_progress(self, checkpoint: Checkpoint) -> None:
+        """Writes the progress of a checkpoint, without its planned IDs."""
+        self._save(self.file_path, {'target': checkpoint.target, 'planned': len(checkpoint.ids),
+                                    'written': checkpoint.written, 'last_id': checkpoint.last_id,
+                                    'next_row': checkpoint.next_row})
+
+    @staticmethod
+    def _save(path: str, content: Dict[str, Any]) -> None:
+        """Writes a JSON file through a temporary file and `os.replace`, so it is never half-written."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(content, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
@@ -1,11 +1,21 @@
 import csv
+import gzip
+import io
 import os
-from typing import List
-from typing import TextIO  # noqa: F401
+import shutil
+import tempfile
+from typing import IO, Callable, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set
+from typing import TextIO
 
+from config import CSV_DELIMITER
 from src.utils.error_handling import log_exceptions, CSVError
 from src.utils.logger import Logging
 
+try:
+    import zstandard  # Optional, enables zstd compressed files
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore[assignment]
+
 """
 Module: csv_handler
 
@@ -13,10 +23,23 @@ This module provides functionality for handling CSV file operations, such as cre
 writing, and modifying CSV files. It is primarily used in the transaction export workflow
 to manage the output file.
 
+Classes:
+    - WriteStats: Rows and bytes written by a write.
+    - CSVWriter: The single buffered writer behind every write below.
+
 Functions:
-    - write_csv: Writes data to a CSV file with specified headers and rows.
-    - rename_file: Renames an existing CSV file, useful for handling already existing exports.
-    - append_to_csv: Appends new rows to an existing CSV file without modifying its structure.
+    - write_to_csv: Writes data to a CSV file with specified headers and rows.
+    - rewrite_csv: Atomically replaces a CSV file (temporary file, single fsync, os.replace).
+    - append_to_csv: Appends new rows to an existing CSV file, optionally guarded by a crash-safe undo journal.
+    - recover_journal: Rolls back an append interrupted by a crash.
+    - has_pending_journal: Tells whether an interrupted append awaits recovery, without recovering it.
+    - copy_file: Atomically copies a file, never leaving the destination missing or partial.
+    - iter_csv / read_ids: Stream rows or IDs without loading the whole file.
+    - convert_file: Atomically rewrites a file with the compression implied by the destination's name.
+
+Files ending in `.gz` (gzip) or `.zst` (zstd, when the `zstandard` package is installed) are compressed and
+decompressed transparently. Appends add a new compressed member/frame instead of rewriting the file.
+All writes accept any iterable of rows, so rows can be streamed from the mapping stage without building a list.
 
 Usage:
     Use this module to perform CSV-related tasks in the data export pipeline. It ensures proper
@@ -24,6 +47,79 @@ Usage:
 """
 
 
+# Suffix of the undo journal (the size of the file before the append) kept next to a file while rows are appended
+JOURNAL_SUFFIX = '.journal'
+# Buffer size for file writes, so rows reach the OS in large chunks
+WRITE_BUFFER_SIZE = 1024 * 1024
+# File name suffix of every supported compression
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+class WriteStats(NamedTuple):
+    """Rows and (uncompressed) bytes written to a CSV file, header included."""
+    rows: int
+    bytes: int
+
+
+class CSVWriter:
+    """
+    Streams rows into a binary file through one reusable `csv.writer`.
+
+    Rows are formatted into an in-memory chunk that is encoded and written once it reaches `buffer_size`, so the
+    target sees a few large writes instead of one per row. `rows` and `bytes` count what has been written.
+    """
+
+    def __init__(self, file: IO[bytes], delimiter: str = CSV_DELIMITER, buffer_size: int = WRITE_BUFFER_SIZE):
+        self.rows = 0
+        self.bytes = 0
+        self._file = file
+        self._buffer_size = buffer_size
+        self._chunks: List[str] = []
+        self._pending = 0
+        self._writer = csv.writer(self, delimiter=delimiter)
+
+    def write(self, text: str) -> int:
+        """Receives formatted lines from `csv.writer`."""
+        self._chunks.append(text)
+        self._pending += len(text)
+        if self._pending >= self._buffer_size:
+            self.flush()
+        return len(text)
+
+    def writerow(self, row: Sequence[str]) -> None:
+        self._writer.writerow(row)
+        self.rows += 1
+
+    def writerows(self, rows: Iterable[Sequence[str]]) -> None:
+        writerow = self._writer.writerow
+        for row in rows:
+            writerow(row)
+            self.rows += 1
+
+    def flush(self) -> None:
+        """Encodes and writes the pending chunk."""
+        if self._chunks:
+            data = ''.join(self._chunks).encode('utf-8')
+            self._file.write(data)
+            self.bytes += len(data)
+            self._chunks.clear()
+            self._pending = 0
+
+    @property
+    def stats(self) -> WriteStats:
+        return WriteStats(self.rows, self.bytes)
+
+    @staticmethod
+    def write_all(file: IO[bytes], headers: Optional[Sequence[str]], rows: Iterable[Sequence[str]]) -> WriteStats:
+        """Writes an optional header and the rows to `file` and returns what was written."""
+        writer = CSVWriter(file)
+        if headers:
+            writer.writerow(headers)
+        writer.writerows(rows)
+        writer.flush()
+        return writer.stats
+
+
 class CSVHandler(Logging):
     """Handles CSV operations."""
 
@@ -41,64 +137,274 @@ class CSVHandler(Logging):
             logger.warning(f"[{CSVHandler.__name__}] {file_path} does not exist. Returning empty list.")
             return []
 
+        rows = list(CSVHandler.iter_csv(file_path))
+        logger.debug(f"Read {len(rows)} rows from {file_path}")
+        return rows
+
+    @staticmethod
+    def iter_csv(file_path: str) -> Iterator[List[str]]:
+        """Streams the rows of a (possibly compressed) CSV file, skipping the header."""
+        logger = CSVHandler.get_logger()
         try:
-            with open(os.path.abspath(file_path), encoding='utf-8') as file:
-                reader = csv.reader(file, delimiter='\t')
+            with CSVHandler._open_reader(os.path.abspath(file_path)) as file:
+                reader = csv.reader(file, delimiter=CSV_DELIMITER)
                 next(reader, None)  # Skip the header
-                rows = [list(row) for row in reader]
-                logger.debug(f"Read {len(rows)} rows from {file_path}")
-                return rows
+                yield from reader
         except FileNotFoundError:
             logger.warning(f"File {os.path.abspath(file_path)} not found. Returning empty list.")
-            return []
         except Exception as e:
             logger.error(f"Error reading CSV at {os.path.abspath(file_path)}: {e}")
             raise CSVError(f"Failed to read CSV file: {file_path}")
 
     @staticmethod
     @log_exceptions(Logging.get_logger())
-    def rewrite_csv(file_path: str, headers: List[str], rows: List[List[str]]) -> None:
+    def read_ids(file_path: str) -> Set[str]:
+        """Streams the first column of a (possibly compressed) CSV file into a set, without keeping the rows."""
+        return {row[0] for row in CSVHandler.iter_csv(file_path) if row}
+
+    @staticmethod
+    def compression_of(file_path: str) -> Optional[str]:
+        """Returns the compression ('gzip' or 'zstd') implied by a file name, or None for plain files."""
+        for compression, suffix in COMPRESSION_SUFFIXES.items():
+            if file_path.endswith(suffix):
+                return compression
+        return None
+
+    @staticmethod
+    @log_exceptions(Logging.get_logger())
+    def rewrite_csv(file_path: str, headers: List[str], rows: Iterable[Sequence[str]]) -> WriteStats:
 
-        """Rewrites rows to a CSV file with the specified headers."""
+        """
+        Rewrites rows to a CSV file with the specified headers.
+
+        The rows are written to a temporary file in the same directory, fsynced once and moved over the target with
+        `os.replace`, so a crash never leaves a truncated or half-written file behind.
+        """
         logger = CSVHandler.get_logger()
+        path = os.path.abspath(file_path)
         try:
-            with open(os.path.abspath(file_path), 'w', encoding='utf-8', newline="") as file:
-                writer = csv.writer(file, delimiter='\t')
-                writer.writerow(headers)  # Write headers
-                writer.writerows(rows)
-                logger.info(f"Wrote {len(rows)} rows to {os.path.abspath(file_path)}")
+            stats = WriteStats(0, 0)
+
+            def write(file: IO[bytes]) -> None:
+                nonlocal stats
+                stats = CSVWriter.write_all(file, headers, rows)
+
+            CSVHandler._atomic_write(path, write)
+            logger.info(f"Wrote {stats.rows - 1} rows ({stats.bytes} bytes) to {path}")
+            return stats
         except Exception as e:
-            logger.error(f"Error writing to CSV at {os.path.abspath(file_path)}: {e}")
+            logger.error(f"Error writing to CSV at {path}: {e}")
             raise CSVError(f"Failed to write to CSV file: {file_path}")
 
     @staticmethod
     @log_exceptions(Logging.get_logger())
-    def append_to_csv(file_path: str, headers: List[str], rows: List[List[str]]) -> None:
+    def append_to_csv(file_path: str, headers: List[str], rows: Iterable[Sequence[str]],
+                      journal: bool = False) -> WriteStats:
+
+        """
+        Appends rows to a CSV file, writing the specified headers only when the file is new or empty.
 
-        """Appends rows to a CSV file with the specified headers."""
+        With `journal`, the original file size is first saved to an undo journal next to the file. The rows are then
+        written once, the file fsynced once and the journal removed; after a crash, `recover_journal` truncates the
+        file back to its original size, so the file never keeps a partial append.
+        """
         logger = CSVHandler.get_logger()
+        path = os.path.abspath(file_path)
         try:
-            with open(os.path.abspath(file_path), 'a', encoding='utf-8', newline="") as file:
-                writer = csv.writer(file, delimiter='\t')
-                writer.writerow(headers)  # Write headers
-                writer.writerows(rows)
-                logger.info(f"Wrote {len(rows)} rows to {os.path.abspath(file_path)}")
+            if journal:
+                CSVHandler.recover_journal(path)
+            offset = os.path.getsize(path) if os.path.exists(path) else 0
+            header = headers if offset == 0 else None
+            # Compressed files get the rows as a new member/frame, readable as one stream with the earlier ones
+            compression = CSVHandler.compression_of(path)
+
+            if not journal:
+                with open(path, 'ab') as raw:
+                    stats = CSVHandler._write_stream(raw, compression, header, rows)
+            else:
+                journal_path = path + JOURNAL_SUFFIX
+                CSVHandler._atomic_write(journal_path, lambda file: file.write(f"{offset}\n".encode('ascii')),
+                                         binary=True)
+                with open(path, 'ab') as raw:
+                    stats = CSVHandler._write_stream(raw, compression, header, rows)
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                os.remove(journal_path)  # Commits the append
+                CSVHandler._fsync_directory(os.path.dirname(path))
+            logger.info(f"Wrote {stats.rows - (header is not None)} rows ({stats.bytes} bytes) to {path}")
+            return stats
         except Exception as e:
-            logger.error(f"Error writing to CSV at {os.path.abspath(file_path)}: {e}")
+            logger.error(f"Error writing to CSV at {path}: {e}")
             raise CSVError(f"Failed to write to CSV file: {file_path}")
 
+    @staticmethod
+    def has_pending_journal(file_path: str) -> bool:
+        """Returns whether an interrupted append to a file left a journal that `recover_journal` has not handled."""
+        return os.path.exists(os.path.abspath(file_path) + JOURNAL_SUFFIX)
+
+    @staticmethod
+    @log_exceptions(Logging.get_logger())
+    def recover_journal(file_path: str) -> bool:
+        """
+        Rolls back an append interrupted by a crash, truncating the file to the size saved in its journal.
+
+        :param file_path: The file that was being appended to.
+        :return: True if an append was rolled back.
+        """
+        path = os.path.abspath(file_path)
+        journal_path = path + JOURNAL_SUFFIX
+        if not os.path.exists(journal_path):
+            return False
+
+        logger = CSVHandler.get_logger()
+        # The journal is written atomically, so it is always complete when it exists
+        with open(journal_path, 'rb') as journal:
+            offset = int(journal.readline())
+        if os.path.exists(path):
+            with open(path, 'r+b') as file:
+                file.truncate(offset)
+                file.flush()
+                os.fsync(file.fileno())
+        os.remove(journal_path)
+        CSVHandler._fsync_directory(os.path.dirname(path))
+        logger.warning(f"Rolled back an interrupted append to {path} to its first {offset} bytes.")
+        return True
+
+    @staticmethod
+    @log_exceptions(Logging.get_logger())
+    def copy_file(source: str, destination: str) -> None:
+        """
+        Copies a file through a temporary file and `os.replace`, so the destination is never missing or partial.
+
+        :param source: The file to copy.
+        :param destination: The copy to create or replace.
+        """
+        destination = os.path.abspath(destination)
+        temp_path = CSVHandler._temp_path(destination)
+        try:
+            shutil.copyfile(source, temp_path)
+            os.replace(temp_path, destination)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @staticmethod
+    @log_exceptions(Logging.get_logger())
+    def convert_file(source: str, destination: str) -> None:
+        """
+        Streams a file into a copy compressed (or decompressed) according to the destination's name.
+
+        :param source: The file to convert, compressed or not.
+        :param destination: The file to create or replace atomically.
+        """
+        with CSVHandler._open_binary_reader(os.path.abspath(source)) as reader:
+            CSVHandler._atomic_write(os.path.abspath(destination), lambda file: shutil.copyfileobj(reader, file))
+        CSVHandler.get_logger().info(f"Converted {source} to {destination}")
+
+    @staticmethod
+    def _write_stream(raw: IO[bytes], compression: Optional[str], headers: Optional[Sequence[str]],
+                      rows: Iterable[Sequence[str]]) -> WriteStats:
+        """Writes an optional header and the rows to `raw`, compressed as one member/frame when requested."""
+        stream = CSVHandler._open_writer(raw, compression)
+        stats = CSVWriter.write_all(stream, headers, rows)
+        if stream is not raw:
+            stream.close()  # Writes the gzip trailer / zstd frame end, leaving `raw` open
+        return stats
+
+    @staticmethod
+    def _atomic_write(path: str, write: Callable[[IO[bytes]], object], binary: bool = False) -> None:
+        """
+        Writes a file through a temporary file in the same directory, fsynced once, then `os.replace`.
+
+        `write` receives a binary stream, compressed according to the file name, or the raw file with `binary`.
+        """
+        temp_path = CSVHandler._temp_path(path)
+        compression = None if binary else CSVHandler.compression_of(path)
+        try:
+            with open(temp_path, 'wb') as raw:
+                stream = CSVHandler._open_writer(raw, compression)
+                write(stream)
+                if stream is not raw:
+                    stream.close()  # Writes the gzip trailer / zstd frame end
+                raw.flush()
+                os.fsync(raw.fileno())
+            if os.path.exists(path):
+                shutil.copymode(path, temp_path)
+            else:
+                os.chmod(temp_path, 0o644)  # mkstemp creates owner-only files
+            os.replace(temp_path, path)
+            CSVHandler._fsync_directory(os.path.dirname(path))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def _open_reader(path: str) -> TextIO:
+        """Opens a (possibly compressed) file for reading text, decompressing it as a stream."""
+        return io.TextIOWrapper(CSVHandler._open_binary_reader(path), encoding='utf-8', newline="")
+
+    @staticmethod
+    def _open_binary_reader(path: str) -> IO[bytes]:
+        """Opens a (possibly compressed) file for reading its decompressed bytes as a stream."""
+        compression = CSVHandler.compression_of(path)
+        if compression == 'gzip':
+            return gzip.open(path, 'rb')  # type: ignore[return-value]  # Reads all members
+        if compression == 'zstd':
+            return CSVHandler._zstd().ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True)
+        return open(path, 'rb')
+
+    @staticmethod
+    def _open_writer(raw: IO[bytes], compression: Optional[str]) -> IO[bytes]:
+        """Returns a binary stream compressing into `raw`; closing it finishes the stream but leaves `raw` open."""
+        if compression == 'gzip':
+            return gzip.GzipFile(fileobj=raw, mode='wb')  # type: ignore[return-value]
+        if compression == 'zstd':
+            return CSVHandler._zstd().ZstdCompressor().stream_writer(raw, closefd=False)
+        return raw
+
+    @staticmethod
+    def _zstd():
+        """Returns the optional zstandard module, failing clearly when it is not installed."""
+        if zstandard is None:
+            raise CSVError("zstd compression requires the 'zstandard' package (pip install zstandard).")
+        return zstandard
+
+    @staticmethod
+    def _temp_path(path: str) -> str:
+        """Creates an empty temporary file next to `path` and returns its name."""
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp',
+                                         dir=os.path.dirname(path))
+        os.close(fd)
+        return temp_path
+
+    @staticmethod
+    def _fsync_directory(directory: str) -> None:
+        """Persists a rename by fsyncing its directory, where the platform supports it."""
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
     @staticmethod
     @log_exceptions(Logging.get_logger())
-    def write_to_csv(file_path: str, headers: List[str], rows: List[List[str]], mode: str = 'w') -> None:
+    def write_to_csv(file_path: str, headers: List[str], rows: Iterable[Sequence[str]], mode: str = 'w') -> WriteStats:
 
         """Writes rows to a CSV file with the specified headers."""
         logger = CSVHandler.get_logger()
+        path = os.path.abspath(file_path)
         try:
-            with open(os.path.abspath(file_path), mode, encoding='utf-8', newline="") as file:
-                writer = csv.writer(file, delimiter='\t')
-                writer.writerow(headers)  # Write headers
-                writer.writerows(rows)
-                logger.info(f"Wrote {len(rows)} rows to {os.path.abspath(file_path)}")
+            with open(path, mode.replace('b', '') + 'b') as file:
+                stats = CSVWriter.write_all(file, headers, rows)
+            logger.info(f"Wrote {stats.rows - 1} rows ({stats.bytes} bytes) to {path}")
+            return stats
         except Exception as e:
-            logger.error(f"Error writing to CSV at {os.path.abspath(file_path)}: {e}")
+            logger.error(f"Error writing to CSV at {path}: {e}")
             raise CSVError(f"Failed to write to CSV file: {file_path}")
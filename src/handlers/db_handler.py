@@ -1,7 +1,14 @@
 import os
 import sqlite3
-from typing import List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+from zoneinfo import ZoneInfo
 
+import config
+from src.utils.date_converter import DateConverter
 from src.utils.error_handling import log_exceptions, DatabaseError
 from src.utils.logger import Logging
 
@@ -10,21 +17,65 @@ db_handler.py
 
 This module provides functionality for database interactions.
 It includes methods to connect to an SQLite database and retrieve transaction data based on specific criteria.
+It can also read the backups of several household members at once and merge them into a single stream,
+or stream the rows of one backup in batches straight from the cursor, and diff two backups in a single query.
+Date filters are compared as the UTC timestamps of local midnights in the configured time zone (`DateConverter`), so
+a transaction is selected by the same local date it is exported with.
 
 Classes:
     DBHandler: Provides an interface for performing database queries.
+    TransactionCache: Reads each backup once for several syncs of the same process.
 
 Exceptions:
     DatabaseError: Raised when a database operation encounters an error.
 """
 
+# Transactions of a date and the days after it: created from the local midnight starting that date on
 GET_TRANSACTIONS_QUERY = """
                 SELECT t.transaction_pk, t.name, t.amount, c.name AS category_name, t.date_created
                 FROM transactions t
                 JOIN categories c ON t.category_fk = c.category_pk
-                WHERE t.date_created > strftime('%s', ?)
+                WHERE t.date_created >= ?
             """
 
+# Half-open [start, end) range used for partitioned exports, so adjacent partitions never overlap or leave gaps
+GET_TRANSACTIONS_BETWEEN_QUERY = """
+                SELECT t.transaction_pk, t.name, t.amount, c.name AS category_name, t.date_created
+                FROM transactions t
+                JOIN categories c ON t.category_fk = c.category_pk
+                WHERE t.date_created >= ? AND t.date_created < ?
+            """
+
+# Transactions added, removed and modified between an older backup (attached as `old`) and a newer one (`main`), in
+# one set-based pass: the lookups across backups go through the transaction primary keys. Each part keeps only the
+# transactions created from the timestamp :since on (the newer version for modified ones); a NULL :since keeps them all.
+SNAPSHOT_DIFF_QUERY = """
+                SELECT 'added', n.transaction_pk, n.name, n.amount, nc.name, n.date_created, NULL, NULL, NULL, NULL
+                FROM main.transactions n
+                JOIN main.categories nc ON n.category_fk = nc.category_pk
+                WHERE NOT EXISTS (SELECT 1 FROM old.transactions o WHERE o.transaction_pk = n.transaction_pk)
+                  AND (:since IS NULL OR n.date_created >= :since)
+                UNION ALL
+                SELECT 'removed', o.transaction_pk, o.name, o.amount, oc.name, o.date_created, NULL, NULL, NULL, NULL
+                FROM old.transactions o
+                JOIN old.categories oc ON o.category_fk = oc.category_pk
+                WHERE NOT EXISTS (SELECT 1 FROM main.transactions n WHERE n.transaction_pk = o.transaction_pk)
+                  AND (:since IS NULL OR o.date_created >= :since)
+                UNION ALL
+                SELECT 'modified', n.transaction_pk, n.name, n.amount, nc.name, n.date_created,
+                       o.name, o.amount, oc.name, o.date_created
+                FROM main.transactions n
+                JOIN main.categories nc ON n.category_fk = nc.category_pk
+                JOIN old.transactions o ON o.transaction_pk = n.transaction_pk
+                JOIN old.categories oc ON o.category_fk = oc.category_pk
+                WHERE (n.name IS NOT o.name OR n.amount IS NOT o.amount OR nc.name IS NOT oc.name
+                       OR n.date_created IS NOT o.date_created)
+                  AND (:since IS NULL OR n.date_created >= :since)
+            """
+
+# Upper bound appended to GET_TRANSACTIONS_QUERY when a date range end is requested: the local midnight ending it
+DATE_TO_CONDITION = " AND t.date_created < ?"
+
 
 class DBHandler(Logging):
     """
@@ -39,13 +90,196 @@ class DBHandler(Logging):
 
     @staticmethod
     @log_exceptions(Logging.get_logger())
-    def fetch_transactions(db_path: str, date_filter: str) -> List[tuple]:
+    def fetch_transactions(db_path: str, date_filter: str, date_to: Optional[str] = None,
+                           zone: Optional[ZoneInfo] = None) -> List[tuple]:
         """
         Fetch transactions from the database that occur after a specified date.
 
         :param db_path: A string representing the absolute path to the SQLite database file.
         :param date_filter: A string representing the date filter in 'YYYY-MM-DD' format.
+        :param date_to: Optional inclusive end date in 'YYYY-MM-DD' format.
+        :param zone: Time zone of the date bounds, defaults to the one of the process settings.
+        :return: A list of tuples, each representing a transaction's details.
+        :raises DatabaseError: If an operational error occurs during the database query.
+        """
+        query, params = DBHandler._range_query(date_filter, date_to, zone)
+        return DBHandler._fetch(db_path, query, params)
+
+    @staticmethod
+    def iter_transactions(db_path: str, date_filter: str, date_to: Optional[str] = None,
+                          batch_size: int = config.PIPELINE_BATCH_SIZE,
+                          zone: Optional[ZoneInfo] = None) -> Iterator[List[tuple]]:
+        """
+        Stream the transactions of `fetch_transactions` in batches, so only one batch of rows is held at a time.
+
+        The connection stays open while the batches are consumed and is closed once they are exhausted or the
+        iterator is closed.
+
+        :param db_path: A string representing the absolute path to the SQLite database file.
+        :param date_filter: A string representing the date filter in 'YYYY-MM-DD' format.
+        :param date_to: Optional inclusive end date in 'YYYY-MM-DD' format.
+        :param batch_size: Number of rows per batch.
+        :param zone: Time zone of the date bounds, defaults to the one of the process settings.
+        :return: An iterator of lists of transaction tuples, as returned by the cursor.
+        :raises DatabaseError: If an operational error occurs during the database query.
+        """
+        query, params = DBHandler._range_query(date_filter, date_to, zone)
+        db_path = os.path.abspath(db_path)
+        logger = DBHandler.get_logger()
+        logger.debug(f"Streaming transactions from DB at {db_path}")
+        conn, count = None, 0
+        try:
+            conn = sqlite3.connect(db_path)
+            cursor = conn.execute(query, params)
+            while batch := cursor.fetchmany(batch_size):
+                count += len(batch)
+                yield batch
+            logger.info(f"Streamed {count} transactions.")
+        except sqlite3.OperationalError as e:
+            logger.error(f"Database operation failed: {e}")
+            raise DatabaseError(f"Failed to fetch transactions: {e}")
+        finally:
+            if conn:
+                conn.close()
+                logger.debug("Database connection closed.")
+
+    @staticmethod
+    def iter_backup_diff(old_db_path: str, new_db_path: str, date_filter: Optional[str] = None,
+                         batch_size: int = config.PIPELINE_BATCH_SIZE,
+                         zone: Optional[ZoneInfo] = None) -> Iterator[List[tuple]]:
+        """
+        Stream the transactions added, removed and modified between two backups, in batches.
+
+        Both backups are opened read-only in one connection, the older one attached, and compared with a single
+        set-based query (`SNAPSHOT_DIFF_QUERY`), so neither is exported or loaded into memory.
+
+        :param old_db_path: Path to the older SQLite database file.
+        :param new_db_path: Path to the newer SQLite database file.
+        :param date_filter: Optional date in 'YYYY-MM-DD' format; only transactions created from it on are compared.
+        :param batch_size: Number of rows per batch.
+        :param zone: Time zone of the date bounds, defaults to the one of the process settings.
+        :return: An iterator of lists of (change, id, name, amount, category, timestamp, old name, old amount,
+                 old category, old timestamp) tuples; change is 'added', 'removed' or 'modified', and the old values
+                 are only set for modified transactions.
+        :raises DatabaseError: If a backup cannot be opened or queried.
+        """
+        logger = DBHandler.get_logger()
+        conn, count = None, 0
+        try:
+            conn = sqlite3.connect(DBHandler._read_only_uri(new_db_path), uri=True)
+            conn.execute("ATTACH DATABASE ? AS old", (DBHandler._read_only_uri(old_db_path),))
+            since = DateConverter.of(zone).day_start(date_filter) if date_filter is not None else None
+            cursor = conn.execute(SNAPSHOT_DIFF_QUERY, {'since': since})
+            while batch := cursor.fetchmany(batch_size):
+                count += len(batch)
+                yield batch
+            logger.info(f"Found {count} changed transactions between {old_db_path} and {new_db_path}.")
+        except sqlite3.Error as e:
+            logger.error(f"Database operation failed: {e}")
+            raise DatabaseError(f"Failed to diff {old_db_path} and {new_db_path}: {e}")
+        finally:
+            if conn:
+                conn.close()
+
+    @staticmethod
+    def _read_only_uri(db_path: str) -> str:
+        """Returns the URI opening a database file read-only, so a missing backup is an error, not a new file."""
+        return Path(os.path.abspath(db_path)).as_uri() + "?mode=ro"
+
+    @staticmethod
+    @log_exceptions(Logging.get_logger())
+    def fetch_transactions_between(db_path: str, start: str, end: str, zone: Optional[ZoneInfo] = None) -> List[tuple]:
+        """
+        Fetch transactions created within a half-open date range.
+
+        :param db_path: A string representing the absolute path to the SQLite database file.
+        :param start: Inclusive start date in 'YYYY-MM-DD' format.
+        :param end: Exclusive end date in 'YYYY-MM-DD' format.
+        :param zone: Time zone of the date bounds, defaults to the one of the process settings.
         :return: A list of tuples, each representing a transaction's details.
+        :raises DatabaseError: If an operational error occurs during the database query.
+        """
+        converter = DateConverter.of(zone)
+        return DBHandler._fetch(db_path, GET_TRANSACTIONS_BETWEEN_QUERY,
+                                (converter.day_start(start), converter.day_start(end)))
+
+    @staticmethod
+    @log_exceptions(Logging.get_logger())
+    def fetch_household_transactions(sources: Mapping[str, str], date_filter: str,
+                                     date_to: Optional[str] = None, zone: Optional[ZoneInfo] = None) -> List[tuple]:
+        """
+        Fetch transactions from the backups of several people, e.g. one per phone, as one merged stream.
+
+        :param sources: Person -> path of their database file. The order sets the precedence of duplicates.
+        :param date_filter: A string representing the date filter in 'YYYY-MM-DD' format.
+        :param date_to: Optional inclusive end date in 'YYYY-MM-DD' format.
+        :param zone: Time zone of the date bounds, defaults to the one of the process settings.
+        :return: Transaction tuples with the person appended as a sixth field, without duplicate IDs.
+        :raises DatabaseError: If an operational error occurs while querying any of the databases.
+        """
+        return DBHandler._fetch_household(sources, lambda db_path: DBHandler.fetch_transactions(
+            db_path, date_filter, date_to, zone))
+
+    @staticmethod
+    @log_exceptions(Logging.get_logger())
+    def fetch_household_transactions_between(sources: Mapping[str, str], start: str, end: str,
+                                             zone: Optional[ZoneInfo] = None) -> List[tuple]:
+        """
+        Fetch transactions created within a half-open date range from the backups of several people.
+
+        :param sources: Person -> path of their database file. The order sets the precedence of duplicates.
+        :param start: Inclusive start date in 'YYYY-MM-DD' format.
+        :param end: Exclusive end date in 'YYYY-MM-DD' format.
+        :param zone: Time zone of the date bounds, defaults to the one of the process settings.
+        :return: Transaction tuples with the person appended as a sixth field, without duplicate IDs.
+        :raises DatabaseError: If an operational error occurs while querying any of the databases.
+        """
+        return DBHandler._fetch_household(sources, lambda db_path: DBHandler.fetch_transactions_between(
+            db_path, start, end, zone))
+
+    @staticmethod
+    def _fetch_household(sources: Mapping[str, str], fetch: Callable[[str], List[tuple]]) -> List[tuple]:
+        """
+        Queries every backup concurrently and merges the results, stamping each row with its owner.
+
+        Cashew transaction IDs are UUIDs, so a transaction found in several backups (e.g. a shared account synced
+        to two phones) is the same transaction; it is kept once, attributed to the first person listed.
+        """
+        logger = DBHandler.get_logger()
+        with ThreadPoolExecutor(max_workers=max(len(sources), 1)) as pool:  # sqlite3 releases the GIL while querying
+            results = list(pool.map(fetch, sources.values()))
+
+        merged, seen = [], set()
+        for who, rows in zip(sources, results):
+            for row in rows:
+                transaction_id = str(row[0])
+                if transaction_id not in seen:
+                    seen.add(transaction_id)
+                    merged.append((*row[:5], who))
+        duplicates = sum(map(len, results)) - len(merged)
+        logger.info(f"Merged {len(merged)} transactions from {len(sources)} backups ({duplicates} duplicates dropped).")
+        return merged
+
+    @staticmethod
+    def _range_query(date_filter: str, date_to: Optional[str],
+                     zone: Optional[ZoneInfo] = None) -> Tuple[str, tuple]:
+        """
+        Returns the transactions query of a date range and its timestamp bounds in a time zone.
+
+        :param date_filter: Inclusive start date in 'YYYY-MM-DD' format.
+        :param date_to: Optional inclusive end date in 'YYYY-MM-DD' format.
+        :param zone: Time zone of the date bounds, defaults to the one of the process settings.
+        """
+        converter = DateConverter.of(zone)
+        if date_to is None:
+            return GET_TRANSACTIONS_QUERY, (converter.day_start(date_filter),)
+        return GET_TRANSACTIONS_QUERY + DATE_TO_CONDITION, (converter.day_start(date_filter), converter.day_end(date_to))
+
+    @staticmethod
+    def _fetch(db_path: str, query: str, params: tuple) -> List[tuple]:
+        """
+        Runs a query against the database and returns all resulting rows.
+
         :raises DatabaseError: If an operational error occurs during the database query.
         """
         conn = None  # Initialize conn to None to ensure it is always defined
@@ -55,7 +289,7 @@ class DBHandler(Logging):
         try:
             conn = sqlite3.connect(db_path)  # Try to create the database connection
             cursor = conn.cursor()
-            cursor.execute(GET_TRANSACTIONS_QUERY, (date_filter,))
+            cursor.execute(query, params)
             rows = cursor.fetchall()
             logger.info(f"Fetched {len(rows)} transactions.")
             return rows
@@ -66,3 +300,82 @@ class DBHandler(Logging):
             if conn:  # Ensure conn is only closed if it was successfully initialized
                 conn.close()
                 logger.debug("Database connection closed.")
+
+
+class TransactionCache(Logging):
+    """
+    Reads each backup once for several syncs of the same process, e.g. profiles syncing one backup to several sheets.
+
+    The date ranges of the syncs are reserved up front. The first sync asking for a backup reads it over the widest
+    range reserved for it, while the others wait, and every sync gets the rows of its own range, filtered in memory
+    with the bounds the SQL queries use. The shared read is widened by `ZONE_MARGIN`, so profiles in different time
+    zones all find the rows of their local days in it.
+    """
+
+    # Widest difference between two UTC offsets (UTC-12 to UTC+14), rounded up to whole days
+    ZONE_MARGIN = timedelta(days=2)
+
+    def __init__(self):
+        super().__init__()
+        self._windows: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._rows: Dict[str, List[tuple]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, db_path: str, date_filter: str, date_to: Optional[str] = None) -> None:
+        """
+        Widens the range read from a backup so it also covers a sync.
+
+        :param db_path: Path to the SQLite database file.
+        :param date_filter: Inclusive start date in 'YYYY-MM-DD' format.
+        :param date_to: Optional inclusive end date in 'YYYY-MM-DD' format, None for no end.
+        """
+        db_path = os.path.abspath(db_path)
+        with self._lock:
+            window = self._windows.get(db_path)
+            if window is None:
+                self._windows[db_path] = (date_filter, date_to)
+            else:
+                lower = min(window[0], date_filter, key=date.fromisoformat)
+                upper = None
+                if window[1] is not None and date_to is not None:
+                    upper = max(window[1], date_to, key=date.fromisoformat)
+                self._windows[db_path] = (lower, upper)
+            self._locks.setdefault(db_path, threading.Lock())
+
+    @log_exceptions(Logging.get_logger())
+    def fetch(self, db_path: str, date_filter: str, date_to: Optional[str] = None,
+              zone: Optional[ZoneInfo] = None) -> List[tuple]:
+        """
+        Returns the transactions of a date range, like `DBHandler.fetch_transactions`, reading the backup only once.
+
+        A range that was not reserved before the backup was read is queried directly.
+
+        :param db_path: Path to the SQLite database file.
+        :param date_filter: Inclusive start date in 'YYYY-MM-DD' format.
+        :param date_to: Optional inclusive end date in 'YYYY-MM-DD' format.
+        :param zone: Time zone of the date bounds, defaults to the one of the process settings.
+        :return: A list of tuples, each representing a transaction's details.
+        :raises DatabaseError: If an operational error occurs during the database query.
+        """
+        db_path = os.path.abspath(db_path)
+        if db_path not in self._windows:
+            self.reserve(db_path, date_filter, date_to)
+        with self._locks[db_path]:
+            if db_path not in self._rows:
+                window = self._windows[db_path]
+                lower = (date.fromisoformat(window[0]) - self.ZONE_MARGIN).isoformat()
+                upper = (date.fromisoformat(window[1]) + self.ZONE_MARGIN).isoformat() if window[1] else None
+                self._rows[db_path] = DBHandler.fetch_transactions(db_path, lower, upper)
+                self.logger.info(f"Cached {len(self._rows[db_path])} transactions of {db_path} for "
+                                 f"{window[0]} to {window[1] or 'now'}.")
+        lower, upper = self._windows[db_path]
+        if date.fromisoformat(date_filter) < date.fromisoformat(lower) or (
+                upper is not None and (date_to is None or date.fromisoformat(date_to) > date.fromisoformat(upper))):
+            self.logger.debug(f"Range {date_filter} to {date_to} was not reserved, querying {db_path} directly.")
+            return DBHandler.fetch_transactions(db_path, date_filter, date_to, zone)
+
+        # Same bounds as the SQL: the local midnights starting date_filter and ending date_to
+        _, bounds = DBHandler._range_query(date_filter, date_to, zone)
+        start, end = bounds[0], bounds[1] if date_to else None
+        return [row for row in self._rows[db_path] if row[4] >= start and (end is None or row[4] < end)]
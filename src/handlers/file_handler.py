@@ -1,12 +1,11 @@
-import csv
 import os
-import re
 from datetime import datetime
-from typing import Optional
-from typing import TextIO  # noqa: F401
+from typing import Iterable, List, Optional, Sequence
 
-from config import CSV_DELIMITER
+import config
+from src.handlers.csv_handler import CSVWriter, WriteStats
 from src.utils.logger import Logging
+from src.utils.settings import Settings
 
 
 class FileHandler:
@@ -19,35 +18,47 @@ class FileHandler:
         pass
 
     @staticmethod
-    def write_to_file(file_path: str, rows: list[list[str]]) -> None:
+    def write_to_file(file_path: str, rows: Iterable[Sequence[str]]) -> WriteStats:
         """
-        Writes a list of rows to a CSV file.
+        Writes rows to a CSV file, without a header.
 
         :param file_path: Absolute or relative path to the CSV file.
-        :param rows: A list of rows, where each row is represented as a list or tuple.
+        :param rows: An iterable of rows, where each row is represented as a list or tuple.
+        :return: The number of rows and bytes written.
         :raises IOError: If an error occurs while writing to the file.
         """
         try:
-            # Use TextIO as the type for a file object when using context managers
-            with open(file_path, mode="w", newline="", encoding="utf-8") as csv_file:
-                writer = csv.writer(csv_file, delimiter=CSV_DELIMITER, quoting=csv.QUOTE_MINIMAL)
-                writer.writerows(rows)
+            with open(file_path, mode="wb") as csv_file:
+                return CSVWriter.write_all(csv_file, None, rows)
         except Exception as e:
             raise IOError(f"Failed to write to file {file_path}: {e}")
 
     @staticmethod
-    def find_latest_sql_file(directory: str) -> str:
+    def find_latest_sql_file(directory: str, settings: Optional[Settings] = None) -> str:
         """
         Locates the most recent SQL file in a directory based on its file name pattern (directly in the directory, not recursively).
 
         :param directory: Directory to search for files.
+        :param settings: Settings holding the file name patterns, defaults to the process settings.
         :return: The absolute path to the SQL file with the most recent timestamp.
         :raises FileNotFoundError: If no matching file is found.
         """
-        import config  # Import config dynamically if not already imported
+        return FileHandler.find_sql_files(directory, settings)[-1]
 
-        # Compile the SQL_FILE_NAME_REGEX from config.py
-        sql_file_name_pattern = re.compile(config.SQL_FILE_NAME_REGEX)
+    @staticmethod
+    def find_sql_files(directory: str, settings: Optional[Settings] = None) -> List[str]:
+        """
+        Lists the SQL files of a directory matching the file name pattern, oldest first by their file name timestamp.
+
+        :param directory: Directory to search for files (not recursively).
+        :param settings: Settings holding the file name patterns, defaults to the process settings.
+        :return: The absolute paths of the SQL files; files without a valid timestamp come first.
+        :raises FileNotFoundError: If no matching file is found.
+        """
+        settings = settings or Settings.current()
+
+        # The file name patterns are compiled once and cached on the settings
+        sql_file_name_pattern = settings.sql_file_name_pattern
 
         try:
             # Get all files in the provided directory (non-recursive)
@@ -60,7 +71,7 @@ class FileHandler:
 
         if not files_in_directory:
             raise FileNotFoundError(
-                f"No matching '{config.DB_FILE_PREFIX}' {config.DB_FILE_SUFFIX} files found in {directory}")
+                f"No matching '{settings.db_file_prefix}' {settings.db_file_suffix} files found in {directory}")
 
         # Extract timestamps and sort files by datetime
         def extract_timestamp(file_name: str) -> Optional[datetime]:
@@ -70,8 +81,7 @@ class FileHandler:
             :param file_name: Name of the file to extract the timestamp.
             :return: Parsed datetime object if the timestamp is valid, or None.
             """
-            sql_file_datetime_pattern = re.compile(config.SQL_FILE_DATETIME_REGEX)
-            match = sql_file_datetime_pattern.search(file_name)
+            match = settings.sql_file_datetime_pattern.search(file_name)
             if match:
                 try:
                     # Extract timestamp group captured by the regex
@@ -80,39 +90,31 @@ class FileHandler:
                     return None
             return None
 
-        try:
-            latest_file = max(
-                files_in_directory,
-                key=lambda f: extract_timestamp(f) or datetime.min  # Use `datetime.min` for invalid cases
-            )
-            return os.path.abspath(latest_file)
-        except ValueError:
-            raise FileNotFoundError(
-                f"No valid timestamp found in the {config.DB_FILE_PREFIX} {config.DB_FILE_SUFFIX} file names in {directory}."
-            )
+        files_in_directory.sort(key=lambda f: extract_timestamp(f) or datetime.min)  # `datetime.min` for invalid cases
+        return [os.path.abspath(file) for file in files_in_directory]
 
     @staticmethod
-    def get_db_directory(cli_args) -> str:
+    def get_db_directory(db_directory: Optional[str] = None) -> str:
         """
         Determines the database directory.
 
-        :param cli_args: The list of command-line arguments.
+        :param db_directory: The directory passed on the command line, if any.
         :return: The path to the database directory.
         """
         # Assuming an existing logger is available for use
         logger = Logging.get_logger()
 
-        logger.debug(f"CLI args: {cli_args}")
+        logger.debug(f"Requested DB directory: {db_directory}")
         # Default: Look for db dir in current location ./db, ./workdir, and ./workdir/db
-        # If the first CLI argument is provided, use it as the db_directory
-        if len(cli_args) > 1:
-            db_path = os.path.abspath(cli_args[1])
-            # Check if it's a file, as the db should be a file, not a directory
+        # If a directory is provided, use it as the db_directory
+        if db_directory:
+            db_path = os.path.abspath(db_directory)
+            # Check if it's a directory, as the db files are looked up inside it
             if os.path.isdir(db_path):
-                logger.debug(f"Using provided DB file: {db_path}")
+                logger.debug(f"Using provided DB directory: {db_path}")
                 return db_path
             else:
-                logger.error(f"Provided DB path is not a valid file: {db_path}")
+                logger.error(f"Provided DB path is not a valid directory: {db_path}")
                 return ''
 
         else:
@@ -139,16 +141,16 @@ class FileHandler:
             return current_dir
 
     @staticmethod
-    def get_output_directory(cli_args: list[str]) -> str:
+    def get_output_directory(output_directory: Optional[str] = None) -> str:
         """
         Determines the output directory.
 
-        :param cli_args: The list of command-line arguments.
+        :param output_directory: The directory passed on the command line, if any.
         :return: The path to the output directory.
         """
-        # If the second CLI argument is provided, ensure we use only the directory
-        if len(cli_args) > 2:
-            provided_path = os.path.abspath(cli_args[2])
+        # If an output path is provided, ensure we use only the directory
+        if output_directory:
+            provided_path = os.path.abspath(output_directory)
             # Extract directory if it is a file path
             return os.path.dirname(provided_path) if os.path.isfile(provided_path) else provided_path
         else:
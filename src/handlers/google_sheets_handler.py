@@ -1,22 +1,29 @@
+import hashlib
 import os
-from typing import List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 from google.oauth2.service_account import Credentials  # pragma: no cover
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
-from config import MY_DEFAULT_RANGE
+from config import (COLUMN_ORDER, MY_DEFAULT_RANGE, SHEET_FINGERPRINT_COLUMN, SHEET_INDEX_BUCKETS,
+                    SHEET_INDEX_MAX_LOOKUP, SHEET_INDEX_TAB, SHEET_READ_CHUNK_ROWS, SHEET_TAB_CELLS)
+from src.utils.error_handling import TransactionProcessingError
 from src.utils.logger import Logging
 
 # Define the required Google API scope
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 
+# Raw cell values skip server-side formatting and keep the response small
+UNFORMATTED_VALUE = 'UNFORMATTED_VALUE'
+
 
 class GoogleSheetsHandler(Logging):
     """Handles interactions with the Google Sheets API."""
 
-    def __init__(self, spreadsheet_id: str, credentials_file: Optional[str] = None, token_file: Optional[str] = None):
+    def __init__(self, spreadsheet_id: str, credentials_file: Optional[str] = None, token_file: Optional[str] = None,
+                 service: Optional[Any] = None, default_range: Optional[str] = None):
         """
         Initialize the Google Sheets handler.
 
@@ -24,12 +31,16 @@ class GoogleSheetsHandler(Logging):
             spreadsheet_id (str): The ID of the Google Spreadsheet to interact with.
             credentials_file (Optional[str]): Path to the client_secret.json file (for Installed App Flow).
             token_file (Optional[str]): Path to the token.json file for caching user credentials.
+            service (Optional[Any]): An already built Sheets API service (e.g., a SheetsEmulator), skipping
+                                     authentication.
+            default_range (Optional[str]): Range used when a method is given none, defaults to MY_DEFAULT_RANGE.
         """
         super().__init__()
         self.spreadsheet_id = spreadsheet_id
         self.credentials_file = credentials_file
         self.token_file = token_file
-        self.service = None  # Cached instance of the Google Sheets API service
+        self.service = service  # Cached instance of the Google Sheets API service
+        self.default_range = default_range or MY_DEFAULT_RANGE
         self.logger.info("GoogleSheetsHandler initialized with Spreadsheet ID: %s", spreadsheet_id)
 
     def _authenticate_service(self) -> None:
@@ -39,25 +50,52 @@ class GoogleSheetsHandler(Logging):
             return
 
         try:
-            if self.credentials_file and os.path.exists(self.credentials_file):
-                self.logger.info("Authenticating with Service Account file: %s", self.credentials_file)
-                credentials = Credentials.from_service_account_file(self.credentials_file, scopes=SCOPES)
-            elif not self.credentials_file:
-                self.logger.warning(
-                    "Service account file not found. Fallback to Installed App Flow with credentials file: %s",
-                    self.credentials_file)
-                credentials = self._authenticate_with_installed_app_flow()
-            else:
-                msg = f"No valid credentials file found for authentication under {self.credentials_file}."
-                self.logger.error(msg)
-                raise FileNotFoundError(msg)
-
-            self.service = build('sheets', 'v4', credentials=credentials)
+            self.service = self.build_service(self.load_credentials())
             self.logger.info("Google Sheets API service successfully authenticated and initialized.")
         except Exception as error:
             self.logger.exception("Failed to authenticate and initialize Google Sheets API service: %s", error)
             raise
 
+    def load_credentials(self) -> Any:
+        """
+        Loads the credentials of the service account file, or runs the Installed App Flow when none is configured.
+
+        Credentials can be shared by several handlers, so a process syncing many spreadsheets authenticates once.
+
+        Returns:
+            Any: Google credentials accepted by `build_service`.
+
+        Raises:
+            FileNotFoundError: If the configured credentials file does not exist.
+        """
+        if self.credentials_file and os.path.exists(self.credentials_file):
+            self.logger.info("Authenticating with Service Account file: %s", self.credentials_file)
+            return Credentials.from_service_account_file(self.credentials_file, scopes=SCOPES)
+        if not self.credentials_file:
+            self.logger.warning(
+                "Service account file not found. Fallback to Installed App Flow with credentials file: %s",
+                self.credentials_file)
+            return self._authenticate_with_installed_app_flow()
+        msg = f"No valid credentials file found for authentication under {self.credentials_file}."
+        self.logger.error(msg)
+        raise FileNotFoundError(msg)
+
+    @staticmethod
+    def build_service(credentials: Any) -> Any:
+        """
+        Builds a Sheets API service from credentials.
+
+        A service owns its HTTP connection and is not thread-safe: threads share the credentials and build one
+        service each, which they then reuse for every spreadsheet (the spreadsheet ID is a request parameter).
+
+        Args:
+            credentials (Any): Credentials returned by `load_credentials`.
+
+        Returns:
+            Any: The Sheets API service.
+        """
+        return build('sheets', 'v4', credentials=credentials, cache_discovery=False)
+
     def _authenticate_with_installed_app_flow(self):
         """Authenticate using Installed App Flow and cache credentials."""
         if not self.credentials_file:
@@ -97,8 +135,8 @@ class GoogleSheetsHandler(Logging):
                 raise RuntimeError("Google Sheets API service is not initialized correctly.")
             sheet = self.service.spreadsheets()
             if range_name is None:
-                range_name = MY_DEFAULT_RANGE
-                self.logger.info("Range not provided. Using default range: %s", MY_DEFAULT_RANGE)
+                range_name = self.default_range
+                self.logger.info("Range not provided. Using default range: %s", range_name)
             result = sheet.values().get(spreadsheetId=self.spreadsheet_id, range=range_name).execute()
             values = result.get('values', [])
             if not values:
@@ -110,10 +148,116 @@ class GoogleSheetsHandler(Logging):
             self.logger.exception("An error occurred while reading transactions: %s", error)
             return []
 
+    def read_columns(self, columns: List[str], range_name: Optional[str] = None,
+                     value_render_option: str = UNFORMATTED_VALUE,
+                     fields: Optional[str] = 'valueRanges.values') -> Dict[str, List[Any]]:
+        """
+        Reads only the given columns of a range, column-major, in a single batchGet request.
+
+        Compared with `read_transactions`, this skips the columns that are not needed and requests unformatted
+        values, which shrinks the response and the time spent parsing it on large sheets.
+
+        Args:
+            columns (List[str]): Column letters to read (e.g., ["G", "J"]).
+            range_name (str, optional): Range in A1 notation the columns are projected from (e.g., "Sheet1!G2:M").
+                                        Defaults to `default_range`.
+            value_render_option (str): How values are rendered ("UNFORMATTED_VALUE", "FORMATTED_VALUE" or "FORMULA").
+            fields (str, optional): Partial response field mask, or None for the full response.
+
+        Returns:
+            Dict[str, List[Any]]: The cell values of every column, keyed by column letter.
+        """
+        self._authenticate_service()
+        if not self.service:
+            raise RuntimeError("Google Sheets API service is not initialized correctly.")
+        if range_name is None:
+            range_name = self.default_range
+            self.logger.info("Range not provided. Using default range: %s", range_name)
+
+        request: Dict[str, Any] = {
+            'spreadsheetId': self.spreadsheet_id,
+            'ranges': [self.project_range(range_name, column) for column in columns],
+            'majorDimension': 'COLUMNS',
+            'valueRenderOption': value_render_option,
+        }
+        if fields:
+            request['fields'] = fields
+
+        try:
+            result = self.service.spreadsheets().values().batchGet(**request).execute()
+            value_ranges = result.get('valueRanges', [])
+            # Each projected range holds a single column, returned in the requested order
+            values = {column: (value_range.get('values') or [[]])[0] for column, value_range in zip(columns, value_ranges)}
+            self.logger.info("Read %d columns from range: %s", len(values), range_name)
+            return values
+        except HttpError as error:
+            self.logger.exception("An error occurred while reading columns: %s", error)
+            return {}
+
+    def read_ids(self, range_name: Optional[str] = None) -> List[str]:
+        """
+        Reads only the transaction ID column (the first column of the range).
+
+        Args:
+            range_name (str, optional): Range in A1 notation (e.g., "Sheet1!G2:M"). Defaults to `default_range`.
+
+        Returns:
+            List[str]: The IDs in sheet order.
+        """
+        range_name = range_name or self.default_range
+        id_column, _ = self._extract_column_and_row(self._split_range(range_name)[1].split(':')[0])
+        values = self.read_columns([id_column], range_name, fields='valueRanges.values')
+        return [self._cell_to_str(value) for value in values.get(id_column, [])]
+
+    def iter_ids(self, range_name: Optional[str] = None, chunk_rows: int = SHEET_READ_CHUNK_ROWS) -> Iterator[str]:
+        """
+        Streams the transaction ID column in chunks of rows, so a large sheet is never downloaded in one response.
+
+        Reading stops at the first chunk that is not full, i.e. at the end of the data.
+
+        Args:
+            range_name (str, optional): Range in A1 notation (e.g., "Sheet1!G2:M"). Defaults to `default_range`.
+            chunk_rows (int): Number of rows read per request.
+
+        Returns:
+            Iterator[str]: The IDs in sheet order.
+        """
+        range_name = range_name or self.default_range
+        first_row = self._extract_column_and_row(self._split_range(range_name)[1].split(':')[0])[1]
+        while True:
+            ids = self.read_ids(self.rows_range(first_row, first_row + chunk_rows - 1, range_name))
+            yield from ids
+            if len(ids) < chunk_rows:
+                return
+            first_row += chunk_rows
+
+    def iter_transactions(self, range_name: Optional[str] = None,
+                          chunk_rows: int = SHEET_READ_CHUNK_ROWS) -> Iterator[List[str]]:
+        """
+        Streams the rows of a range in chunks of rows, like `iter_ids` does for the ID column.
+
+        Args:
+            range_name (str, optional): Range in A1 notation (e.g., "Sheet1!G2:M"). Defaults to `default_range`.
+            chunk_rows (int): Number of rows read per request.
+
+        Returns:
+            Iterator[List[str]]: The rows in sheet order.
+        """
+        range_name = range_name or self.default_range
+        first_row = self._extract_column_and_row(self._split_range(range_name)[1].split(':')[0])[1]
+        while True:
+            rows = self.read_transactions(self.rows_range(first_row, first_row + chunk_rows - 1, range_name))
+            yield from rows
+            if len(rows) < chunk_rows:
+                return
+            first_row += chunk_rows
+
     def append_transactions(self, transactions: List[List[str]], range_name: Optional[str] = None) -> None:
         """
         Appends a list of transactions to the specified range in the Google Sheet.
 
+        A failed request is logged and raised, so callers never record rows the sheet did not acknowledge.
+
         Args:
             transactions (List[List[str]]): A list of rows, where each row represents a transaction to append.
             range_name (str, optional): The target range in A1 notation (e.g., "Sheet1!A1:D").
@@ -126,8 +270,8 @@ class GoogleSheetsHandler(Logging):
         if not range_name:  # Automatically find the range in case it's not provided.
             range_name = self.find_first_empty_row()
 
-        # Ensure we're logging the inputs just before making the call
-        self.logger.info("Appending transactions: %s to range: %s", transactions, range_name)
+        # The rows themselves are only logged at DEBUG, and shortened by the logger's payload cap
+        self.logger.debug("Appending transactions: %s to range: %s", transactions, range_name)
 
         try:
             sheet = self.service.spreadsheets()
@@ -143,6 +287,234 @@ class GoogleSheetsHandler(Logging):
             self.logger.info("Successfully appended transactions to %s", range_name)
         except HttpError as error:
             self.logger.exception("An error occurred while appending transactions: %s", error)
+            raise
+
+    def list_tabs(self) -> List[str]:
+        """
+        Returns the titles of all tabs of the spreadsheet, reading only the titles.
+
+        Returns:
+            List[str]: The tab titles, in sheet order.
+        """
+        self._authenticate_service()
+        if not self.service:
+            raise RuntimeError("Google Sheets API service is not initialized correctly.")
+
+        try:
+            metadata = self.service.spreadsheets().get(spreadsheetId=self.spreadsheet_id,
+                                                       fields='sheets.properties.title').execute()
+            return [tab['properties']['title'] for tab in metadata.get('sheets', [])]
+        except HttpError as error:
+            self.logger.exception("An error occurred while listing tabs: %s", error)
+            raise
+
+    def ensure_tabs(self, tab_names: List[str], hidden: bool = False) -> List[str]:
+        """
+        Creates the tabs that do not exist yet, all in a single batchUpdate request.
+
+        Args:
+            tab_names (List[str]): Titles of the tabs that must exist.
+            hidden (bool): Create the missing tabs hidden, e.g. for bookkeeping tabs.
+
+        Returns:
+            List[str]: Titles of the tabs that were created.
+        """
+        existing = set(self.list_tabs())
+        missing = [name for name in dict.fromkeys(tab_names) if name not in existing]
+        if not missing:
+            self.logger.debug("All %d tabs already exist.", len(tab_names))
+            return []
+        if not self.service:
+            raise RuntimeError("Google Sheets API service is not initialized correctly.")
+
+        try:
+            properties: List[Dict[str, Any]] = [{'title': name, 'hidden': True} if hidden else {'title': name}
+                                                for name in missing]
+            requests = [{'addSheet': {'properties': tab_properties}} for tab_properties in properties]
+            self.service.spreadsheets().batchUpdate(spreadsheetId=self.spreadsheet_id,
+                                                    body={'requests': requests}).execute()
+            self.logger.info("Created missing tabs: %s", missing)
+            return missing
+        except HttpError as error:
+            self.logger.exception("An error occurred while creating tabs: %s", error)
+            raise
+
+    def read_tabs(self, tab_names: List[str], cells: str = SHEET_TAB_CELLS) -> Dict[str, List[List[str]]]:
+        """
+        Reads the same cell range from several tabs in a single batchGet request.
+
+        Args:
+            tab_names (List[str]): Titles of the tabs to read.
+            cells (str): Cell range in A1 notation without the tab name (e.g., "G2:M").
+
+        Returns:
+            Dict[str, List[List[str]]]: The rows of every tab, keyed by tab title.
+        """
+        values = self.read_ranges([self._tab_range(name, cells) for name in tab_names])
+        rows_by_tab = dict(zip(tab_names, values))
+        self.logger.info("Read %d rows from %d tabs.", sum(map(len, rows_by_tab.values())), len(rows_by_tab))
+        return rows_by_tab
+
+    def read_ranges(self, ranges: List[str]) -> List[List[List[Any]]]:
+        """
+        Reads several ranges in a single batchGet request.
+
+        Args:
+            ranges (List[str]): Ranges in A1 notation.
+
+        Returns:
+            List[List[List[Any]]]: The rows of every range, in the order the ranges were given.
+        """
+        self._authenticate_service()
+        if not self.service:
+            raise RuntimeError("Google Sheets API service is not initialized correctly.")
+        if not ranges:
+            return []
+
+        try:
+            result = self.service.spreadsheets().values().batchGet(
+                spreadsheetId=self.spreadsheet_id, ranges=ranges).execute()
+            # Value ranges are returned in the order they were requested
+            value_ranges = result.get('valueRanges', [])
+            return [value_range.get('values', []) for value_range in value_ranges]
+        except HttpError as error:
+            self.logger.exception("An error occurred while reading ranges: %s", error)
+            raise
+
+    def append_transactions_by_tab(self, rows_by_tab: Dict[str, List[List[str]]],
+                                   existing_rows_by_tab: Optional[Dict[str, List[List[str]]]] = None,
+                                   cells: str = SHEET_TAB_CELLS) -> None:
+        """
+        Appends rows below the existing data of several tabs with a single values.batchUpdate request.
+
+        Args:
+            rows_by_tab (Dict[str, List[List[str]]]): The rows to append, keyed by tab title.
+            existing_rows_by_tab (Optional[Dict[str, List[List[str]]]]): Rows already present in each tab, as
+                returned by `read_tabs`. Read with one batchGet request when not provided.
+            cells (str): Cell range in A1 notation without the tab name (e.g., "G2:M").
+        """
+        rows_by_tab = {name: rows for name, rows in rows_by_tab.items() if rows}
+        if not rows_by_tab:
+            self.logger.info("No rows to append to any tab.")
+            return
+        if existing_rows_by_tab is None:
+            existing_rows_by_tab = self.read_tabs(list(rows_by_tab), cells)
+
+        self._authenticate_service()
+        if not self.service:
+            raise RuntimeError("Google Sheets API service is not initialized correctly.")
+
+        start_cell, end_column = cells.split(':')
+        start_column, start_row = self._extract_column_and_row(start_cell)
+        end_column, _ = self._extract_column_and_row(end_column)
+
+        data = []
+        for name, rows in rows_by_tab.items():
+            first_row = start_row + len(existing_rows_by_tab.get(name, []))
+            last_row = first_row + len(rows) - 1
+            data.append({
+                'range': self._tab_range(name, f"{start_column}{first_row}:{end_column}{last_row}"),
+                'values': rows,
+            })
+
+        self.batch_update_values(data)
+        self.logger.info("Appended %d rows to %d tabs.", sum(map(len, rows_by_tab.values())), len(data))
+
+    def read_row_fingerprints(self, range_name: Optional[str] = None,
+                              fingerprint_column: str = SHEET_FINGERPRINT_COLUMN
+                              ) -> Tuple[Dict[str, Tuple[int, str, str]], int]:
+        """
+        Reads the ID, date and fingerprint columns of a range in a single batchGet request.
+
+        Args:
+            range_name (str, optional): Range in A1 notation (e.g., "Sheet1!G2:M"). Defaults to `default_range`.
+            fingerprint_column (str): Column letter holding the row fingerprints.
+
+        Returns:
+            Tuple[Dict[str, Tuple[int, str, str]], int]: The sheet row number, date and fingerprint (empty when
+            never recorded) of every ID, and the number of the first row below the data.
+
+        Raises:
+            TransactionProcessingError: If the columns could not be read.
+        """
+        range_name = range_name or self.default_range
+        id_column, start_row = self._extract_column_and_row(self._split_range(range_name)[1].split(':')[0])
+        date_column = self.column_letter(self.column_index(id_column) + COLUMN_ORDER.index('data'))
+
+        values = self.read_columns([id_column, date_column, fingerprint_column], range_name)
+        if not values:
+            raise TransactionProcessingError(f"Failed to read the ID and fingerprint columns of {range_name}.")
+        ids, dates, fingerprints = values[id_column], values[date_column], values[fingerprint_column]
+
+        # Rows added by hand may lack an ID, so the date column also decides where the data ends
+        row_count = max(len(ids), len(dates))
+        index: Dict[str, Tuple[int, str, str]] = {}
+        for offset, value in enumerate(ids):
+            transaction_id = self._cell_to_str(value)
+            if transaction_id:
+                day = str(dates[offset]) if offset < len(dates) else ''
+                fingerprint = str(fingerprints[offset]) if offset < len(fingerprints) else ''
+                index[transaction_id] = (start_row + offset, day, fingerprint)
+        return index, start_row + row_count
+
+    def build_row_ranges(self, rows_by_number: Dict[int, List[Any]],
+                         range_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Builds values.batchUpdate data entries writing rows at given sheet row numbers.
+
+        Consecutive row numbers are merged into a single entry to keep the request small.
+
+        Args:
+            rows_by_number (Dict[int, List[Any]]): The rows to write, keyed by 1-based sheet row number.
+            range_name (str, optional): Range whose columns are written (e.g., "Sheet1!G2:M"). Defaults to
+                                        `default_range`.
+
+        Returns:
+            List[Dict[str, Any]]: Entries for `batch_update_values`.
+        """
+        sheet_name, cells = self._split_range(range_name or self.default_range)
+        parts = cells.split(':')
+        start_column, _ = self._extract_column_and_row(parts[0])
+        end_column, _ = self._extract_column_and_row(parts[-1])
+        prefix = f"{sheet_name}!" if sheet_name else ''
+
+        data: List[Dict[str, Any]] = []
+        block: List[List[Any]] = []
+        block_start = previous = 0
+        for number in sorted(rows_by_number):
+            if block and number != previous + 1:
+                data.append({'range': f"{prefix}{start_column}{block_start}:{end_column}{previous}", 'values': block})
+                block = []
+            if not block:
+                block_start = number
+            block.append(rows_by_number[number])
+            previous = number
+        if block:
+            data.append({'range': f"{prefix}{start_column}{block_start}:{end_column}{previous}", 'values': block})
+        return data
+
+    def batch_update_values(self, data: List[Dict[str, Any]]) -> None:
+        """
+        Writes several ranges with a single values.batchUpdate request.
+
+        Args:
+            data (List[Dict[str, Any]]): Entries with a 'range' in A1 notation and the 'values' to write.
+        """
+        if not data:
+            return
+        self._authenticate_service()
+        if not self.service:
+            raise RuntimeError("Google Sheets API service is not initialized correctly.")
+
+        try:
+            self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={'valueInputOption': 'RAW', 'data': data}
+            ).execute()
+            self.logger.info("Updated %d ranges in one request.", len(data))
+        except HttpError as error:
+            self.logger.exception("An error occurred while updating values: %s", error)
+            raise
 
     def find_first_empty_row(self, range_name: Optional[str] = None) -> str:
         """
@@ -160,8 +532,8 @@ class GoogleSheetsHandler(Logging):
             raise RuntimeError("Google Sheets API service is not initialized correctly.")
 
         if not range_name:
-            range_name = MY_DEFAULT_RANGE
-            self.logger.info("Range not provided. Using default range: %s", MY_DEFAULT_RANGE)
+            range_name = self.default_range
+            self.logger.info("Range not provided. Using default range: %s", range_name)
 
         try:
             if '!' in range_name:
@@ -197,6 +569,127 @@ class GoogleSheetsHandler(Logging):
             self.logger.exception("An error occurred while finding the first empty row: %s", error)
             raise
 
+    def first_empty_row_number(self, range_name: Optional[str] = None) -> int:
+        """
+        Returns the number of the first sheet row below the data of a range.
+
+        Args:
+            range_name (str, optional): Range in A1 notation (e.g., "Sheet1!G2:M"). Defaults to `default_range`.
+
+        Returns:
+            int: The 1-based row number (e.g., 25).
+        """
+        first_empty_range = self.find_first_empty_row(range_name)
+        return self._extract_column_and_row(self._split_range(first_empty_range)[1].split(':')[0])[1]
+
+    def rows_range(self, first_row: int, last_row: Optional[int] = None, range_name: Optional[str] = None) -> str:
+        """
+        Narrows the columns of a range to some rows.
+
+        Args:
+            first_row (int): First row, 1-based.
+            last_row (Optional[int]): Last row; the range is open-ended when not given.
+            range_name (str, optional): Range in A1 notation (e.g., "Sheet1!G2:M"). Defaults to `default_range`.
+
+        Returns:
+            str: The range in A1 notation (e.g., "Sheet1!G25:M30", or "Sheet1!G25:M" without a last row).
+        """
+        sheet_name, cells = self._split_range(range_name or self.default_range)
+        start_cell, end_cell = cells.split(':')
+        start_column, _ = self._extract_column_and_row(start_cell)
+        end_column, _ = self._extract_column_and_row(end_cell)
+        rows = f"{start_column}{first_row}:{end_column}{last_row if last_row is not None else ''}"
+        return f"{sheet_name}!{rows}" if sheet_name else rows
+
+    def write_rows(self, rows: List[List[str]], first_row: int, range_name: Optional[str] = None) -> None:
+        """
+        Writes rows at a fixed position instead of appending them, so repeating a write overwrites it.
+
+        Like `append_transactions`, a failed request raises, so the caller knows which rows were acknowledged.
+
+        Args:
+            rows (List[List[str]]): The rows to write.
+            first_row (int): Sheet row of the first one, 1-based.
+            range_name (str, optional): Range in A1 notation giving the tab and columns. Defaults to `default_range`.
+        """
+        if not rows:
+            return
+        self.batch_update_values([{'range': self.rows_range(first_row, first_row + len(rows) - 1, range_name),
+                                   'values': rows}])
+
+    @staticmethod
+    def _split_range(range_name: str) -> tuple:
+        """Splits "Sheet1!G2:M" into ("Sheet1", "G2:M"); the sheet part is None when absent."""
+        if '!' in range_name:
+            sheet_name, cells = range_name.rsplit('!', maxsplit=1)
+            return sheet_name, cells
+        return None, range_name
+
+    @classmethod
+    def project_range(cls, range_name: str, column: str) -> str:
+        """
+        Narrows a range to a single column over the same rows.
+
+        Args:
+            range_name (str): Range in A1 notation (e.g., "Sheet1!G2:M100").
+            column (str): The column letter to keep (e.g., "J").
+
+        Returns:
+            str: The projected range (e.g., "Sheet1!J2:J100").
+        """
+        sheet_name, cells = cls._split_range(range_name)
+        parts = cells.split(':')
+        _, start_row = cls._extract_column_and_row(parts[0])
+        end_row = ''.join(char for char in parts[1] if char.isdigit()) if len(parts) > 1 else str(start_row)
+        projected = f"{column}{start_row}:{column}{end_row}"
+        return f"{sheet_name}!{projected}" if sheet_name else projected
+
+    @classmethod
+    def id_range(cls, range_name: str) -> str:
+        """Narrows a range to its transaction ID column, its first one (e.g., "Sheet1!G2:M" -> "Sheet1!G2:G")."""
+        id_column, _ = cls._extract_column_and_row(cls._split_range(range_name)[1].split(':')[0])
+        return cls.project_range(range_name, id_column)
+
+    @staticmethod
+    def column_index(column: str) -> int:
+        """Converts a column letter to its 0-based index (e.g., "A" -> 0, "AA" -> 26)."""
+        index = 0
+        for letter in column.upper():
+            index = index * 26 + ord(letter) - ord('A') + 1
+        return index - 1
+
+    @staticmethod
+    def column_letter(index: int) -> str:
+        """Converts a 0-based column index to its letter (e.g., 0 -> "A", 26 -> "AA")."""
+        letters = ''
+        index += 1
+        while index:
+            index, remainder = divmod(index - 1, 26)
+            letters = chr(ord('A') + remainder) + letters
+        return letters
+
+    @staticmethod
+    def _cell_to_str(value: Any) -> str:
+        """Converts an unformatted cell value to the string form used for IDs (e.g., 12.0 -> "12")."""
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    @staticmethod
+    def _tab_range(tab_name: str, cells: str) -> str:
+        """
+        Builds an A1 range for a tab, quoting the tab title so names like "wydatki_2025-01" are valid.
+
+        Args:
+            tab_name (str): The tab title.
+            cells (str): The cell range within the tab (e.g., "G2:M").
+
+        Returns:
+            str: The range in A1 notation (e.g., "'wydatki_2025'!G2:M").
+        """
+        escaped = tab_name.replace("'", "''")
+        return f"'{escaped}'!{cells}"
+
     @staticmethod
     def _extract_column_and_row(cell_reference: str) -> tuple:
         """
@@ -211,3 +704,154 @@ class GoogleSheetsHandler(Logging):
         column = ''.join(char for char in cell_reference if char.isalpha())
         row = ''.join(char for char in cell_reference if char.isdigit())
         return column, int(row) if row else 1
+
+
+class SheetIdIndex(Logging):
+    """
+    Hidden tab indexing the transaction IDs of a range, so new IDs are found without downloading the ID column.
+
+    IDs are hashed into `buckets` rows of the index tab, one comma-separated cell per bucket. Testing a few dozen
+    IDs reads only their buckets, in the same batchGet as the index header, plus the data row below the indexed
+    ones to check nobody appended without updating the index; more IDs read the whole bucket column as one range.
+    The header (cells A1:C1) holds the number of indexed IDs, the first data row after them and the indexed range.
+    """
+
+    def __init__(self, sheet_handler: GoogleSheetsHandler, range_name: Optional[str] = None,
+                 buckets: int = SHEET_INDEX_BUCKETS):
+        """
+        Args:
+            sheet_handler (GoogleSheetsHandler): Handler of the spreadsheet holding the data and the index.
+            range_name (Optional[str]): Indexed range in A1 notation, defaults to the handler's default range.
+            buckets (int): Number of hash buckets; it must not change once the index is built.
+        """
+        super().__init__()
+        self.sheet_handler = sheet_handler
+        self.range_name = range_name or sheet_handler.default_range
+        data_tab = sheet_handler._split_range(self.range_name)[0] or ''
+        if data_tab.startswith("'") and data_tab.endswith("'"):
+            data_tab = data_tab[1:-1].replace("''", "'")
+        self.tab = SHEET_INDEX_TAB.format(tab=data_tab)
+        self.buckets = buckets
+        self.next_row: Optional[int] = None
+        self._contents: Dict[int, Set[str]] = {}
+        self._count = 0
+
+    def bucket_of(self, transaction_id: str) -> int:
+        """Returns the bucket of an ID, stable across runs and processes."""
+        digest = hashlib.blake2b(transaction_id.encode('utf-8'), digest_size=4).digest()
+        return int.from_bytes(digest, 'big') % self.buckets
+
+    def prefers_lookup(self, transaction_ids: Iterable[str]) -> bool:
+        """
+        Chooses between reading the buckets of the IDs one by one and reading the whole index.
+
+        Reading buckets fetches only the share of the index they hold, so it wins while the IDs fall into at most
+        `SHEET_INDEX_MAX_LOOKUP` buckets, whatever the size of the sheet; past that, one range is cheaper than
+        hundreds of them.
+        """
+        return len({self.bucket_of(transaction_id) for transaction_id in transaction_ids}) <= SHEET_INDEX_MAX_LOOKUP
+
+    def lookup(self, transaction_ids: Iterable[str]) -> Optional[Set[str]]:
+        """
+        Returns which of the IDs are in the indexed range.
+
+        When the whole index is read, the IDs it holds are checked against the count in the header.
+
+        Args:
+            transaction_ids (Iterable[str]): The IDs to test.
+
+        Returns:
+            Optional[Set[str]]: The IDs present in the range, or None when the index is missing, of another range
+                                or stale, in which case it must be rebuilt with `build`.
+        """
+        if self.sheet_handler.ensure_tabs([self.tab], hidden=True):
+            self.logger.info("Created the ID index tab %s.", self.tab)
+            return None
+        ids = set(transaction_ids)
+        whole = not self.prefers_lookup(ids)
+        buckets = list(range(self.buckets)) if whole else sorted({self.bucket_of(transaction_id) for transaction_id in ids})
+        if whole:
+            header, column = self.sheet_handler.read_ranges([self._cells("A1:C1"), self._cells(f"A2:A{self.buckets + 1}")])
+            cells = [[row] if row else [] for row in column] + [[] for _ in range(self.buckets - len(column))]
+        else:
+            header, *cells = self.sheet_handler.read_ranges(
+                [self._cells("A1:C1")] + [self._cells(f"A{bucket + 2}") for bucket in buckets])
+        if not header or len(header[0]) < 3 or header[0][2] != self.range_name:
+            self.logger.info("The ID index tab %s does not index %s.", self.tab, self.range_name)
+            return None
+        count, next_row = int(header[0][0]), int(header[0][1])
+
+        below = self.sheet_handler.read_transactions(self.sheet_handler.rows_range(next_row, next_row, self.range_name))
+        if any(any(row) for row in below):
+            self.logger.warning("Rows were written below row %d without updating the ID index.", next_row - 1)
+            return None
+
+        self._count, self.next_row = count, next_row
+        for bucket, values in zip(buckets, cells):
+            self._contents[bucket] = set(values[0][0].split(',')) if values and values[0] and values[0][0] else set()
+        if whole and sum(map(len, self._contents.values())) != count:
+            self.logger.warning("The ID index tab %s holds %d IDs instead of %d.", self.tab,
+                                sum(map(len, self._contents.values())), count)
+            return None
+        found = {transaction_id for transaction_id in ids if transaction_id in self._contents[self.bucket_of(transaction_id)]}
+        self.logger.info("Looked up %d IDs in %d of %d index buckets: %d found.", len(ids), len(buckets),
+                         self.buckets, len(found))
+        return found
+
+    def build(self, transaction_ids: Iterable[str], next_row: int) -> None:
+        """
+        Rewrites the whole index from the IDs of the range.
+
+        Args:
+            transaction_ids (Iterable[str]): Every ID of the range; empty IDs (custom rows) are skipped.
+            next_row (int): First sheet row after the data of the range.
+        """
+        self.sheet_handler.ensure_tabs([self.tab], hidden=True)
+        self._contents = {bucket: set() for bucket in range(self.buckets)}
+        for transaction_id in transaction_ids:
+            if transaction_id:
+                self._contents[self.bucket_of(transaction_id)].add(transaction_id)
+        self._count = sum(map(len, self._contents.values()))
+        self.next_row = next_row
+        self.sheet_handler.batch_update_values([
+            self._header(),
+            {'range': self._cells(f"A2:A{self.buckets + 1}"),
+             'values': [[','.join(sorted(self._contents[bucket]))] for bucket in range(self.buckets)]},
+        ])
+        self.logger.info("Built the ID index %s of %d IDs.", self.tab, self._count)
+
+    def add(self, transaction_ids: List[str], rows_written: int) -> None:
+        """
+        Adds the IDs of appended rows, rewriting only their buckets and the header in one request.
+
+        Args:
+            transaction_ids (List[str]): IDs of the appended rows; they must have been looked up or indexed by `build`.
+            rows_written (int): Number of rows appended below the indexed ones.
+        """
+        if self.next_row is None:
+            raise RuntimeError("The ID index must be looked up or built before IDs are added.")
+        changed = set()
+        for transaction_id in transaction_ids:
+            if transaction_id:
+                bucket = self.bucket_of(transaction_id)
+                self._contents.setdefault(bucket, set()).add(transaction_id)
+                changed.add(bucket)
+        self._count += len([transaction_id for transaction_id in transaction_ids if transaction_id])
+        self.next_row += rows_written
+        self.sheet_handler.batch_update_values(
+            [self._header()] + [{'range': self._cells(f"A{bucket + 2}"),
+                                 'values': [[','.join(sorted(self._contents[bucket]))]]} for bucket in sorted(changed)])
+
+    def append_range(self, offset: int = 0) -> str:
+        """Returns the open-ended range starting `offset` rows below the indexed data, where new rows are appended."""
+        if self.next_row is None:
+            raise RuntimeError("The ID index must be looked up or built before rows are appended.")
+        return self.sheet_handler.rows_range(self.next_row + offset, range_name=self.range_name)
+
+    def _header(self) -> Dict[str, Any]:
+        """Returns the header update: ID count, next data row and indexed range."""
+        return {'range': self._cells("A1:C1"), 'values': [[str(self._count), str(self.next_row), self.range_name]]}
+
+    def _cells(self, cells: str) -> str:
+        """Returns a range of the index tab."""
+        return self.sheet_handler._tab_range(self.tab, cells)
@@ -0,0 +1,166 @@
+import csv
+import json
+import os
+from datetime import date, datetime, time
+from typing import Dict, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from src.utils.category_resolver import CategoryResolver
+from src.utils.change_detector import ChangeDetector
+from src.utils.error_handling import log_exceptions, TransactionProcessingError
+from src.utils.fomatter import Formatter
+from src.utils.logger import Logging
+from src.utils.settings import Settings
+
+"""
+import_handler.py
+
+This module imports manual adjustments (custom transactions) from CSV or JSONL files.
+
+Imported records are validated as one batch and converted to database-shaped rows, so they are merged into the same
+deduplicated, batched sink writes as the transactions read from the Cashew backup.
+
+Classes:
+    ImportHandler: Streams, validates and converts custom transaction files.
+
+Exceptions:
+    TransactionProcessingError: Raised when records of an imported file are invalid.
+"""
+
+# Accepted column names of every field; the exported (Polish) column names work too
+FIELD_NAMES = {
+    'id': ('id',),
+    'description': ('description', 'opis'),
+    'amount': ('amount', 'kwota'),
+    'category': ('category', 'kategoria'),
+    'date': ('date', 'data'),
+    'who': ('who', 'kto'),
+}
+REQUIRED_FIELDS = ('description', 'amount', 'category', 'date')
+
+# Prefix of the IDs generated for imported records, so they never collide with Cashew IDs
+IMPORT_ID_PREFIX = "manual-"
+
+# Number of invalid records listed in the raised error
+MAX_REPORTED_ERRORS = 20
+
+
+class ImportHandler(Logging):
+    """
+    Reads custom transactions from `.csv` (comma, semicolon or tab separated, with a header) or `.jsonl` files.
+
+    Records without an `id` get a stable one derived from their content, so importing the same file again
+    does not create duplicates.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+    @staticmethod
+    def iter_records(file_path: str) -> Iterator[Tuple[int, Dict[str, str]]]:
+        """
+        Streams the records of a file with their line numbers, keyed by field name.
+
+        :param file_path: Path of a `.csv` or `.jsonl` file.
+        :return: An iterator of (line number, record) pairs.
+        :raises TransactionProcessingError: If the file type is not supported or a JSONL line is not an object.
+        """
+        extension = os.path.splitext(file_path)[1].lower()
+        with open(file_path, newline='', encoding='utf-8-sig') as file:
+            if extension == '.jsonl':
+                for number, line in enumerate(file, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise TransactionProcessingError(f"{file_path}:{number}: invalid JSON: {e}")
+                    if not isinstance(record, dict):
+                        raise TransactionProcessingError(f"{file_path}:{number}: expected a JSON object.")
+                    yield number, ImportHandler._normalize(record)
+            elif extension in ('.csv', '.tsv'):
+                dialect = csv.Sniffer().sniff(file.readline(), delimiters=',;\t')
+                file.seek(0)
+                for number, record in enumerate(csv.DictReader(file, dialect=dialect), start=2):
+                    yield number, ImportHandler._normalize(record)
+            else:
+                raise TransactionProcessingError(f"Unsupported import file '{file_path}', expected .csv or .jsonl.")
+
+    @staticmethod
+    @log_exceptions(Logging.get_logger())
+    def load(file_path: str, resolver: Optional[CategoryResolver] = None,
+             zone: Optional[ZoneInfo] = None) -> List[tuple]:
+        """
+        Reads and validates every record of a file, converting them to database-shaped rows.
+
+        All records are validated before any is returned, and every invalid one is reported at once.
+
+        :param file_path: Path of a `.csv` or `.jsonl` file.
+        :param resolver: Category lookup, defaults to the categories and configured aliases.
+        :param zone: Time zone the dates are local to, defaults to the one of the process settings.
+        :return: (id, description, amount, category, timestamp, who) tuples, like household database rows.
+        :raises TransactionProcessingError: If any record is invalid.
+        """
+        resolver = resolver or CategoryResolver.default_resolver()
+        timezone = zone or Settings.current().zone
+        rows: List[tuple] = []
+        errors: List[str] = []
+        occurrences: Dict[tuple, int] = {}
+        for number, record in ImportHandler.iter_records(file_path):
+            try:
+                rows.append(ImportHandler._to_row(record, resolver, timezone, occurrences))
+            except ValueError as e:
+                errors.append(f"{file_path}:{number}: {e}")
+
+        if errors:
+            listed = "\n".join(errors[:MAX_REPORTED_ERRORS])
+            more = f"\n... and {len(errors) - MAX_REPORTED_ERRORS} more" if len(errors) > MAX_REPORTED_ERRORS else ""
+            raise TransactionProcessingError(f"{len(errors)} invalid records in {file_path}:\n{listed}{more}")
+        ImportHandler.get_logger().info(f"Imported {len(rows)} custom transactions from {file_path}.")
+        return rows
+
+    @staticmethod
+    def _normalize(record: Dict) -> Dict[str, str]:
+        """Maps the column names of a record to field names, dropping unknown columns."""
+        normalized = {}
+        lowered = {str(key).strip().lower(): value for key, value in record.items() if key is not None}
+        for field, names in FIELD_NAMES.items():
+            for name in names:
+                value = lowered.get(name)
+                if value is not None and str(value).strip():
+                    normalized[field] = str(value).strip()
+                    break
+        return normalized
+
+    @staticmethod
+    def _to_row(record: Dict[str, str], resolver: CategoryResolver, timezone: ZoneInfo,
+                occurrences: Dict[tuple, int]) -> tuple:
+        """
+        Validates a record and converts it to a database-shaped row.
+
+        The date is stored as the timestamp of noon in the configured time zone, so it formats back to the same day. Identical
+        records are numbered by occurrence before hashing, so repeated purchases stay distinct but stable.
+
+        :raises ValueError: If a field is missing or invalid.
+        """
+        missing = [field for field in REQUIRED_FIELDS if field not in record]
+        if missing:
+            raise ValueError(f"missing {', '.join(missing)}")
+        cents = Formatter.parse_cents(record['amount'])
+        category = resolver.lookup.get(record['category'].lower())
+        if category is None:
+            raise ValueError(f"unknown category '{record['category']}'")
+        try:
+            day = date.fromisoformat(record['date'])
+        except ValueError:
+            raise ValueError(f"invalid date '{record['date']}', expected YYYY-MM-DD")
+        who = record.get('who', '')
+
+        transaction_id = record.get('id')
+        if transaction_id is None:
+            content = (record['description'], cents, category, day.isoformat(), who)
+            occurrences[content] = occurrences.get(content, 0) + 1
+            transaction_id = IMPORT_ID_PREFIX + ChangeDetector.fingerprint(
+                [str(value) for value in (*content, occurrences[content])])
+        timestamp = int(datetime.combine(day, time(12), tzinfo=timezone).timestamp())
+        return transaction_id, record['description'], cents / 100, category, timestamp, who
@@ -0,0 +1,205 @@
+import os
+import sqlite3
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import config
+from src.utils.change_detector import ChangeDetector
+from src.utils.error_handling import log_exceptions, DatabaseError
+from src.utils.fomatter import Formatter
+from src.utils.logger import Logging
+
+"""
+mirror_handler.py
+
+This module maintains a local SQLite mirror of the exported, normalized transactions.
+
+The mirror answers questions such as "how much on transport this quarter?" from an indexed local table instead of
+the Cashew backup or the sheet. It also records which transaction IDs each sink (CSV, Sheets) has received, which
+makes it the source of truth for deduplication.
+
+Classes:
+    MirrorHandler: Creates, updates and queries the mirror database.
+
+Exceptions:
+    DatabaseError: Raised when the mirror cannot be opened or written.
+"""
+
+# Names of the sinks whose exported IDs are recorded
+SINK_SHEETS = "sheets"
+SINK_CSV = "csv"
+
+CREATE_MIRROR_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS transactions (
+        id TEXT PRIMARY KEY,
+        description TEXT NOT NULL,
+        amount_cents INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        day TEXT NOT NULL,
+        who TEXT NOT NULL DEFAULT '',
+        fingerprint TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS transactions_day ON transactions (day);
+    CREATE INDEX IF NOT EXISTS transactions_category_day ON transactions (category, day);
+    CREATE INDEX IF NOT EXISTS transactions_who_day ON transactions (who, day);
+    CREATE TABLE IF NOT EXISTS exports (
+        sink TEXT NOT NULL,
+        id TEXT NOT NULL,
+        PRIMARY KEY (sink, id)
+    ) WITHOUT ROWID;
+"""
+
+# Rows are only rewritten when their content changed
+UPSERT_TRANSACTION_QUERY = """
+    INSERT INTO transactions (id, description, amount_cents, category, day, who, fingerprint)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        description = excluded.description, amount_cents = excluded.amount_cents, category = excluded.category,
+        day = excluded.day, who = excluded.who, fingerprint = excluded.fingerprint
+    WHERE fingerprint != excluded.fingerprint
+"""
+
+MARK_EXPORTED_QUERY = "INSERT OR IGNORE INTO exports (sink, id) VALUES (?, ?)"
+
+# SQL expression of every supported grouping
+GROUP_BY_EXPRESSIONS = {
+    'day': 'day',
+    'month': 'substr(day, 1, 7)',
+    'category': 'category',
+    'who': 'who',
+}
+
+
+class MirrorHandler(Logging):
+    """
+    Local SQLite mirror of exported transactions.
+
+    Rows are the exported transaction rows (`config.COLUMN_ORDER`, optionally followed by the person). Amounts are
+    stored as integer cents, dates as 'YYYY-MM-DD', and the table is indexed on date, category and person.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        :param db_path: Path of the mirror database, created when missing.
+        :raises DatabaseError: If the database cannot be opened.
+        """
+        super().__init__()
+        self.db_path = os.path.abspath(db_path)
+        try:
+            self.connection = sqlite3.connect(self.db_path, timeout=30)
+            self.connection.execute("PRAGMA journal_mode=WAL")  # Readers are not blocked by a running sync
+            self.connection.executescript(CREATE_MIRROR_SCHEMA)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to open the transaction mirror {self.db_path}: {e}")
+
+    def __enter__(self) -> "MirrorHandler":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @log_exceptions(Logging.get_logger())
+    def upsert(self, rows: Iterable[Sequence[str]], sink: Optional[str] = None) -> int:
+        """
+        Inserts new rows and updates changed ones in a single transaction.
+
+        Rows missing a column or with an invalid amount (e.g. edited by hand in the sheet) are not mirrored, but
+        their IDs are still recorded as exported, since the sink holds them. Rows are consumed in chunks of
+        `config.PIPELINE_BATCH_SIZE`, so seeding from a streamed sheet never holds it whole.
+
+        :param rows: Exported transaction rows; rows without an ID are skipped.
+        :param sink: Records the rows as exported to this sink, when given.
+        :return: The number of inserted or updated rows.
+        """
+        rows = iter(rows)
+        changed, malformed = 0, 0
+        try:
+            with self.connection:  # One transaction, so an interrupted seed leaves no partial record of a sink
+                while True:
+                    chunk = list(islice(rows, config.PIPELINE_BATCH_SIZE))
+                    if not chunk:
+                        break
+                    chunk = [row for row in chunk if row and row[0]]
+                    records = [self._to_record(row) for row in chunk]
+                    malformed += records.count(None)
+                    before = self.connection.total_changes
+                    self.connection.executemany(UPSERT_TRANSACTION_QUERY, [record for record in records if record])
+                    changed += self.connection.total_changes - before
+                    if sink:
+                        self.connection.executemany(MARK_EXPORTED_QUERY, ((sink, str(row[0])) for row in chunk))
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Failed to update the transaction mirror: {e}")
+        if malformed:
+            self.logger.warning(f"Skipped {malformed} malformed rows that could not be mirrored.")
+        self.logger.info(f"Mirrored {changed} new or changed transactions to {self.db_path}.")
+        return changed
+
+    def has_exports(self, sink: str) -> bool:
+        """Returns whether any ID was recorded for a sink, i.e. whether the mirror knows its state."""
+        return self.connection.execute("SELECT 1 FROM exports WHERE sink = ? LIMIT 1", (sink,)).fetchone() is not None
+
+    def exported_ids(self, sink: str) -> Set[str]:
+        """Returns the IDs exported to a sink."""
+        return set(self.iter_exported_ids(sink))
+
+    def iter_exported_ids(self, sink: str) -> Iterator[str]:
+        """Streams the IDs exported to a sink from the cursor."""
+        for row in self.connection.execute("SELECT id FROM exports WHERE sink = ?", (sink,)):
+            yield row[0]
+
+    def total_cents(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                    category: Optional[str] = None, who: Optional[str] = None) -> int:
+        """
+        Sums amounts in cents over an inclusive date range, optionally for one category and person.
+
+        :return: The total in cents (0 when nothing matches).
+        """
+        where, params = self._filters(date_from, date_to, category, who)
+        query = f"SELECT COALESCE(SUM(amount_cents), 0) FROM transactions{where}"
+        return self.connection.execute(query, params).fetchone()[0]
+
+    def totals(self, group_by: str = 'month', date_from: Optional[str] = None, date_to: Optional[str] = None,
+               category: Optional[str] = None, who: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        """
+        Sums amounts per day, month, category or person.
+
+        :param group_by: One of `GROUP_BY_EXPRESSIONS`.
+        :return: (group, total in cents, row count) tuples sorted by group.
+        :raises ValueError: If the grouping is not supported.
+        """
+        if group_by not in GROUP_BY_EXPRESSIONS:
+            raise ValueError(f"Unsupported grouping '{group_by}', expected one of {list(GROUP_BY_EXPRESSIONS)}.")
+        expression = GROUP_BY_EXPRESSIONS[group_by]
+        where, params = self._filters(date_from, date_to, category, who)
+        query = (f"SELECT {expression} AS grp, SUM(amount_cents), COUNT(*) FROM transactions{where} "
+                 f"GROUP BY grp ORDER BY grp")
+        return [tuple(row) for row in self.connection.execute(query, params)]
+
+    @staticmethod
+    def _filters(date_from: Optional[str], date_to: Optional[str], category: Optional[str],
+                 who: Optional[str]) -> Tuple[str, list]:
+        """Builds the WHERE clause of a query; every filter is served by one of the indexes."""
+        conditions, params = [], []
+        for condition, value in (("day >= ?", date_from), ("day <= ?", date_to), ("category = ?", category),
+                                 ("who = ?", who)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    @staticmethod
+    def _to_record(row: Sequence[str]) -> Optional[tuple]:
+        """Converts an exported row to a mirror record; None when it misses a column or its amount is invalid."""
+        if len(row) < len(config.COLUMN_ORDER):
+            return None
+        columns = dict(zip(config.COLUMN_ORDER, row))
+        try:
+            cents = Formatter.parse_cents(columns['kwota'])
+        except ValueError:
+            return None
+        who = row[len(config.COLUMN_ORDER)] if len(row) > len(config.COLUMN_ORDER) else ''
+        return (str(columns['id']), str(columns['opis']), cents, str(columns['kategoria']), str(columns['data']),
+                str(who or ''), ChangeDetector.fingerprint(row))
@@ -0,0 +1,334 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from src.utils.logger import Logging
+
+"""
+sheets_emulator.py
+
+This module provides an in-process stand-in for the Google Sheets API service object.
+
+It implements the subset of `build('sheets', 'v4')` used by GoogleSheetsHandler (`spreadsheets().get/batchUpdate`
+and `spreadsheets().values().get/append/batchGet/batchUpdate`) on top of plain Python lists, so syncs can be
+load- and correctness-tested without a network.
+
+With a `persist_path`, the state file is a JSON lines journal: a snapshot of every spreadsheet, then one line per
+write request, appended as it is executed. A write costs the size of its own values rather than of the whole state;
+the journal is replayed and compacted back into a single snapshot when the emulator is loaded, or by `save()`.
+
+Classes:
+    SheetsEmulator: The fake service, with configurable latency, 429 quota error injection and JSON persistence.
+
+Usage:
+    handler = GoogleSheetsHandler(spreadsheet_id, service=SheetsEmulator(latency=0.05, persist_path="sheet.json"))
+"""
+
+DEFAULT_TAB = 'Sheet1'
+A1_CELL_REGEX = re.compile(r"^([A-Z]*)(\d*)$")
+
+Grid = List[List[Any]]
+
+
+class _Request:
+    """A prepared API call, executed like the requests returned by the real client."""
+
+    def __init__(self, emulator: "SheetsEmulator", method: str, handler: Callable[[], dict]):
+        self._emulator = emulator
+        self._method = method
+        self._handler = handler
+
+    def execute(self) -> dict:
+        return self._emulator._execute(self._method, self._handler)
+
+
+class _Values:
+    """Emulates `service.spreadsheets().values()`."""
+
+    def __init__(self, emulator: "SheetsEmulator"):
+        self._emulator = emulator
+
+    def get(self, spreadsheetId: str, range: str, majorDimension: str = 'ROWS',
+            valueRenderOption: str = 'FORMATTED_VALUE', **_: Any) -> _Request:
+        return _Request(self._emulator, 'values.get', lambda: self._emulator._get_values(
+            spreadsheetId, range, majorDimension, valueRenderOption))
+
+    def batchGet(self, spreadsheetId: str, ranges: List[str], majorDimension: str = 'ROWS',
+                 valueRenderOption: str = 'FORMATTED_VALUE', **_: Any) -> _Request:
+        return _Request(self._emulator, 'values.batchGet', lambda: {
+            'spreadsheetId': spreadsheetId,
+            'valueRanges': [self._emulator._get_values(spreadsheetId, range_name, majorDimension, valueRenderOption)
+                            for range_name in ranges],
+        })
+
+    def append(self, spreadsheetId: str, range: str, body: dict, **_: Any) -> _Request:
+        return _Request(self._emulator, 'values.append', lambda: self._emulator._append_values(
+            spreadsheetId, range, body.get('values', [])))
+
+    def batchUpdate(self, spreadsheetId: str, body: dict, **_: Any) -> _Request:
+        return _Request(self._emulator, 'values.batchUpdate', lambda: self._emulator._update_values(
+            spreadsheetId, body.get('data', [])))
+
+
+class _Spreadsheets:
+    """Emulates `service.spreadsheets()`."""
+
+    def __init__(self, emulator: "SheetsEmulator"):
+        self._emulator = emulator
+
+    def values(self) -> _Values:
+        return _Values(self._emulator)
+
+    def get(self, spreadsheetId: str, **_: Any) -> _Request:
+        return _Request(self._emulator, 'get', lambda: {
+            'spreadsheetId': spreadsheetId,
+            'sheets': [{'properties': {'title': title}} for title in self._emulator._tabs(spreadsheetId)],
+        })
+
+    def batchUpdate(self, spreadsheetId: str, body: dict, **_: Any) -> _Request:
+        return _Request(self._emulator, 'batchUpdate', lambda: self._emulator._apply_requests(
+            spreadsheetId, body.get('requests', [])))
+
+
+class SheetsEmulator(Logging):
+    """
+    In-process fake of the Google Sheets API service.
+
+    Spreadsheets are held in memory as one list of rows per tab, keyed by spreadsheet ID. Every executed request
+    sleeps for `latency` seconds and is counted in `request_counts`. Requests fail with an HTTP 429 `HttpError`
+    with probability `quota_error_rate`, or deterministically after `inject_quota_errors` is called.
+    """
+
+    def __init__(self, latency: float = 0.0, quota_error_rate: float = 0.0, persist_path: Optional[str] = None,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            latency (float): Seconds every executed request takes.
+            quota_error_rate (float): Probability (0-1) that a request fails with HTTP 429.
+            persist_path (Optional[str]): JSON lines file the spreadsheets are loaded from, and every write is
+                                          journaled to.
+            seed (Optional[int]): Seed for the quota error injection.
+        """
+        super().__init__()
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.persist_path = persist_path
+        self.request_counts: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._pending_errors = 0
+        self._lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._spreadsheets: Dict[str, Dict[str, Grid]] = {}
+        self._journaled = False  # Whether the state file holds a snapshot that writes can be journaled after
+        if persist_path and os.path.exists(persist_path):
+            self._load(persist_path)
+
+    def spreadsheets(self) -> _Spreadsheets:
+        return _Spreadsheets(self)
+
+    def inject_quota_errors(self, count: int = 1) -> None:
+        """Makes the next `count` requests fail with HTTP 429."""
+        self._pending_errors += count
+
+    def add_tab(self, spreadsheet_id: str, title: str, rows: Optional[Grid] = None) -> None:
+        """Creates (or replaces) a tab holding `rows`, starting at cell A1."""
+        self._spreadsheets.setdefault(spreadsheet_id, {})[title] = [list(row) for row in rows or []]
+        self._journal('add_tab', spreadsheet_id, [title, rows or []])
+
+    def ensure_tab(self, spreadsheet_id: str, title: str) -> None:
+        """Creates an empty tab unless it already exists."""
+        if title not in self._tabs(spreadsheet_id):
+            self.add_tab(spreadsheet_id, title)
+
+    def tab_rows(self, spreadsheet_id: str, title: str) -> Grid:
+        """Returns the raw rows of a tab, starting at cell A1."""
+        return self._spreadsheets.get(spreadsheet_id, {}).get(title, [])
+
+    def save(self) -> None:
+        """Compacts `persist_path` into a single snapshot of all spreadsheets, replacing it atomically."""
+        if not self.persist_path:
+            return
+        with self._journal_lock:
+            temp_path = f"{self.persist_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(self._spreadsheets, file, ensure_ascii=False)  # One line: no indent, newlines escaped
+                file.write('\n')
+            os.replace(temp_path, self.persist_path)
+            self._journaled = True
+
+    def _load(self, persist_path: str) -> None:
+        """Loads the snapshot of `persist_path`, replays the writes journaled after it, and compacts them."""
+        with open(persist_path, encoding='utf-8') as file:
+            self._spreadsheets = json.loads(file.readline())
+            entries = [json.loads(line) for line in file if line.strip()]
+        replays = {
+            'add_tab': lambda spreadsheet_id, args: self._tabs(spreadsheet_id).__setitem__(
+                args[0], [list(row) for row in args[1]]),
+            'append': lambda spreadsheet_id, args: self._append_values(spreadsheet_id, args[0], args[1], journal=False),
+            'update': lambda spreadsheet_id, args: self._update_values(spreadsheet_id, args, journal=False),
+            'requests': lambda spreadsheet_id, args: self._apply_requests(spreadsheet_id, args, journal=False),
+        }
+        for method, spreadsheet_id, args in entries:
+            replays[method](spreadsheet_id, args)
+        self._journaled = True
+        self.logger.info("Loaded %d spreadsheets and %d journaled writes from %s", len(self._spreadsheets),
+                         len(entries), persist_path)
+        if entries:
+            self.save()
+
+    def _journal(self, method: str, spreadsheet_id: str, args: Any) -> None:
+        """Appends a write to the journal of `persist_path`, starting it with a snapshot on the first write."""
+        if not self.persist_path:
+            return
+        if not self._journaled:
+            self.save()  # The snapshot already holds this write
+            return
+        with self._journal_lock:
+            with open(self.persist_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps([method, spreadsheet_id, args], ensure_ascii=False) + '\n')
+
+    def _execute(self, method: str, handler: Callable[[], dict]) -> dict:
+        """Runs a request with the configured latency and error injection."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.request_counts[method] = self.request_counts.get(method, 0) + 1
+            if self._pending_errors or (self.quota_error_rate and self._random.random() < self.quota_error_rate):
+                self._pending_errors = max(self._pending_errors - 1, 0)
+                self.logger.debug("Injecting quota error into %s", method)
+                raise HttpError(httplib2.Response({'status': '429', 'reason': 'Too Many Requests'}),
+                                b'{"error": {"code": 429, "message": "Quota exceeded (emulated)", '
+                                b'"status": "RESOURCE_EXHAUSTED"}}')
+            return handler()
+
+    def _tabs(self, spreadsheet_id: str) -> Dict[str, Grid]:
+        return self._spreadsheets.setdefault(spreadsheet_id, {})
+
+    def _resolve(self, spreadsheet_id: str, range_name: str) -> Tuple[Grid, int, int, Optional[int], Optional[int]]:
+        """
+        Resolves an A1 range to its tab grid and 0-based bounds.
+
+        Returns:
+            Tuple: (grid, first_row, first_column, last_row or None, last_column or None), bounds inclusive.
+        """
+        tabs = self._tabs(spreadsheet_id)
+        if '!' in range_name:
+            title, cells = range_name.rsplit('!', maxsplit=1)
+            if title.startswith("'") and title.endswith("'"):
+                title = title[1:-1].replace("''", "'")
+        else:
+            title, cells = next(iter(tabs), DEFAULT_TAB), range_name
+        if title not in tabs:
+            if '!' in range_name:
+                raise self._bad_request(f"Unable to parse range: {range_name}")
+            tabs[title] = []
+
+        start, _, end = cells.partition(':')
+        first_column, first_row = self._parse_cell(start)
+        last_column, last_row = self._parse_cell(end) if end else (first_column, first_row)
+        return tabs[title], first_row or 0, first_column or 0, last_row, last_column
+
+    @staticmethod
+    def _parse_cell(cell: str) -> Tuple[Optional[int], Optional[int]]:
+        """Parses "G12" into 0-based (column, row); missing parts are None."""
+        match = A1_CELL_REGEX.match(cell.upper())
+        if not match:
+            raise SheetsEmulator._bad_request(f"Unable to parse cell: {cell}")
+        letters, digits = match.groups()
+        column = None
+        if letters:
+            column = 0
+            for letter in letters:
+                column = column * 26 + ord(letter) - ord('A') + 1
+            column -= 1
+        return column, int(digits) - 1 if digits else None
+
+    @staticmethod
+    def _bad_request(message: str) -> HttpError:
+        return HttpError(httplib2.Response({'status': '400', 'reason': 'Bad Request'}),
+                         json.dumps({'error': {'code': 400, 'message': message}}).encode('utf-8'))
+
+    def _get_values(self, spreadsheet_id: str, range_name: str, major_dimension: str, render_option: str) -> dict:
+        grid, first_row, first_column, last_row, last_column = self._resolve(spreadsheet_id, range_name)
+        end_row = len(grid) if last_row is None else min(last_row + 1, len(grid))
+        values = []
+        for row in grid[first_row:end_row]:
+            cells = row[first_column:None if last_column is None else last_column + 1]
+            if render_option == 'FORMATTED_VALUE':
+                cells = ['' if cell is None else str(cell) for cell in cells]
+            values.append(self._trim(cells))
+        values = self._trim(values, empty=[])
+
+        if major_dimension == 'COLUMNS':
+            width = max((len(row) for row in values), default=0)
+            values = [self._trim([row[i] if i < len(row) else '' for row in values]) for i in range(width)]
+
+        result: Dict[str, Any] = {'range': range_name, 'majorDimension': major_dimension}
+        if values:
+            result['values'] = values
+        return result
+
+    def _append_values(self, spreadsheet_id: str, range_name: str, rows: Grid, journal: bool = True) -> dict:
+        grid, first_row, first_column, _, last_column = self._resolve(spreadsheet_id, range_name)
+        # Like the real API, append after the last row holding data within the range's columns
+        next_row = first_row
+        for index in range(len(grid) - 1, first_row - 1, -1):
+            if any(cell not in ('', None) for cell in grid[index][first_column:None if last_column is None
+                                                                  else last_column + 1]):
+                next_row = index + 1
+                break
+        self._write(grid, next_row, first_column, rows)
+        if journal:
+            self._journal('append', spreadsheet_id, [range_name, rows])
+        return {'updates': {'updatedRows': len(rows), 'updatedRange': range_name}}
+
+    def _update_values(self, spreadsheet_id: str, data: List[dict], journal: bool = True) -> dict:
+        updated_rows = 0
+        for value_range in data:
+            grid, first_row, first_column, _, _ = self._resolve(spreadsheet_id, value_range['range'])
+            self._write(grid, first_row, first_column, value_range.get('values', []))
+            updated_rows += len(value_range.get('values', []))
+        if journal:
+            self._journal('update', spreadsheet_id, data)
+        return {'totalUpdatedRows': updated_rows, 'totalUpdatedSheets': len(data)}
+
+    def _apply_requests(self, spreadsheet_id: str, requests: List[dict], journal: bool = True) -> dict:
+        tabs = self._tabs(spreadsheet_id)
+        replies = []
+        for request in requests:
+            if 'addSheet' not in request:
+                raise self._bad_request(f"Unsupported request: {list(request)}")
+            title = request['addSheet']['properties']['title']
+            if title in tabs:
+                raise self._bad_request(f"A sheet with the name \"{title}\" already exists.")
+            tabs[title] = []
+            replies.append({'addSheet': {'properties': {'title': title}}})
+        if journal:
+            self._journal('requests', spreadsheet_id, requests)
+        return {'spreadsheetId': spreadsheet_id, 'replies': replies}
+
+    @staticmethod
+    def _write(grid: Grid, first_row: int, first_column: int, rows: Grid) -> None:
+        """Writes rows into the grid, growing it as needed."""
+        if len(grid) < first_row + len(rows):
+            grid.extend([] for _ in range(first_row + len(rows) - len(grid)))
+        for offset, values in enumerate(rows):
+            row = grid[first_row + offset]
+            if len(row) < first_column + len(values):
+                row.extend([''] * (first_column + len(values) - len(row)))
+            row[first_column:first_column + len(values)] = values
+
+    @staticmethod
+    def _trim(values: list, empty: Any = '') -> list:
+        """Drops trailing empty cells or rows, as the real API does."""
+        end = len(values)
+        while end and values[end - 1] in (empty, None):
+            end -= 1
+        return values[:end]
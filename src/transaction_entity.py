@@ -1,5 +1,6 @@
 from datetime import datetime
-from typing import Optional
+from typing import Iterable, List, Optional, Union
+from zoneinfo import ZoneInfo
 
 from src.utils.fomatter import Formatter
 
@@ -11,29 +12,34 @@ class TransactionEntity:
     Attributes:
         id (str): Unique identifier for the transaction.
         description (str): A brief description of the transaction.
-        amount (float): The monetary amount of the transaction.
+        amount (str): The formatted monetary amount of the transaction.
+        amount_cents (int): The amount in integer cents, exact for sums.
         category (str): The category/type of the transaction.
         date (str): The date of the transaction in string format.
         who (str): The person or entity associated with the transaction.
     """
 
-    def __init__(self, _id: str, description: str, amount: float, category: str, date: datetime,
-                 who: Optional[str] = None):
+    def __init__(self, _id: str, description: str, amount: Optional[float], category: str,
+                 date: Union[datetime, str], who: Optional[str] = None, amount_cents: Optional[int] = None):
         """
         Initializes a Transaction object with the given parameters.
+
+        `amount_cents`, when given, is used instead of converting `amount`. `date` is either a datetime or an
+        already localized 'YYYY-MM-DD' date.
         """
         self.id: str = str(_id)
         self.description: str = str(description)
-        self.amount: str = Formatter.format_amount(amount)
+        self.amount_cents: int = Formatter.to_cents(amount) if amount_cents is None else amount_cents
+        self.amount: str = Formatter.format_cents(self.amount_cents)
         self.category: str = Formatter.map_category(category)
-        self.date: str = date.date().isoformat()
+        self.date: str = date if isinstance(date, str) else date.date().isoformat()
         self.who: str | None = who
 
     def to_list(self) -> list[str]:
         """
         Returns the transaction details as a list of strings.
         """
-        res = [self.id, self.description, self.amount, Formatter.map_category(self.category), self.date]
+        res = [self.id, self.description, self.amount, self.category, self.date]
 
         if self.who:
             res.append(self.who)
@@ -41,12 +47,13 @@ class TransactionEntity:
         return res
 
     @classmethod
-    def from_db_row(cls, row: tuple) -> "TransactionEntity":
+    def from_db_row(cls, row: tuple, zone: Optional[ZoneInfo] = None) -> "TransactionEntity":
         """
-        Maps a database row to a TransactionEntity instance.
+        Maps a database row to a TransactionEntity instance; a sixth field, when present, is the person.
 
         Args:
             row (list[str]): A tuple representing a transaction row from the database.
+            zone (Optional[ZoneInfo]): Time zone of the date, defaults to the configured one.
 
         Returns:
             TransactionEntity: The mapped TransactionEntity object.
@@ -59,19 +66,51 @@ class TransactionEntity:
             description=str(description),
             amount=float(amount_str),
             category=str(category),
-            date=cls._parse_date(date_field)
+            date=cls._parse_date(date_field, zone),
+            who=cls._who(row)
         )
 
+    @classmethod
+    def from_db_rows(cls, rows: Iterable[tuple], zone: Optional[ZoneInfo] = None) -> List["TransactionEntity"]:
+        """
+        Maps database rows to TransactionEntity instances, converting all amounts to cents and all UNIX timestamps
+        to local dates in one batch.
+
+        Args:
+            rows (Iterable[tuple]): Transaction rows from the database.
+            zone (Optional[ZoneInfo]): Time zone of the dates, defaults to the configured one.
+
+        Returns:
+            List[TransactionEntity]: The mapped TransactionEntity objects.
+        """
+        rows = [tuple(row) for row in rows]
+        cents = Formatter.to_cents_batch(float(row[2]) for row in rows)
+        date_fields = [row[4] for row in rows]
+        dates: List[Union[datetime, str]] = []
+        if all(isinstance(date_field, (int, float)) for date_field in date_fields):
+            dates.extend(Formatter.format_timestamps(date_fields, zone))
+        else:
+            dates.extend(cls._parse_date(date_field, zone) for date_field in date_fields)
+        return [cls(_id=str(row[0]), description=str(row[1]), amount=None, category=str(row[3]),
+                    date=day, who=cls._who(row), amount_cents=amount_cents)
+                for row, amount_cents, day in zip(rows, cents, dates)]
+
+    @staticmethod
+    def _who(row: tuple) -> Optional[str]:
+        """Returns the person a household ingestion stamped on a database row, if any."""
+        return str(row[5]) if len(row) > 5 and row[5] else None
+
     @staticmethod
-    def _parse_date(date_field) -> datetime:
+    def _parse_date(date_field, zone: Optional[ZoneInfo] = None) -> Union[datetime, str]:
         """
-        Parses a date field and converts it to a datetime object.
+        Parses a date field; UNIX timestamps are converted to their date in `zone`, or the configured timezone.
 
         Args:
             date_field (str | int | float): The date field to parse.
+            zone (Optional[ZoneInfo]): Time zone of UNIX timestamps.
 
         Returns:
-            datetime: Parsed datetime object.
+            datetime | str: Parsed datetime object, or the local 'YYYY-MM-DD' date of a timestamp.
 
         Raises:
             ValueError: If the date field is of an unsupported format or type.
@@ -82,6 +121,6 @@ class TransactionEntity:
             except ValueError as e:
                 raise ValueError(f"Invalid string format for date: {date_field}") from e
         elif isinstance(date_field, (int, float)):
-            return datetime.fromtimestamp(date_field)  # UNIX timestamp
+            return Formatter.format_timestamps([date_field], zone)[0]  # UNIX timestamp
         else:
             raise ValueError(f"Unsupported date type: {type(date_field)}", date_field)
@@ -1,15 +1,33 @@
 import os
-import shutil
-from typing import List, Tuple, Optional
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, nullcontext
+from dataclasses import replace
+from datetime import date
+from typing import (Any, Callable, Container, ContextManager, Dict, Iterable, Iterator, List, Sequence, Set, Tuple,
+                    Optional, Union)
+from zoneinfo import ZoneInfo
 
 import config
-from src.handlers.csv_handler import CSVHandler
-from src.handlers.db_handler import DBHandler
-from src.handlers.google_sheets_handler import GoogleSheetsHandler
+from src.handlers.checkpoint_handler import CheckpointHandler
+from src.handlers.csv_handler import COMPRESSION_SUFFIXES, CSVHandler
+from src.handlers.db_handler import DBHandler, TransactionCache
+from src.handlers.google_sheets_handler import GoogleSheetsHandler, SheetIdIndex
+from src.handlers.mirror_handler import MirrorHandler, SINK_CSV, SINK_SHEETS
 from src.transaction_entity import TransactionEntity
+from src.utils.aggregates import MonthlySummary
+from src.utils.change_detector import ChangeDetector, ChangeSet
+from src.utils.date_converter import DateConverter
+from src.utils.enums import Period
 from src.utils.error_handling import log_exceptions
 from src.utils.fomatter import Formatter
-from src.utils.logger import Logging
+from src.utils.logger import Logging, LogSampler
+from src.utils.memory_budget import MemoryBudget, MemoryReport, SpillingRowBuffer
+from src.utils.partitioner import DatePartitioner
+from src.utils.row_pipeline import RowPipeline
+from src.utils.settings import Settings
 
 """
 transaction_exporter.py
@@ -19,23 +37,141 @@ Classes:
 
 Functionality:
     - Connects to the database and retrieves transaction records.
-    - Writes new transactions to `transactions.csv`.
-    - Creates a backup of `transactions_history.csv` as `transactions_history_previous.csv`.
-    - Appends new transactions to `transactions_history.csv`.
+    - Writes new transactions to `transactions.csv`, streaming database rows in batches from the cursor through
+      the dedup filter and the mapping, so rows already exported are never held in memory.
+    - Optionally creates a backup of `transactions_history.csv` as `transactions_history_previous.csv`.
+    - Appends new transactions to `transactions_history.csv` through a crash-safe journal.
+    - Upserts new and edited transactions, detected with content fingerprints, to the sheet or the CSV history.
+    - Exports a date range as one `transactions_<period>.csv` file per day, month or year, in parallel.
+    - Merges custom transactions imported from CSV/JSONL files into the same writes as the database rows.
+    - Reads the backups of several household members concurrently into one merged stream, stamped with the person.
+    - Optionally checkpoints Google Sheets backfills after every acknowledged write, so they resume after a failure.
+    - Optionally finds the IDs already in the sheet through a hidden, hashed ID index instead of a full download.
+    - Streams the transactions added, removed and modified between two backups to stdout, a CSV file or a tab.
+    - Optionally bounds the dedup set and the buffered new rows to a memory budget, spilling them to temporary
+      SQLite tables beyond it, and reports the peak RSS of every stage.
+    - Optionally mirrors the exported rows to a local SQLite database, used for queries and as the dedup source.
+    - Optionally maintains monthly totals by category and person in `transactions_summary.csv` or a summary tab,
+      updated with the rows each run writes.
 """
 
+# Rows held for the writers: a list, or a buffer spilling to disk under a memory budget
+RowBuffer = Union[List[List[str]], SpillingRowBuffer]
+
 
 class TransactionExporter(Logging):
     """Handles the process of exporting transactions."""
 
-    def __init__(self, db_file: str, output_dir: Optional[str] = None):
+    def __init__(self, db_file: str, output_dir: Optional[str] = None, date_from: Optional[str] = None,
+                 date_to: Optional[str] = None, batch_size: Optional[int] = None, backup_history: bool = False,
+                 summary: bool = False, mirror_file: Optional[str] = None,
+                 sources: Optional[Dict[str, str]] = None, imported: Optional[List[tuple]] = None,
+                 settings: Optional[Settings] = None, cache: Optional[TransactionCache] = None,
+                 checkpoint_file: Optional[str] = None, sheet_index: bool = False,
+                 max_memory: Optional[int] = None):
+        """
+        Args:
+            db_file (str): The path to the database file.
+            output_dir (Optional[str]): Directory for the CSV output files, defaults to the settings' output_dir.
+            date_from (Optional[str]): Inclusive start date ('YYYY-MM-DD'), defaults to the settings' date_filter.
+            date_to (Optional[str]): Inclusive upper date bound ('YYYY-MM-DD'), defaults to the settings' date_to
+                                     (unbounded when neither is set).
+            batch_size (Optional[int]): Maximum number of rows per Google Sheets append request.
+            backup_history (bool): Copy the history file to the backup file before each CSV export. Appends are
+                                   journaled, so the copy is not needed for crash safety.
+            summary (bool): Maintain monthly totals in the summary CSV file or tab next to the exported rows.
+            mirror_file (Optional[str]): SQLite mirror of the exported rows. When set, the IDs it recorded for a sink
+                                         replace reading them back from the sink.
+            sources (Optional[Dict[str, str]]): Household ingestion: person -> database file. When set, every
+                                                export reads all of them into one merged stream stamped with the
+                                                person, instead of `db_file`.
+            imported (Optional[List[tuple]]): Custom transactions read by `ImportHandler.load`, merged into the
+                                              database rows of the date range before deduplication.
+            settings (Optional[Settings]): Sync profile providing the defaults, the sheet range and the history
+                                           compression; defaults to the process settings.
+            cache (Optional[TransactionCache]): Shared reads of the backups, so several exporters of one process
+                                                (e.g. a batch of profiles) read a backup once.
+            checkpoint_file (Optional[str]): Checkpoint of Google Sheets appends. When set, rows are written at
+                                             planned positions and the progress is saved after every write, so an
+                                             interrupted backfill resumes without reading the sheet again.
+            sheet_index (bool): Find existing Google Sheets IDs through a hidden index tab: small deltas look up
+                                their IDs instead of downloading the ID column, which larger ones still do.
+            max_memory (Optional[int]): Memory budget of the buffers, in bytes. When set, the dedup set and the new
+                                        rows spill to temporary SQLite tables beyond it, database rows and the sheet
+                                        are streamed in chunks, and `memory_report` records the peak RSS of every
+                                        stage. Only the incremental exports support it: it cannot be combined with
+                                        `checkpoint_file` or `sheet_index`, and upserts, tab periods and partitioned
+                                        exports raise ValueError.
+        """
         super().__init__()
+        self.settings = settings or Settings.current()
         self.db_file = os.path.abspath(db_file)
+        output_dir = output_dir or self.settings.output_dir
         if output_dir is not None:
             self.output_dir = os.path.abspath(output_dir)
+        self.date_from = date_from or self.settings.date_filter
+        self.date_to = date_to or self.settings.date_to
+        self.batch_size = batch_size
+        self.backup_history = backup_history
+        self.summary = summary
+        self.mirror_file = mirror_file
+        self.sources = {who: os.path.abspath(path) for who, path in sources.items()} if sources else None
+        self.imported = imported or []
+        self.cache = cache
+        self.checkpoint_file = checkpoint_file
+        self.sheet_index = sheet_index
+        if max_memory and (checkpoint_file or sheet_index):
+            raise ValueError("A memory budget cannot be combined with checkpoints or the sheet ID index.")
+        self.budget = MemoryBudget(max_memory) if max_memory else None
+        self.memory_report = MemoryReport() if max_memory else None
 
     from typing import List
 
+    def fetch_transactions(self, db_file: str) -> List[tuple]:
+        """
+        Fetches the transactions of the date range from `db_file`, or from every household backup when configured.
+
+        Imported custom transactions of the date range are appended, so they go through the same dedup and writes.
+
+        Args:
+            db_file (str): The path to the database file, ignored for household ingestion.
+
+        Returns:
+            List[tuple]: Database rows; household and imported rows carry the person as a sixth field.
+        """
+        if self.sources:
+            transactions = DBHandler.fetch_household_transactions(self.sources, self.date_from, self.date_to,
+                                                                  self.settings.zone)
+        elif self.cache is not None:
+            transactions = self.cache.fetch(db_file, self.date_from, self.date_to, self.settings.zone)
+        else:
+            transactions = DBHandler.fetch_transactions(db_file, self.date_from, self.date_to, self.settings.zone)
+        if self.imported:
+            transactions = transactions + [row for row in self.imported
+                                           if self._in_date_range(Formatter.format_timestamp(row[4], self.settings.zone))]
+        return transactions
+
+    def transaction_batches(self, db_file: str) -> Iterator[List[tuple]]:
+        """
+        Streams the rows of `fetch_transactions` in batches of `PIPELINE_BATCH_SIZE`.
+
+        Rows of a single backup come straight from the database cursor. Household and cached reads are already in
+        memory, so they are only split into batches.
+
+        Args:
+            db_file (str): The path to the database file, ignored for household ingestion.
+
+        Returns:
+            Iterator[List[tuple]]: Batches of database rows.
+        """
+        if self.sources or self.cache is not None:
+            yield from RowPipeline.batches(self.fetch_transactions(db_file))
+            return
+        yield from DBHandler.iter_transactions(db_file, self.date_from, self.date_to, zone=self.settings.zone)
+        if self.imported:
+            yield from RowPipeline.batches([row for row in self.imported
+                                            if self._in_date_range(Formatter.format_timestamp(row[4], self.settings.zone))])
+
     @log_exceptions(Logging.get_logger())
     def fetch_and_append(self, db_file: str, sheet_handler: GoogleSheetsHandler,
                          sheet_range: Optional[str] = None) -> None:
@@ -48,115 +184,860 @@ class TransactionExporter(Logging):
             sheet_handler (GoogleSheetsHandler): An instance of GoogleSheetsHandler to interact with the Google Sheet.
             sheet_range (str): The range in A1 notation within the Google Sheet for fetching existing data.
         """
+        if self.budget is not None:
+            self._append_within_budget(db_file, sheet_handler, sheet_range)
+            return
+
         # Step 1: Fetch all transactions from the database
-        transactions = DBHandler.fetch_transactions(db_file, config.DATE_FILTER)
+        transactions = self.fetch_transactions(db_file)
         if not transactions:
             self.logger.info("No transactions found in database, skipping operation.")
             return
 
         # Step 2: Map database rows to TransactionEntity instances
-        transaction_entities = [TransactionEntity.from_db_row(tuple(row)) for row in transactions]
+        transaction_entities = TransactionEntity.from_db_rows(transactions, self.settings.zone)
+
+        if self.checkpoint_file:
+            rows_to_append = self._append_with_checkpoint(transaction_entities, sheet_handler, sheet_range,
+                                                          self.checkpoint_file)
+            if self.summary:
+                self.update_summary_tab(sheet_handler, rows_to_append,
+                                        data_ranges=lambda: [sheet_range or self.settings.default_range])
+            return
 
-        # Step 3: Get existing transactions from the sheet
-        existing_rows: List[List[str]] = sheet_handler.read_transactions(sheet_range)
-        # Assuming ID is in the first column
-        existing_ids = {row[0] for row in existing_rows} if existing_rows else set()
+        # Step 3: Get the IDs of existing transactions from the mirror, the ID index or the sheet (ID is in the first column)
+        index = SheetIdIndex(sheet_handler, sheet_range) if self.sheet_index else None
+        if self.mirror_file:
+            existing_ids = self._exported_ids(SINK_SHEETS, lambda: sheet_handler.read_transactions(sheet_range))
+            if index is not None:  # Only the IDs the mirror has not recorded are looked up in the sheet
+                recorded = {txn.id for txn in transaction_entities if txn.id in existing_ids}
+                existing_ids = recorded | self._indexed_ids(
+                    index, [txn.id for txn in transaction_entities if txn.id not in recorded])
+        elif index is not None:
+            existing_ids = self._indexed_ids(index, [txn.id for txn in transaction_entities])
+        else:
+            existing_ids = set(sheet_handler.read_ids(sheet_range))
 
         # Step 4: Filter only new transactions
         new_transactions = [txn for txn in transaction_entities if txn.id not in existing_ids]
 
-        if not new_transactions:
-            self.logger.info("No new transactions to append to the Google Sheet.")
-            return
-
         # Convert the new transactions into lists
         rows_to_append = [txn.to_list() for txn in new_transactions]
 
-        # Step 5: Append new transactions to the Google Sheet
-        try:
-            sheet_handler.append_transactions(rows_to_append)
-            self.logger.info(f"Appended {len(new_transactions)} new transactions to the Google Sheet.")
-        except Exception as e:
-            self.logger.exception("An error occurred while appending transactions to the Google Sheet: %s", e)
-            raise
+        if not rows_to_append:
+            self.logger.info("No new transactions to append to the Google Sheet.")
+        else:
+            # Step 5: Append new transactions to the Google Sheet
+            try:
+                written = 0
+                for batch in self._batched(rows_to_append, self.batch_size):
+                    if index is None:
+                        sheet_handler.append_transactions(batch)
+                    else:  # The index knows where the data ends, sparing the lookup of the first empty row
+                        sheet_handler.append_transactions(batch, index.append_range(written))
+                    written += len(batch)
+                    self._mirror_rows(SINK_SHEETS, batch)  # Only acknowledged rows, so a failed batch is retried
+                self.logger.info(f"Appended {len(new_transactions)} new transactions to the Google Sheet.")
+                # Reached once every batch was acknowledged. After a failure the index keeps its old end, and the
+                # acknowledged rows below it make the next lookup stale, so it is rebuilt instead of trusted.
+                if index is not None:
+                    index.add([row[0] for row in rows_to_append], len(rows_to_append))
+            except Exception as e:
+                self.logger.exception("An error occurred while appending transactions to the Google Sheet: %s", e)
+                raise
+
+        if self.summary:
+            self.update_summary_tab(sheet_handler, rows_to_append,
+                                    data_ranges=lambda: [sheet_range or self.settings.default_range])
+
+    def _append_within_budget(self, db_file: str, sheet_handler: GoogleSheetsHandler,
+                              sheet_range: Optional[str] = None) -> None:
+        """
+        Appends the new transactions like `fetch_and_append`, with every buffer bounded by the memory budget.
+
+        The existing IDs are read in chunks of rows into a spilling set, database rows are streamed in batches, and
+        the new rows are held in a spilling buffer, so memory stays flat however large the sheet and the backup are.
+
+        Args:
+            db_file (str): The path to the database file.
+            sheet_handler (GoogleSheetsHandler): An instance of GoogleSheetsHandler to interact with the Google Sheet.
+            sheet_range (str): The range in A1 notation within the Google Sheet for fetching existing data.
+        """
+        with ExitStack() as buffers:
+            with self._stage('read sheet ids'):
+                if self.mirror_file:
+                    existing_ids = self._exported_ids(SINK_SHEETS, lambda: sheet_handler.iter_transactions(sheet_range),
+                                                      buffers)
+                else:
+                    existing_ids = self._id_set(sheet_handler.iter_ids(sheet_range), buffers)
+
+            with self._stage('fetch and diff'):
+                rows_to_append = self._row_buffer((
+                    txn.to_list() for batch in self.transaction_batches(db_file)
+                    for txn in TransactionEntity.from_db_rows(batch, self.settings.zone) if txn.id not in existing_ids), buffers)
+
+            if not rows_to_append:
+                self.logger.info("No new transactions to append to the Google Sheet.")
+                return
+            with self._stage('append'):
+                for batch in RowPipeline.batches(rows_to_append, self.batch_size or config.PIPELINE_BATCH_SIZE):
+                    sheet_handler.append_transactions(batch)
+                    self._mirror_rows(SINK_SHEETS, batch)  # Only acknowledged rows, so a failed batch is retried
+                self.logger.info(f"Appended {len(rows_to_append)} new transactions to the Google Sheet.")
+                if self.summary:
+                    self.update_summary_tab(sheet_handler, rows_to_append,
+                                            data_ranges=lambda: [sheet_range or self.settings.default_range])
+
+    def _indexed_ids(self, index: SheetIdIndex, transaction_ids: List[str]) -> Set[str]:
+        """
+        Finds which IDs are in the sheet through the ID index.
+
+        The candidates are looked up in their index buckets, or in the whole index when they span too many of
+        them. Only a missing or stale index downloads the ID column and rebuilds the index from it.
+
+        Args:
+            index (SheetIdIndex): The ID index of the sheet range.
+            transaction_ids (List[str]): The candidate IDs: the fetched ones the mirror has not recorded, if any.
+
+        Returns:
+            Set[str]: The IDs already in the sheet.
+        """
+        found = index.lookup(transaction_ids)
+        if found is not None:
+            return found
+        sheet_handler = index.sheet_handler
+        existing_ids = sheet_handler.read_ids(index.range_name)
+        index.build(existing_ids, sheet_handler.first_empty_row_number(index.range_name))
+        return set(existing_ids)
+
+    def _append_with_checkpoint(self, transaction_entities: List[TransactionEntity],
+                                sheet_handler: GoogleSheetsHandler, sheet_range: Optional[str],
+                                checkpoint_file: str) -> List[List[str]]:
+        """
+        Writes the new transactions in checkpointed chunks, resuming an interrupted backfill when there is one.
+
+        A new backfill is planned from the usual diff: its IDs and the first empty sheet row are saved before the
+        first write. Each chunk is written at its planned rows and acknowledged in the checkpoint, so retrying a
+        chunk whose acknowledgement was lost overwrites it rather than duplicating it. A resumed backfill only reads
+        the rows below the last acknowledged one, to check nobody else wrote there.
+
+        Args:
+            transaction_entities (List[TransactionEntity]): The transactions of the date range.
+            sheet_handler (GoogleSheetsHandler): An instance of GoogleSheetsHandler to interact with the Google Sheet.
+            sheet_range (Optional[str]): The range in A1 notation holding the transactions.
+            checkpoint_file (str): Path of the checkpoint file.
+
+        Returns:
+            List[List[str]]: The rows written by this run.
+        """
+        range_name = sheet_range or sheet_handler.default_range
+        checkpoints = CheckpointHandler(checkpoint_file, f"{sheet_handler.spreadsheet_id}|{range_name}")
+        rows_by_id = {txn.id: txn.to_list() for txn in transaction_entities}
+
+        checkpoint = checkpoints.load()
+        if checkpoint is not None:
+            pending = set(checkpoint.pending_ids)
+            below = sheet_handler.read_transactions(sheet_handler.rows_range(checkpoint.next_row, range_name=range_name))
+            if any(row and row[0] not in pending for row in below) or not pending.issubset(rows_by_id):
+                # Someone else wrote below the checkpoint, or planned transactions were deleted since
+                self.logger.warning(f"The backfill checkpointed at row {checkpoint.next_row} no longer matches the "
+                                    f"sheet and the database; planning it again.")
+                checkpoint = None
+            else:
+                self.logger.info(f"Resuming a backfill after {checkpoint.written}/{len(checkpoint.ids)} rows "
+                                 f"(last ID {checkpoint.last_id}) at row {checkpoint.next_row}.")
+
+        if checkpoint is None:
+            if self.mirror_file:
+                existing_ids = self._exported_ids(SINK_SHEETS, lambda: sheet_handler.read_transactions(sheet_range))
+            else:
+                existing_ids = set(sheet_handler.read_ids(sheet_range))
+            new_ids = [txn_id for txn_id in rows_by_id if txn_id not in existing_ids]
+            if not new_ids:
+                self.logger.info("No new transactions to append to the Google Sheet.")
+                return []
+            checkpoint = checkpoints.start(new_ids, sheet_handler.first_empty_row_number(range_name))
+
+        written: List[List[str]] = []
+        for batch in self._batched([rows_by_id[txn_id] for txn_id in checkpoint.pending_ids], self.batch_size):
+            sheet_handler.write_rows(batch, checkpoint.next_row, range_name)
+            checkpoints.acknowledge(checkpoint, len(batch))
+            self._mirror_rows(SINK_SHEETS, batch)
+            written.extend(batch)
+        checkpoints.clear()
+        self.logger.info(f"Appended {len(written)} new transactions to the Google Sheet.")
+        return written
+
+    @log_exceptions(Logging.get_logger())
+    def fetch_and_append_by_tab(self, db_file: str, sheet_handler: GoogleSheetsHandler,
+                                period: Period = Period.YEAR) -> Dict[str, int]:
+        """
+        Fetch transactions from the database and append the new ones to per-period tabs of the Google Sheet.
+
+        Missing tabs are created, and all tabs are read with one batchGet and written with one batchUpdate request,
+        so the number of API calls does not grow with the number of tabs.
+
+        Args:
+            db_file (str): The path to the database file.
+            sheet_handler (GoogleSheetsHandler): An instance of GoogleSheetsHandler to interact with the Google Sheet.
+            period (Period): Whether rows are routed to one tab per year or per month (or day).
+
+        Returns:
+            Dict[str, int]: The number of rows appended per tab.
+        """
+        self._require_no_budget('tab periods')
+        transactions = self.fetch_transactions(db_file)
+        if not transactions:
+            self.logger.info("No transactions found in database, skipping operation.")
+            return {}
+
+        # Group the transactions by their destination tab
+        entities_by_tab: Dict[str, List[TransactionEntity]] = {}
+        for txn in TransactionEntity.from_db_rows(transactions, self.settings.zone):
+            entities_by_tab.setdefault(self.tab_name(txn.date, period), []).append(txn)
+
+        tab_names = list(entities_by_tab)
+        sheet_handler.ensure_tabs(tab_names)
+        existing_rows_by_tab = sheet_handler.read_tabs(tab_names)
+
+        rows_by_tab: Dict[str, List[List[str]]] = {}
+        for name, entities in entities_by_tab.items():
+            existing_ids = {row[0] for row in existing_rows_by_tab.get(name, []) if row}
+            new_rows = [txn.to_list() for txn in entities if txn.id not in existing_ids]
+            if new_rows:
+                rows_by_tab[name] = new_rows
+
+        if not rows_by_tab:
+            self.logger.info("No new transactions to append to the Google Sheet.")
+        else:
+            sheet_handler.append_transactions_by_tab(rows_by_tab, existing_rows_by_tab)
+            self._mirror_rows(SINK_SHEETS, [row for rows in rows_by_tab.values() for row in rows])
+            self.logger.info(f"Appended {sum(map(len, rows_by_tab.values()))} new transactions to "
+                             f"{len(rows_by_tab)} tabs.")
+
+        if self.summary:
+            self.update_summary_tab(sheet_handler, [row for rows in rows_by_tab.values() for row in rows],
+                                    data_ranges=lambda: self.routed_tab_ranges(sheet_handler))
+        return {name: len(rows) for name, rows in rows_by_tab.items()}
+
+    @staticmethod
+    def tab_name(iso_date: str, period: Period = Period.YEAR) -> str:
+        """Returns the tab a transaction dated `iso_date` ('YYYY-MM-DD') is routed to, e.g. 'wydatki_2025'."""
+        key = DatePartitioner.period_key(date.fromisoformat(iso_date), period)
+        return config.SHEET_TAB_NAME.format(period=key)
+
+    @staticmethod
+    def routed_tab_ranges(sheet_handler: GoogleSheetsHandler) -> List[str]:
+        """Returns the transaction ranges of every existing tab named after `config.SHEET_TAB_NAME`."""
+        prefix, _, suffix = config.SHEET_TAB_NAME.partition('{period}')
+        pattern = re.compile(rf"{re.escape(prefix)}\d{{4}}(-\d{{2}}){{0,2}}{re.escape(suffix)}")
+        return [sheet_handler._tab_range(name, config.SHEET_TAB_CELLS)
+                for name in sheet_handler.list_tabs() if pattern.fullmatch(name)]
+
+    @log_exceptions(Logging.get_logger())
+    def update_summary_tab(self, sheet_handler: GoogleSheetsHandler, added: RowBuffer,
+                           removed: Sequence[Sequence[str]] = (),
+                           data_ranges: Optional[Callable[[], List[str]]] = None,
+                           sheet_ids: Optional[Tuple[int, int]] = None,
+                           pending: Sequence[Dict[str, Any]] = ()) -> MonthlySummary:
+        """
+        Applies the rows written to the sheet by this run to the summary tab.
+
+        The tab ends with a mark row holding the number of transaction IDs of the sheet it covers, read with the tab
+        in one request. The rows are applied only when the mark matches the IDs the sheet held before them;
+        otherwise the tab is new or a previous run stopped between writing its rows and the summary, and the
+        summary is rebuilt from the transaction ranges instead.
+
+        Args:
+            sheet_handler (GoogleSheetsHandler): An instance of GoogleSheetsHandler to interact with the Google Sheet.
+            added (RowBuffer): Rows appended or updated by this run.
+            removed (Sequence[Sequence[str]]): Previous content of the updated rows.
+            data_ranges (Optional[Callable[[], List[str]]]): Returns the ranges holding all transactions;
+                                                          defaults to the settings' default range.
+            sheet_ids (Optional[Tuple[int, int]]): The number of IDs in the sheet before and after this run's rows,
+                                                   for rows written with `pending`; by default `added` were
+                                                   appended already and the IDs are counted now.
+            pending (Sequence[Dict[str, Any]]): Value ranges of rows not written yet, written in the same
+                                                batchUpdate request as the summary.
+
+        Returns:
+            MonthlySummary: The updated summary.
+        """
+        tab = config.SUMMARY_TAB_NAME
+        sheet_handler.ensure_tabs([tab])
+        ranges = data_ranges() if data_ranges else [self.settings.default_range]
+        summary_range = sheet_handler._tab_range(tab, config.SUMMARY_TAB_CELLS)
+        id_ranges = [sheet_handler.id_range(range_name) for range_name in ranges] if sheet_ids is None else []
+        current, *id_columns = sheet_handler.read_ranges([summary_range] + id_ranges)
+        if sheet_ids is None:
+            ids_after = len({str(row[0]) for rows in id_columns for row in rows if row and str(row[0])})
+            sheet_ids = (ids_after - len(added), ids_after)
+
+        summary = MonthlySummary.from_rows(current)
+        if current and summary.mark == sheet_ids[0]:
+            if not added and not removed and not pending:
+                return summary
+            summary.add(added)
+            summary.remove(removed)
+        else:
+            self.logger.info(f"Summary tab '{tab}' is empty or behind the sheet, rebuilding it from the transactions.")
+            summary = MonthlySummary.from_transactions(row for rows in sheet_handler.read_ranges(ranges) for row in rows)
+            if pending:  # Read before this run's rows are written
+                summary.add(added)
+                summary.remove(removed)
+        summary.mark = sheet_ids[1]
+
+        rows = [config.SUMMARY_COLUMNS] + summary.to_rows()
+        rows += [[''] * len(config.SUMMARY_COLUMNS) for _ in range(len(current) - len(rows))]  # Clear dropped rows
+        _, start_row = sheet_handler._extract_column_and_row(config.SUMMARY_TAB_CELLS.split(':')[0])
+        sheet_handler.batch_update_values(list(pending) + sheet_handler.build_row_ranges(
+            {start_row + offset: row for offset, row in enumerate(rows)}, summary_range))
+        self.logger.info(f"Updated {len(summary.totals)} monthly totals in the '{tab}' tab.")
+        return summary
+
+    @log_exceptions(Logging.get_logger())
+    def upsert_to_sheet(self, db_file: str, sheet_handler: GoogleSheetsHandler,
+                        sheet_range: Optional[str] = None) -> ChangeSet:
+        """
+        Append new transactions and update edited ones in place in the Google Sheet.
+
+        The content fingerprint of every row is kept in `config.SHEET_FINGERPRINT_COLUMN`, next to the row. Only the
+        ID, date and fingerprint columns are read, and all new rows, edited rows and fingerprints are written with a
+        single values.batchUpdate request. Deleted transactions are reported but left in the sheet, and rows written
+        before fingerprints existed only get their fingerprint recorded.
+
+        Args:
+            db_file (str): The path to the database file.
+            sheet_handler (GoogleSheetsHandler): An instance of GoogleSheetsHandler to interact with the Google Sheet.
+            sheet_range (str): The range in A1 notation holding the transactions, defaults to the settings' range.
+
+        Returns:
+            ChangeSet: The classified transactions.
+        """
+        self._require_no_budget('upserts')
+        range_name = sheet_range or self.settings.default_range
+        transactions = self.fetch_transactions(db_file)
+        rows = [txn.to_list() for txn in TransactionEntity.from_db_rows(transactions, self.settings.zone)]
+
+        index, next_row = sheet_handler.read_row_fingerprints(range_name)
+        known = {transaction_id: fingerprint for transaction_id, (_, _, fingerprint) in index.items()}
+        deletable = {transaction_id for transaction_id, (_, day, _) in index.items() if self._in_date_range(day)}
+        changes = ChangeDetector.diff(rows, known, deletable)
+
+        rows_by_number = {index[row[0]][0]: row for row in changes.changed}
+        rows_by_number.update({next_row + offset: row for offset, row in enumerate(changes.new)})
+        fingerprints = {number: [ChangeDetector.fingerprint(row)] for number, row in rows_by_number.items()}
+        fingerprints.update({index[row[0]][0]: [ChangeDetector.fingerprint(row)] for row in changes.untracked})
+
+        self._log_changes(changes)
+        # The summary needs the previous content of edited rows, read before they are overwritten
+        replaced = self._read_sheet_rows(sheet_handler, [index[row[0]][0] for row in changes.changed], range_name) \
+            if self.summary else []
+        updates: List[Dict[str, Any]] = []
+        if fingerprints:
+            fingerprint_range = sheet_handler.project_range(range_name, config.SHEET_FINGERPRINT_COLUMN)
+            updates = (sheet_handler.build_row_ranges(rows_by_number, range_name) +
+                       sheet_handler.build_row_ranges(fingerprints, fingerprint_range))
+        if self.summary:  # Written in the same request, so an edit and its summary change cannot be split
+            self.update_summary_tab(sheet_handler, changes.new + changes.changed, replaced,
+                                    data_ranges=lambda: [range_name],
+                                    sheet_ids=(len(index), len(index) + len(changes.new)), pending=updates)
+        elif updates:
+            sheet_handler.batch_update_values(updates)
+        self._mirror_rows(SINK_SHEETS, changes.new + changes.changed)
+        return changes
+
+    @staticmethod
+    def _read_sheet_rows(sheet_handler: GoogleSheetsHandler, row_numbers: List[int],
+                         range_name: str) -> List[List[str]]:
+        """Reads the given sheet rows of a range with one batchGet request, merging consecutive rows."""
+        if not row_numbers:
+            return []
+        ranges = [entry['range'] for entry in sheet_handler.build_row_ranges(
+            {number: [] for number in row_numbers}, range_name)]
+        return [row for rows in sheet_handler.read_ranges(ranges) for row in rows]
+
+    @log_exceptions(Logging.get_logger())
+    def fetch_and_upsert_csv(self) -> ChangeSet:
+        """
+        Writes new and edited transactions to `transactions.csv` and appends them to the history.
+
+        Fingerprints of the exported rows are computed from the history itself. An edited transaction is appended
+        again, and the last occurrence of an ID in the history supersedes the earlier ones, so a run only writes the
+        rows that changed. Deleted transactions are reported but kept in the history.
+
+        Returns:
+            ChangeSet: The classified transactions.
+        """
+        self._require_no_budget('upserts')
+        file_paths = self.define_file_paths()
+        self.prepare_history_file(file_paths['history_file'])
+        transactions = self.fetch_transactions(self.db_file)
+        rows = self.process_rows(transactions)
+
+        # Padded like the history, so rows written before and after the person column fingerprint alike
+        rows = list(self._csv_rows(rows, self.csv_columns))
+        latest = self._latest_history_rows(file_paths['history_file'])
+        latest = dict(zip(latest, self._csv_rows(latest.values(), self.csv_columns)))
+        date_index = config.COLUMN_ORDER.index('data')
+        known = {transaction_id: ChangeDetector.fingerprint(row) for transaction_id, row in latest.items()}
+        deletable = {transaction_id for transaction_id, row in latest.items()
+                     if len(row) > date_index and self._in_date_range(row[date_index])}
+        changes = ChangeDetector.diff(rows, known, deletable)
+
+        self._log_changes(changes)
+        upserts = changes.new + changes.changed
+        if not upserts:
+            self.logger.info("No new or changed transactions to process. Skipping file generation.")
+            return changes
+
+        if self.backup_history:
+            self.backup_history_file(file_paths['history_file'], file_paths['history_backup_file'])
+        history_mark = self._file_size(file_paths['history_file'])
+        CSVHandler.rewrite_csv(file_paths['transactions_file'], self.csv_columns, upserts)
+        CSVHandler.append_to_csv(file_paths['history_file'], self.csv_columns, upserts, journal=True)
+        self._mirror_rows(SINK_CSV, upserts)
+        if self.summary:
+            self.update_summary_csv(file_paths, upserts, [latest[row[0]] for row in changes.changed], history_mark)
+        return changes
+
+    def _exported_ids(self, sink: str, seed_rows: Callable[[], Iterable[Sequence[str]]],
+                      buffers: Optional[ExitStack] = None) -> Container[str]:
+        """
+        Returns the IDs the mirror recorded as exported to a sink.
+
+        The first time a sink is seen, the mirror is seeded with the rows it already holds, read with `seed_rows`.
+        Under a memory budget the IDs are streamed into a spilling set, closed with `buffers`.
+        """
+        with MirrorHandler(self.mirror_file) as mirror:  # type: ignore[arg-type]
+            if not mirror.has_exports(sink):
+                self.logger.info(f"Seeding the mirror with the rows already exported to '{sink}'.")
+                mirror.upsert(seed_rows(), sink)
+            if buffers is None:
+                return mirror.exported_ids(sink)
+            return self._id_set(mirror.iter_exported_ids(sink), buffers)
+
+    def _require_no_budget(self, operation: str) -> None:
+        """Raises ValueError when a memory budget is set for an operation that holds its working set in memory."""
+        if self.budget is not None:
+            raise ValueError(f"A memory budget is not supported by {operation}.")
+
+    def _id_set(self, transaction_ids: Iterable[str], buffers: ExitStack) -> Container[str]:
+        """Collects IDs into a set, or into a spilling set closed with `buffers` under a memory budget."""
+        if self.budget is None:
+            return set(transaction_ids)
+        return buffers.enter_context(self.budget.id_set()).update(transaction_ids)
+
+    def _row_buffer(self, rows: Iterable[List[str]],
+                    buffers: ExitStack) -> RowBuffer:
+        """Collects rows into a list, or into a spilling buffer closed with `buffers` under a memory budget."""
+        if self.budget is None:
+            return list(rows)
+        buffer = buffers.enter_context(self.budget.row_buffer())
+        buffer.extend(rows)
+        return buffer
+
+    def _stage(self, name: str) -> ContextManager:
+        """Measures a stage in the memory report, when a memory budget is set."""
+        return self.memory_report.stage(name) if self.memory_report is not None else nullcontext()
+
+    def _mirror_rows(self, sink: str, rows: Iterable[List[str]]) -> None:
+        """Records rows written to a sink in the mirror, when one is configured."""
+        if self.mirror_file and rows:
+            with MirrorHandler(self.mirror_file) as mirror:
+                mirror.upsert(rows, sink)
+
+    @staticmethod
+    def _file_size(file_path: str) -> int:
+        """Returns the size of a file in bytes, 0 when it does not exist yet."""
+        return os.path.getsize(file_path) if os.path.exists(file_path) else 0
+
+    @staticmethod
+    def _latest_history_rows(history_file: str) -> Dict[str, List[str]]:
+        """Streams the history into the latest row of every ID; later lines supersede earlier ones."""
+        # Older histories repeat the header on every append; those lines are not transactions
+        header = config.COLUMN_ORDER
+        return {row[0]: row for row in CSVHandler.iter_csv(history_file) if row and row[:len(header)] != header}
+
+    @log_exceptions(Logging.get_logger())
+    def update_summary_csv(self, file_paths: Dict[str, str], added: Iterable[List[str]],
+                           removed: Sequence[Sequence[str]] = (), history_mark: Optional[int] = None) -> MonthlySummary:
+        """
+        Applies the rows just appended to the history to the summary CSV.
+
+        The summary ends with a mark row holding the size of the history it covers. The rows are applied only when
+        the mark matches `history_mark`; otherwise the summary does not exist yet or a previous run stopped between
+        appending to the history and writing the summary, and it is rebuilt from the history in a single streaming
+        pass instead, which already holds the appended rows.
+
+        Args:
+            file_paths (Dict[str, str]): The paths from `define_file_paths`.
+            added (Iterable[List[str]]): Rows appended to the history by this run.
+            removed (Sequence[Sequence[str]]): Previous versions of the edited rows.
+            history_mark (Optional[int]): Size of the history file in bytes before the rows were appended.
+
+        Returns:
+            MonthlySummary: The updated summary.
+        """
+        summary_file = file_paths['summary_file']
+        summary = MonthlySummary.from_rows(CSVHandler.iter_csv(summary_file)) if os.path.exists(summary_file) else None
+        if summary is not None and history_mark is not None and summary.mark == history_mark:
+            summary.add(added)
+            summary.remove(removed)
+        else:
+            self.logger.info(f"Building '{summary_file}' from the history.")
+            summary = MonthlySummary.from_transactions(self._latest_history_rows(file_paths['history_file']).values())
+        summary.mark = self._file_size(file_paths['history_file'])
+        CSVHandler.rewrite_csv(summary_file, config.SUMMARY_COLUMNS, summary.to_rows())
+        return summary
+
+    def _in_date_range(self, day: str) -> bool:
+        """Checks whether an exported 'YYYY-MM-DD' date lies within the exporter's date range, bounds included."""
+        return day >= self.date_from and (self.date_to is None or day <= self.date_to)
+
+    def _log_changes(self, changes: ChangeSet) -> None:
+        """Logs a summary of a diff."""
+        self.logger.info(f"Found {len(changes.new)} new, {len(changes.changed)} changed, {len(changes.deleted)} "
+                         f"deleted and {len(changes.untracked)} untracked transactions.")
+        if changes.deleted:
+            self.logger.warning(f"Transactions no longer present in the database: {changes.deleted[:20]}")
 
     @log_exceptions(Logging.get_logger())
     def fetch_and_export(self) -> None:
-        """Fetches rows from the database, processes them, and writes them to three output CSV files only if there are new transactions."""
+        """
+        Fetches rows from the database, processes them, and writes them to three output CSV files only if there are new transactions.
+
+        Rows are streamed from the database in batches and dropped as soon as their ID is found among the exported
+        ones, so only the new rows are kept, already mapped for the writers. Under a memory budget the exported IDs
+        and the new rows spill to disk beyond it.
+        """
         file_paths = self.define_file_paths()
-        transactions = DBHandler.fetch_transactions(self.db_file, config.DATE_FILTER)
-        new_transactions = self.extract_new_transactions(file_paths['history_file'], transactions)
-        if not new_transactions:
-            self.logger.info("No new transactions to process. Skipping file generation.")
+        history_file = file_paths['history_file']
+        self.prepare_history_file(history_file)
+        with ExitStack() as buffers:
+            with self._stage('read exported ids'):
+                if self.mirror_file:
+                    exported = self._exported_ids(SINK_CSV, lambda: self._latest_history_rows(history_file).values(),
+                                                  buffers if self.budget is not None else None)
+                elif self.budget is None:
+                    exported = CSVHandler.read_ids(history_file) if os.path.exists(history_file) else set()
+                else:
+                    exported = self._id_set((row[0] for row in CSVHandler.iter_csv(history_file) if row)
+                                            if os.path.exists(history_file) else (), buffers)
+            with self._stage('fetch and diff'):
+                new_batches = RowPipeline.drop_known(self.transaction_batches(self.db_file), exported)
+                rows = self._row_buffer(RowPipeline.rows(self.map_batches(new_batches)), buffers)
+            if not rows:
+                self.logger.info("No new transactions to process. Skipping file generation.")
+                return
+            with self._stage('write'):
+                if self.backup_history:
+                    self.backup_history_file(history_file, file_paths['history_backup_file'])
+                history_mark = self._file_size(history_file)
+                self.write_rows(file_paths, rows)
+                self._mirror_rows(SINK_CSV, rows)
+                if self.summary:
+                    self.update_summary_csv(file_paths, rows, history_mark=history_mark)
+
+    @log_exceptions(Logging.get_logger())
+    def fetch_and_export_partitioned(self, period: Period = Period(config.PARTITION_PERIOD),
+                                     workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Exports the date range as one CSV file per period, processing the partitions in parallel processes.
+
+        Each file holds every transaction of its period and is fully rewritten, so re-running a single
+        period leaves the other files untouched.
+
+        Args:
+            period (Period): Length of a single partition.
+            workers (Optional[int]): Number of worker processes, defaults to the number of CPUs.
+
+        Returns:
+            Dict[str, int]: The number of rows written per partition key.
+        """
+        self._require_no_budget('partitioned exports')
+        date_to = date.fromisoformat(self.date_to) if self.date_to else DateConverter.of(self.settings.zone).today()
+        partitions = DatePartitioner.split(date.fromisoformat(self.date_from), date_to, period)
+        tasks = [
+            (self.db_file, partition.start.isoformat(), partition.end.isoformat(),
+             self.define_partition_file_path(partition.key), self.sources,
+             [row for row in self.imported
+              if partition.start.isoformat() <= Formatter.format_timestamp(row[4], self.settings.zone)
+              < partition.end.isoformat()], self.settings.timezone)
+            for partition in partitions
+        ]
+        workers = min(workers or os.cpu_count() or 1, len(tasks))
+        self.logger.info(f"Exporting {len(tasks)} {period.value} partitions with {workers} workers.")
+
+        if workers <= 1:
+            counts = [TransactionExporter.export_partition(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                counts = list(pool.map(TransactionExporter.export_partition, *zip(*tasks)))
+
+        return {partition.key: count for partition, count in zip(partitions, counts)}
+
+    @staticmethod
+    def export_partition(db_file: str, start: str, end: str, file_path: str,
+                         sources: Optional[Dict[str, str]] = None, imported: Sequence[tuple] = (),
+                         timezone: Optional[str] = None) -> int:
+        """
+        Writes every transaction created in [start, end) to `file_path`, replacing its previous content.
+
+        Runs in a worker process, so it only takes picklable arguments. With household `sources`, the partition
+        is read from every backup instead of `db_file`; `imported` rows of the partition are written with it.
+        The bounds and dates are local to `timezone` (the profile's IANA name), defaulting to the configured zone.
+
+        Returns:
+            int: The number of rows written.
+        """
+        settings = replace(Settings.current(), timezone=timezone) if timezone else Settings.current()
+        zone = settings.zone
+        if sources:
+            transactions = DBHandler.fetch_household_transactions_between(sources, start, end, zone)
+        else:
+            transactions = DBHandler.fetch_transactions_between(db_file, start, end, zone)
+        transactions = transactions + list(imported)
+        columns = config.HOUSEHOLD_COLUMN_ORDER if sources or imported else config.COLUMN_ORDER
+        rows = TransactionExporter._csv_rows(TransactionExporter(db_file, settings=settings).iter_rows(transactions),
+                                             columns)
+        return CSVHandler.rewrite_csv(file_path, columns, rows).rows - 1  # Without the header
+
+    def iter_snapshot_diff(self, old_db_file: str, counts: Optional[Counter] = None) -> Iterator[List[str]]:
+        """
+        Streams the changes between an older backup and the exporter's one as `SNAPSHOT_DIFF_COLUMNS` rows.
+
+        The backups are compared by `DBHandler.iter_backup_diff` in one query, for transactions created from
+        `date_from`. Previous values are only filled in for modified transactions.
+
+        Args:
+            old_db_file (str): The path to the older database file.
+            counts (Optional[Counter]): Incremented with the number of rows of every change type.
+
+        Returns:
+            Iterator[List[str]]: The change ('added', 'removed' or 'modified'), the transaction, its previous values.
+        """
+        unchanged = ['', '', '', '']
+        for batch in DBHandler.iter_backup_diff(old_db_file, self.db_file, self.date_from, zone=self.settings.zone):
+            for change, transaction_id, name, amount, category, timestamp, *previous in batch:
+                if counts is not None:
+                    counts[change] += 1
+                old_name, old_amount, old_category, old_timestamp = previous
+                yield [change, str(transaction_id), str(name), Formatter.format_amount(amount),
+                       Formatter.map_category(category), Formatter.format_timestamp(timestamp, self.settings.zone),
+                       *(unchanged if change != 'modified' else
+                         [str(old_name), Formatter.format_amount(old_amount), Formatter.map_category(old_category),
+                          Formatter.format_timestamp(old_timestamp, self.settings.zone)])]
+
+    @log_exceptions(Logging.get_logger())
+    def write_snapshot_diff(self, old_db_file: str, sink: str,
+                            sheet_handler: Optional[GoogleSheetsHandler] = None) -> Dict[str, int]:
+        """
+        Streams the changes between an older backup and the exporter's one to a sink.
+
+        The CSV sink rewrites `SNAPSHOT_DIFF_FILE` in the output directory. The Sheets sink appends the rows to the
+        `SNAPSHOT_DIFF_TAB` tab in batches, creating it with a header first, so it keeps a log of every diff.
+
+        Args:
+            old_db_file (str): The path to the older database file.
+            sink (str): `SINK_CSV` or `SINK_SHEETS`.
+            sheet_handler (Optional[GoogleSheetsHandler]): The sheet of the Sheets sink.
+
+        Returns:
+            Dict[str, int]: The number of rows of every change type.
+        """
+        counts: Counter = Counter()
+        rows = self.iter_snapshot_diff(old_db_file, counts)
+        if sink == SINK_CSV:
+            diff_file = os.path.join(self.output_dir, config.SNAPSHOT_DIFF_FILE)
+            CSVHandler.rewrite_csv(diff_file, config.SNAPSHOT_DIFF_COLUMNS, rows)
+            self.logger.info(f"Wrote {sum(counts.values())} changes to '{diff_file}'.")
+        elif sheet_handler is not None:
+            tab = config.SNAPSHOT_DIFF_TAB
+            last_column = sheet_handler.column_letter(len(config.SNAPSHOT_DIFF_COLUMNS) - 1)
+            range_name = sheet_handler._tab_range(tab, f"A1:{last_column}")
+            if sheet_handler.ensure_tabs([tab]):
+                sheet_handler.append_transactions([config.SNAPSHOT_DIFF_COLUMNS], range_name)
+            for batch in RowPipeline.batches(rows, self.batch_size or config.PIPELINE_BATCH_SIZE):
+                sheet_handler.append_transactions(batch, range_name)
+            self.logger.info(f"Appended {sum(counts.values())} changes to the '{tab}' tab.")
+        else:
+            raise ValueError(f"The '{sink}' sink needs a sheet handler.")
+        return dict(counts)
+
+    def define_partition_file_path(self, key: str) -> str:
+        """Defines the file path of the partition identified by `key`."""
+        return os.path.join(self.output_dir, config.PARTITION_FILE_NAME.format(period=key))
+
+    def preview_new_transactions(self, history_file: Optional[str] = None) -> Tuple[List[List[str]], Dict[str, float]]:
+        """
+        Computes the new-row diff without authenticating or writing anything.
+
+        Rows are compared against the local history file when it exists, otherwise every fetched row is new.
+
+        Args:
+            history_file (Optional[str]): Path to the CSV history used as the dedup source.
+
+        Returns:
+            Tuple[List[List[str]], Dict[str, float]]: The mapped new rows and the seconds spent in each stage.
+        """
+        timings: Dict[str, float] = {}
+
+        start = time.perf_counter()
+        transactions = self.fetch_transactions(self.db_file)
+        timings['fetch'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if history_file:
+            new_transactions = self.extract_new_transactions(history_file, transactions)
+        else:
+            new_transactions = transactions
+        timings['diff'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rows = self.process_rows(new_transactions)
+        timings['map'] = time.perf_counter() - start
+
+        self.logger.info(f"Dry run found {len(rows)} new transactions out of {len(transactions)} fetched.")
+        return rows, timings
+
+    @staticmethod
+    def _batched(rows: List[List[str]], batch_size: Optional[int]) -> Iterator[List[List[str]]]:
+        """Splits rows into chunks of at most `batch_size` rows (a single chunk when no size is set)."""
+        if not batch_size:
+            yield rows
             return
-        self.backup_history_file(file_paths['history_file'], file_paths['history_backup_file'])
-        self.write_transactions(file_paths, new_transactions)
+        for start in range(0, len(rows), batch_size):
+            yield rows[start:start + batch_size]
 
     def define_file_paths(self):
-        """Defines file paths for transactions, history, and backup."""
+        """Defines file paths for transactions, history, and backup; the history files carry the compression suffix."""
+        compression = self.settings.history_compression
+        suffix = COMPRESSION_SUFFIXES[compression] if compression else ''
         return {
             'transactions_file': os.path.join(self.output_dir, f"{config.NEW_TRANSACTION_FILE}"),
-            'history_file': os.path.join(self.output_dir, f"{config.TRANSACTION_HISTORY_FILE}"),
-            'history_backup_file': os.path.join(self.output_dir, f"{config.PREVIOUS_TRANSACTION_HISTORY_FILE}")
+            'history_file': os.path.join(self.output_dir, f"{config.TRANSACTION_HISTORY_FILE}{suffix}"),
+            'history_backup_file': os.path.join(self.output_dir, f"{config.PREVIOUS_TRANSACTION_HISTORY_FILE}{suffix}"),
+            'summary_file': os.path.join(self.output_dir, config.SUMMARY_FILE),
         }
 
+    def prepare_history_file(self, history_file: str) -> None:
+        """
+        Makes the history file ready for reading and appending.
+
+        An interrupted append is rolled back, and a plain history left over from before compression
+        was enabled is converted once; the plain file is kept next to it as a backup.
+        """
+        CSVHandler.recover_journal(history_file)
+        plain_file = os.path.join(self.output_dir, config.TRANSACTION_HISTORY_FILE)
+        if history_file != plain_file and os.path.exists(plain_file) and not os.path.exists(history_file):
+            CSVHandler.recover_journal(plain_file)
+            CSVHandler.convert_file(plain_file, history_file)
+            self.logger.info(f"Migrated '{plain_file}' to '{history_file}'.")
+
+    def readable_history_file(self, history_file: str) -> str:
+        """
+        Picks the history file to read from without writing anything, for dry runs and diffs.
+
+        A plain history not converted yet to the configured compression is read as it is, and an interrupted
+        append is reported instead of being rolled back; the next sync takes care of both.
+        """
+        plain_file = os.path.join(self.output_dir, config.TRANSACTION_HISTORY_FILE)
+        if history_file != plain_file and os.path.exists(plain_file) and not os.path.exists(history_file):
+            history_file = plain_file
+        if CSVHandler.has_pending_journal(history_file):
+            self.logger.warning(f"An interrupted append to '{history_file}' is pending; the next sync rolls it back, "
+                                f"so the diff may be off until then.")
+        return history_file
+
     @staticmethod
     def extract_new_transactions(history_file: str, transactions: list[Tuple]) -> list[Tuple]:
         """Filters and identifies new transactions."""
 
-        historic_data = CSVHandler.read_existing_csv(history_file) if os.path.exists(history_file) else []
-
-        # Extract IDs from the historic data (assuming IDs are the first column).
-        historic_ids = {row[0] for row in historic_data}  # Use set for faster lookups.
+        # Stream the IDs (the first column) so a large, possibly compressed history is never held in memory.
+        historic_ids = CSVHandler.read_ids(history_file) if os.path.exists(history_file) else set()
 
         # Filter new transactions based on their IDs. Assuming IDs are also in the first column of transactions.
-        new_data = [tuple(row) for row in transactions if row[0] not in historic_ids]
+        new_data = [row for row in transactions if str(row[0]) not in historic_ids]
 
         return new_data
 
     def backup_history_file(self, history_file, history_backup_file):
-        """Backups the existing history file."""
+        """Backups the existing history file, replacing the previous backup only once the copy is complete."""
         if os.path.exists(history_file):
-            if os.path.exists(history_backup_file):
-                os.remove(history_backup_file)
             # Copy the current history file to the backup file
-            shutil.copy(history_file, history_backup_file)
+            CSVHandler.copy_file(history_file, history_backup_file)
             self.logger.info(f"Copied '{history_file}' as '{history_backup_file}'.")
 
-    def write_transactions(self, file_paths: dict[str, str], new_transactions: list[Tuple]):
-        """Writes transactions and updates files appropriately."""
-        processed_new_transactions = self.process_rows(new_transactions)
-        CSVHandler.rewrite_csv(file_paths['transactions_file'], config.COLUMN_ORDER, processed_new_transactions)
+    def write_transactions(self, file_paths: dict[str, str], new_transactions: list[Tuple]) -> List[List[str]]:
+        """Writes transactions and updates files appropriately, returning the written rows."""
+        rows = self.process_rows(new_transactions)
+        self.write_rows(file_paths, rows)
+        return rows
+
+    def write_rows(self, file_paths: dict[str, str], rows: RowBuffer) -> RowBuffer:
+        """Writes mapped rows to the transactions file and appends them to the history, returning them."""
+        columns = self.csv_columns
+        CSVHandler.rewrite_csv(file_paths['transactions_file'], columns, self._csv_rows(rows, columns))
         self.logger.info(f"Exported all transactions to '{file_paths['transactions_file']}'.")
 
-        CSVHandler.append_to_csv(file_paths['history_file'], config.COLUMN_ORDER, processed_new_transactions)
-        self.logger.info(f"Appended {len(new_transactions)} new transactions to '{file_paths['history_file']}'.")
+        CSVHandler.append_to_csv(file_paths['history_file'], columns, self._csv_rows(rows, columns), journal=True)
+        self.logger.info(f"Appended {len(rows)} new transactions to '{file_paths['history_file']}'.")
+        return rows
+
+    @property
+    def csv_columns(self) -> List[str]:
+        """Header of the CSV files: `HOUSEHOLD_COLUMN_ORDER` when rows may carry a person, else `COLUMN_ORDER`."""
+        return config.HOUSEHOLD_COLUMN_ORDER if self.sources or self.imported else config.COLUMN_ORDER
+
+    @staticmethod
+    def _csv_rows(rows: Iterable[List[str]], columns: Sequence[str]) -> Iterator[List[str]]:
+        """Pads rows to the CSV columns, so rows without a person get an empty `kto` cell under its header."""
+        width = len(columns)
+        return (row if len(row) >= width else row + [''] * (width - len(row)) for row in rows)
 
     @log_exceptions(Logging.get_logger())
     def process_rows(self, rows: List[Tuple]) -> List[List[str]]:
         """Processes and maps database rows into a CSV-compatible format."""
-        processed = []
-        for row in rows:
-            try:
-                mapped_row = self.map_row(row)
-                reordered_row = [mapped_row[col] for col in config.COLUMN_ORDER]
-                processed.append(reordered_row)
-            except Exception as e:
-                self.logger.debug(f"Skipping row {row} due to error: {e}")
-                continue
+        processed = list(self.iter_rows(rows))
         self.logger.info(f"Processed {len(processed)} rows successfully.")
         return processed
 
+    def iter_rows(self, rows: Iterable[Tuple]) -> Iterator[List[str]]:
+        """
+        Maps database rows lazily, so they can be streamed into a writer without building a list.
+
+        The person stamped on household rows is kept after the exported columns, like rows added with `add --who`.
+        """
+        return RowPipeline.rows(self.map_batches(RowPipeline.batches(rows)))
+
+    def map_batches(self, batches: Iterable[List[Tuple]]) -> Iterator[List[List[str]]]:
+        """
+        Maps batches of database rows with `RowPipeline.map_batches`.
+
+        Skipped rows are logged through a sampler, so a large batch of bad rows does not flood the log.
+        """
+        logger = self.logger
+        sampler = LogSampler()
+
+        def skip(row: Tuple, e: Exception) -> None:
+            if sampler():
+                logger.debug("Skipping row %s due to error: %s (%d skipped so far)", row, e, sampler.count)
+
+        yield from RowPipeline.map_batches(batches, skip, self.settings.zone)
+        if sampler.count:
+            logger.info("Skipped %d rows that could not be mapped.", sampler.count)
+
     @staticmethod
-    def map_row(row: Tuple) -> dict:
-        """Maps a database row (tuple) to a dictionary for CSV export."""
+    def map_row(row: Tuple, zone: Optional[ZoneInfo] = None) -> dict:
+        """Maps a database row (tuple) to a dictionary for CSV export, dated in `zone` (default: the configured one)."""
         try:
             formed = {
                 'id': str(row[0]),
                 'opis': str(row[1]),
                 'kwota': Formatter.format_amount(row[2]),
                 'kategoria': Formatter.map_category(row[3]),
-                'data': Formatter.format_timestamp(row[4]),
+                'data': Formatter.format_timestamp(row[4], zone),
             }
         except Exception as e:
             raise e
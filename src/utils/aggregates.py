@@ -0,0 +1,95 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import config
+from src.utils.fomatter import Formatter
+
+"""
+aggregates.py
+
+This module maintains monthly totals of exported transactions, so readers of the export do not have to
+recompute them with spreadsheet formulas.
+
+Classes:
+    MonthlySummary: Totals and row counts by month x category x person, updatable with deltas.
+"""
+
+# (month 'YYYY-MM', category, who)
+SummaryKey = Tuple[str, str, str]
+
+AMOUNT_INDEX = config.COLUMN_ORDER.index('kwota')
+CATEGORY_INDEX = config.COLUMN_ORDER.index('kategoria')
+DATE_INDEX = config.COLUMN_ORDER.index('data')
+WHO_INDEX = len(config.COLUMN_ORDER)  # Custom rows carry the person right after the exported columns
+
+
+class MonthlySummary:
+    """
+    Totals in integer cents and row counts, keyed by (month, category, who).
+
+    Rows are the exported transaction rows (`config.COLUMN_ORDER`, optionally followed by the person), so
+    the same summary can be fed from the database, the CSV history or the sheet. Adding new rows and
+    removing the previous version of edited ones keeps the totals exact without recomputing them.
+
+    The `mark` tells how far the source has been summarized (e.g. the size of the history), so a writer can
+    tell whether the rows it just wrote are the only ones missing from the totals.
+    """
+
+    def __init__(self) -> None:
+        self.totals: Dict[SummaryKey, List[int]] = {}  # key -> [cents, count]
+        self.mark: Optional[int] = None
+
+    def add(self, rows: Iterable[Sequence[str]], sign: int = 1) -> None:
+        """
+        Adds transaction rows to the totals in one pass; rows without a date or a valid amount are skipped.
+
+        :param rows: Exported transaction rows.
+        :param sign: 1 to add the rows, -1 to remove them.
+        """
+        totals = self.totals
+        for row in rows:
+            if len(row) <= DATE_INDEX or not row[DATE_INDEX]:
+                continue
+            try:
+                cents = Formatter.parse_cents(row[AMOUNT_INDEX])
+            except ValueError:
+                continue  # E.g. a note typed into the sheet by hand
+            who = str(row[WHO_INDEX]) if len(row) > WHO_INDEX else ''
+            key = (str(row[DATE_INDEX])[:7], str(row[CATEGORY_INDEX]), who)
+            entry = totals.get(key)
+            if entry is None:
+                entry = totals[key] = [0, 0]
+            entry[0] += sign * cents
+            entry[1] += sign
+
+    def remove(self, rows: Iterable[Sequence[str]]) -> None:
+        """Removes transaction rows, e.g. the previous version of edited transactions."""
+        self.add(rows, sign=-1)
+
+    def to_rows(self) -> List[List[str]]:
+        """Returns the summary rows (`config.SUMMARY_COLUMNS`) sorted by key, without empty groups, then the mark."""
+        rows = [[month, category, who, Formatter.format_cents(cents), str(count)]
+                for (month, category, who), (cents, count) in sorted(self.totals.items()) if count]
+        if self.mark is not None:
+            rows.append([config.SUMMARY_MARK_LABEL, str(self.mark)] + [''] * (len(config.SUMMARY_COLUMNS) - 2))
+        return rows
+
+    @classmethod
+    def from_transactions(cls, rows: Iterable[Sequence[str]]) -> "MonthlySummary":
+        """Builds a summary from transaction rows."""
+        summary = cls()
+        summary.add(rows)
+        return summary
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence[str]]) -> "MonthlySummary":
+        """Loads a summary written by `to_rows`, e.g. from the summary CSV or tab."""
+        summary = cls()
+        for row in rows:
+            if row and row[0] == config.SUMMARY_MARK_LABEL:
+                summary.mark = int(row[1]) if len(row) > 1 and str(row[1]).isdigit() else None
+                continue
+            if len(row) < len(config.SUMMARY_COLUMNS) or list(row) == config.SUMMARY_COLUMNS:
+                continue
+            month, category, who, total, count = (str(value) for value in row[:5])
+            summary.totals[(month, category, who)] = [Formatter.parse_cents(total), int(float(count))]
+        return summary
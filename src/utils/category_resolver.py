@@ -0,0 +1,67 @@
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+
+from src.utils.enums import Categories, CATEGORY_VALUES
+
+"""
+category_resolver.py
+
+This module maps raw Cashew category names to the export categories.
+
+Classes:
+    CategoryResolver: A lookup compiled once from the category values and an alias table, memoized per raw name.
+"""
+
+
+class CategoryResolver:
+    """
+    Resolves raw category names to `Categories` values.
+
+    A name resolves to itself when it already is a category value, otherwise to its alias, otherwise to the
+    default category. Names are compared case-insensitively. Every distinct raw name is resolved once and
+    cached, so an export only performs as many real lookups as there are distinct category names.
+    """
+
+    _default_resolver: Optional["CategoryResolver"] = None
+
+    def __init__(self, aliases: Optional[Mapping[str, str]] = None, default: Categories = Categories.INNE):
+        """
+        :param aliases: Raw category name -> category value, e.g. {"Groceries": "spożywcze"}.
+        :param default: Category of names that are neither a category nor an alias.
+        :raises ValueError: If an alias points to an unknown category.
+        """
+        lookup = {value: value for value in CATEGORY_VALUES}
+        for name, category in (aliases or {}).items():
+            if category not in CATEGORY_VALUES:
+                raise ValueError(f"Alias '{name}' points to unknown category '{category}'.")
+            lookup[name.strip().lower()] = category
+        self.lookup: Mapping[str, str] = MappingProxyType(lookup)
+        self.default: str = default.value
+        self._cache: Dict[str, str] = {}
+
+    def resolve(self, category_name: str) -> str:
+        """
+        Returns the category value of a raw category name.
+
+        :param category_name: The category name stored in the database.
+        :return: The export category.
+        """
+        try:
+            return self._cache[category_name]
+        except KeyError:
+            resolved = self.lookup.get(category_name.strip().lower(), self.default)
+            self._cache[category_name] = resolved
+            return resolved
+
+    @classmethod
+    def default_resolver(cls) -> "CategoryResolver":
+        """Returns the resolver built from `config.CATEGORY_ALIASES`, compiling it on first use."""
+        if cls._default_resolver is None:
+            import config
+            cls._default_resolver = cls(config.CATEGORY_ALIASES)
+        return cls._default_resolver
+
+    @classmethod
+    def reset_default(cls) -> None:
+        """Drops the default resolver, so the next use picks up changed aliases."""
+        cls._default_resolver = None
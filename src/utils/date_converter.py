@@ -0,0 +1,183 @@
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, datetime, timedelta, timezone
+from typing import ClassVar, Dict, Iterable, List, Optional, Tuple, Union
+from zoneinfo import ZoneInfo
+
+from src.utils.settings import Settings
+
+"""
+date_converter.py
+
+This module turns UNIX timestamps into local calendar dates, and local dates into timestamp bounds, for every path of
+the pipeline: the SQL date filters, the row mapping of the CSV and Sheets writers and `TransactionEntity`.
+
+The time zone is resolved once per converter. Its UTC offsets are precomputed into a table of transitions covering
+the range of the data (extended by whole years when a timestamp falls outside it), so converting a row is a bisection
+over a handful of transitions and integer arithmetic, with the date strings memoized per day.
+
+Classes:
+    DateConverter: Converts between timestamps and local dates in one time zone.
+"""
+
+SECONDS_PER_DAY = 86400
+
+# Ordinal of 1970-01-01, so a local day number (days since the epoch) converts to a date without a datetime
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class DateConverter:
+    """
+    Converts UNIX timestamps to dates in a time zone, and dates to the timestamps of their local midnight.
+
+    The offset table lists the UTC timestamps at which the offset of the zone changes (DST and zone rule changes)
+    within the covered range. Offsets are sampled once per day and each change is located to the second, which holds
+    for every zone whose offset changes at most once a day.
+    """
+
+    _converters: ClassVar[Dict[str, "DateConverter"]] = {}
+    _converters_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, zone: Union[ZoneInfo, str], start: Optional[int] = None, end: Optional[int] = None):
+        """
+        :param zone: The time zone, or its IANA name.
+        :param start: First UTC timestamp of the data range, so its offsets are precomputed.
+        :param end: Last UTC timestamp of the data range.
+        """
+        self.zone: ZoneInfo = zone if isinstance(zone, ZoneInfo) else ZoneInfo(zone)
+        self._lock = threading.Lock()
+        self._days: Dict[int, str] = {}
+        # (first covered timestamp, end of the coverage, transition timestamps, offset from each transition on)
+        self._table: Tuple[int, int, List[int], List[int]] = (0, 0, [], [])
+        if start is not None:
+            self.cover(start, end if end is not None else start)
+
+    @classmethod
+    def for_zone(cls, zone: ZoneInfo) -> "DateConverter":
+        """Returns the shared converter of a time zone, creating it on first use."""
+        converter = cls._converters.get(zone.key)
+        if converter is None:
+            with cls._converters_lock:
+                converter = cls._converters.setdefault(zone.key, cls(zone))
+        return converter
+
+    @classmethod
+    def current(cls) -> "DateConverter":
+        """Returns the converter of the time zone of the process settings."""
+        return cls.for_zone(Settings.current().zone)
+
+    @classmethod
+    def of(cls, zone: Optional[ZoneInfo] = None) -> "DateConverter":
+        """Returns the converter of a profile's time zone, or of the process settings when none is given."""
+        return cls.for_zone(zone) if zone is not None else cls.current()
+
+    def cover(self, start: int, end: int) -> None:
+        """
+        Precomputes the offset table from the start of the year of `start` to the end of the year of `end`.
+
+        :param start: First UTC timestamp to cover.
+        :param end: Last UTC timestamp to cover.
+        """
+        covered_start, covered_end, _, _ = self._table
+        if covered_start <= start and end < covered_end:
+            return
+        with self._lock:
+            covered_start, covered_end, _, _ = self._table
+            if covered_end > covered_start:  # Keep what is covered, so the table only grows
+                start, end = min(start, covered_start), max(end, covered_end - 1)
+            first = self._year_start(start)
+            last = self._year_start(end, years_after=1)
+            self._table = (first, last, *self._transitions(first, last))
+
+    def day_number(self, timestamp: Union[int, float]) -> int:
+        """Returns the local day of a timestamp, as the number of days since 1970-01-01."""
+        timestamp = int(timestamp)
+        start, end, transitions, offsets = self._table
+        if not start <= timestamp < end:
+            self.cover(timestamp, timestamp)
+            start, end, transitions, offsets = self._table
+        return (timestamp + offsets[bisect_right(transitions, timestamp) - 1]) // SECONDS_PER_DAY
+
+    def format_date(self, timestamp: Union[int, float]) -> str:
+        """Returns the local 'YYYY-MM-DD' date of a timestamp."""
+        day = self.day_number(timestamp)
+        try:
+            return self._days[day]
+        except KeyError:
+            return self._days.setdefault(day, date.fromordinal(EPOCH_ORDINAL + day).isoformat())
+
+    def format_dates(self, timestamps: Iterable[Union[int, float]]) -> List[str]:
+        """
+        Returns the local 'YYYY-MM-DD' dates of a batch of timestamps.
+
+        The table is extended once for the whole batch, then every row costs one bisection, one integer division
+        and one dictionary lookup.
+        """
+        seconds = [int(timestamp) for timestamp in timestamps]
+        if not seconds:
+            return []
+        self.cover(min(seconds), max(seconds))
+        _, _, transitions, offsets = self._table
+        days, dates = self._days, []
+        for timestamp in seconds:
+            day = (timestamp + offsets[bisect_right(transitions, timestamp) - 1]) // SECONDS_PER_DAY
+            text = days.get(day)
+            if text is None:
+                text = days.setdefault(day, date.fromordinal(EPOCH_ORDINAL + day).isoformat())
+            dates.append(text)
+        return dates
+
+    def to_date(self, timestamp: Union[int, float]) -> date:
+        """Returns the local date of a timestamp."""
+        return date.fromordinal(EPOCH_ORDINAL + self.day_number(timestamp))
+
+    def today(self) -> date:
+        """Returns the current local date in the zone, e.g. the default end of a date range."""
+        return self.to_date(time.time())
+
+    def day_start(self, day: Union[str, date]) -> int:
+        """
+        Returns the UTC timestamp of the local midnight starting a day, the bound the SQL filters compare with.
+
+        When the day starts in a DST gap, this is the first instant of the day (the end of the gap).
+
+        :param day: The date, or its 'YYYY-MM-DD' string.
+        """
+        day = date.fromisoformat(day) if isinstance(day, str) else day
+        return int(datetime(day.year, day.month, day.day, tzinfo=self.zone).timestamp())
+
+    def day_end(self, day: Union[str, date]) -> int:
+        """Returns the UTC timestamp of the local midnight ending a day, i.e. starting the next one."""
+        day = date.fromisoformat(day) if isinstance(day, str) else day
+        return self.day_start(day + timedelta(days=1))
+
+    def _offset(self, timestamp: int) -> int:
+        """Returns the UTC offset of the zone at a timestamp, in seconds, from the zone rules."""
+        offset = datetime.fromtimestamp(timestamp, tz=timezone.utc).astimezone(self.zone).utcoffset()
+        return int(offset.total_seconds()) if offset is not None else 0
+
+    def _transitions(self, start: int, end: int) -> Tuple[List[int], List[int]]:
+        """Samples the offset once a day from `start` up to `end` (excluded) and locates each change by bisection."""
+        transitions, offsets = [start], [self._offset(start)]
+        previous = start
+        for sample in [*range(start + SECONDS_PER_DAY, end, SECONDS_PER_DAY), end - 1]:
+            offset = self._offset(sample)
+            if offset != offsets[-1]:
+                low, high = previous, sample  # The offset changes in (low, high]
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if self._offset(middle) == offsets[-1]:
+                        low = middle
+                    else:
+                        high = middle
+                transitions.append(high)
+                offsets.append(offset)
+            previous = sample
+        return transitions, offsets
+
+    @staticmethod
+    def _year_start(timestamp: int, years_after: int = 0) -> int:
+        """Returns the UTC timestamp of January 1st of the year of a timestamp, `years_after` years later."""
+        year = datetime.fromtimestamp(timestamp, tz=timezone.utc).year + years_after
+        return int(datetime(year, 1, 1, tzinfo=timezone.utc).timestamp())
@@ -35,4 +35,19 @@ class Categories(Enum):
         :return: True if the category is valid, False otherwise.
         :rtype: bool
         """
-        return category in cls.get()
+        return category in CATEGORY_VALUES
+
+
+# All category values, built once for constant-time membership checks
+CATEGORY_VALUES = frozenset(category.value for category in Categories)
+
+
+class Period(Enum):
+    """
+    Defines the period lengths a date range can be partitioned into.
+
+    Each value is also the name accepted on the command line.
+    """
+    DAY = 'day'
+    MONTH = 'month'
+    YEAR = 'year'
@@ -1,9 +1,14 @@
-from datetime import datetime
-from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from typing import Iterable, List, Optional, Union
+from zoneinfo import ZoneInfo
 
-import config
-from src.utils.enums import Categories
+from src.utils.category_resolver import CategoryResolver
+from src.utils.date_converter import DateConverter
 from src.utils.logger import Logging
+from src.utils.settings import Settings
+
+# Two-digit fractional parts, so formatting cents needs no float formatting
+CENT_DIGITS = tuple(f"{cents:02d}" for cents in range(100))
 
 
 class Formatter:
@@ -13,30 +18,67 @@ class Formatter:
         pass
 
     @staticmethod
-    def format_timestamp(unix_timestamp: int) -> str:
-        """Formats the UNIX timestamp into a human-readable date using the configured timezone."""
+    def format_timestamp(unix_timestamp: int, zone: Optional[ZoneInfo] = None) -> str:
+        """Formats the UNIX timestamp into a human-readable date in `zone`, defaulting to the configured timezone."""
         try:
-            local_tz = ZoneInfo(config.TIMEZONE)
-
-            # Convert the timestamp to localized time
-            localized_time = datetime.fromtimestamp(unix_timestamp, tz=local_tz)
-            return localized_time.date().isoformat()
-        except (ZoneInfoNotFoundError, ValueError, TypeError) as e:
+            # The zone and its UTC offsets are resolved once, by the shared converter of the zone
+            return DateConverter.of(zone).format_date(unix_timestamp)
+        except (ValueError, TypeError, OverflowError, OSError) as e:
             # Handle errors and provide fallback
             Logging.get_logger().error(
-                f"Error formatting timestamp {unix_timestamp} with timezone '{config.TIMEZONE}': {e}"
+                "Error formatting timestamp %s with timezone '%s': %s", unix_timestamp,
+                zone.key if zone is not None else Settings.current().timezone, e
             )
             return str(unix_timestamp)
 
+    @staticmethod
+    def format_timestamps(unix_timestamps: Iterable[Union[int, float]], zone: Optional[ZoneInfo] = None) -> List[str]:
+        """Formats a batch of UNIX timestamps into dates in `zone` (default: the configured timezone), in one pass."""
+        return DateConverter.of(zone).format_dates(unix_timestamps)
+
     @staticmethod
     def format_amount(amount: float) -> str:
         """Formats the amount with a comma as the decimal separator."""
+        return Formatter.format_cents(Formatter.to_cents(amount))
+
+    @staticmethod
+    def to_cents(amount: Optional[float]) -> int:
+        """Converts an amount (SQLite REAL) to integer cents, rounding to the nearest cent."""
         if amount is None:
             raise ValueError("Amount cannot be None")
-        return f"{amount:.2f}".replace(".", ",")
+        return round(amount * 100)
+
+    @staticmethod
+    def to_cents_batch(amounts: Iterable[float]) -> List[int]:
+        """Converts a batch of amounts to integer cents in one pass."""
+        return [round(amount * 100) for amount in amounts]
+
+    @staticmethod
+    def format_cents(cents: int) -> str:
+        """Formats integer cents as a Polish decimal amount, e.g. -1234 -> "-12,34"."""
+        if cents < 0:
+            return f"-{-cents // 100},{CENT_DIGITS[-cents % 100]}"
+        return f"{cents // 100},{CENT_DIGITS[cents % 100]}"
+
+    @staticmethod
+    def parse_cents(amount: Union[str, int, float]) -> int:
+        """Parses an exported amount (e.g. "-12,34") back to exact integer cents; numbers are converted as amounts."""
+        if isinstance(amount, (int, float)):
+            return Formatter.to_cents(amount)
+        text = str(amount).strip().replace('\xa0', '').replace(' ', '').replace(',', '.')
+        try:
+            return int((Decimal(text) * 100).to_integral_value(ROUND_HALF_EVEN))
+        except InvalidOperation:
+            raise ValueError(f"Invalid amount: {amount!r}")
+
+    @staticmethod
+    def format_cents_batch(cents: Iterable[int]) -> List[str]:
+        """Formats a batch of integer cents; integer arithmetic keeps sums of them exact."""
+        digits = CENT_DIGITS
+        return [f"{value // 100},{digits[value % 100]}" if value >= 0 else f"-{-value // 100},{digits[-value % 100]}"
+                for value in cents]
 
     @staticmethod
     def map_category(category_name: str) -> str:
-        """Maps category foreign keys to their corresponding names."""
-        cat: str = category_name.lower()
-        return cat if Categories.is_category(cat) else 'inne'
+        """Maps a raw category name to its export category, using the configured aliases."""
+        return CategoryResolver.default_resolver().resolve(category_name)
@@ -1,6 +1,12 @@
+import atexit
+import json
 import logging
+import queue
+import reprlib
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
 
-from config import LOG_LEVEL
+from config import LOG_FORMAT, LOG_LEVEL, LOG_MAX_PAYLOAD, LOG_SAMPLE_EVERY
 
 """
 logger.py
@@ -9,35 +15,132 @@ This module handles logging functionality for the application.
 
 Functionality:
     - Configures loggers for different levels (info, debug, error, etc.).
-    - Writes log messages to console or log files.
+    - Hands records to a queue; a background listener formats and writes them, so logging does not block the caller.
+    - Writes plain-text or JSON records (`LOG_FORMAT`), with large payloads (e.g. lists of rows) capped.
+    - Samples high-volume, per-row events with `LogSampler`.
 """
 
 LOGGING_LEVEL = LOG_LEVEL
 LOGGING_FORMAT = '%(asctime)s\t%(levelname)s\t%(name)s\t%(message)s'
 LOGGING_DATE_FORMAT = '%H:%M:%S'
 
+# Attributes every LogRecord has; any other attribute was passed with `extra=` and is written to JSON records
+STANDARD_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+# Shortens container arguments, e.g. the rows of an append, before they are formatted into a message
+PAYLOAD_REPR = reprlib.Repr()
+PAYLOAD_REPR.maxlist = PAYLOAD_REPR.maxtuple = PAYLOAD_REPR.maxset = PAYLOAD_REPR.maxdict = 10
+PAYLOAD_REPR.maxstring = PAYLOAD_REPR.maxother = 200
+PAYLOAD_REPR.maxlevel = 3
+
+_queue_handler: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+_configured_loggers: Dict[str, logging.Logger] = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line, including the fields passed with `extra=`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in STANDARD_RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class PayloadCapFilter(logging.Filter):
+    """Caps the size of a record: container arguments are shortened and long messages truncated."""
+
+    def __init__(self, max_length: int = LOG_MAX_PAYLOAD):
+        super().__init__()
+        self.max_length = max_length
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.args, tuple) and record.args:
+            record.args = tuple(PAYLOAD_REPR.repr(arg) if isinstance(arg, (list, tuple, dict, set)) else arg
+                                for arg in record.args)
+        if isinstance(record.msg, str) and len(record.msg) > self.max_length:
+            record.msg = f"{record.msg[:self.max_length]}... [{len(record.msg) - self.max_length} characters cut]"
+        return True
+
+
+class LogSampler:
+    """
+    Lets every n-th call through, for events logged once per row.
+
+    Checking the sampler is a counter increment, so a row loop only pays for building the records it keeps.
+    """
+
+    def __init__(self, every: int = LOG_SAMPLE_EVERY):
+        self.every = max(every, 1)
+        self.count = 0
+
+    def __call__(self) -> bool:
+        """Counts an event and returns whether it should be logged (the first, then every n-th)."""
+        self.count += 1
+        return self.count % self.every == 1 or self.every == 1
+
+
+def create_queue_handler(*handlers: logging.Handler) -> Tuple[QueueHandler, QueueListener]:
+    """
+    Creates a queue handler whose records are written by `handlers` on a started background listener.
+
+    :param handlers: The handlers that format and write the records.
+    :return: The handler to attach to loggers and the listener to stop when done.
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return QueueHandler(log_queue), listener
+
+
+def get_queue_handler() -> QueueHandler:
+    """Returns the shared queue handler writing to stderr, starting its listener on first use."""
+    global _queue_handler, _listener
+    if _queue_handler is None:
+        stream_handler = logging.StreamHandler()
+        if LOG_FORMAT == 'json':
+            stream_handler.setFormatter(JsonFormatter(datefmt=LOGGING_DATE_FORMAT))
+        else:
+            stream_handler.setFormatter(logging.Formatter(fmt=LOGGING_FORMAT, datefmt=LOGGING_DATE_FORMAT))
+        stream_handler.setLevel(LOGGING_LEVEL)
+        _queue_handler, _listener = create_queue_handler(stream_handler)
+        atexit.register(stop_logging)
+    return _queue_handler
+
+
+def stop_logging() -> None:
+    """Writes the queued records and stops the background listener."""
+    global _queue_handler, _listener
+    if _listener is not None:
+        _listener.stop()
+    _queue_handler = _listener = None
+
 
 def setup_logger(class_name: str) -> logging.Logger:
-    """Set up and return a logger for a specific class with a StreamHandler."""
+    """Set up and return a logger for a specific class; it is configured once and then served from a cache."""
+    logger = _configured_loggers.get(class_name)
+    if logger is not None:
+        return logger
+
     logger = logging.getLogger(class_name)
 
     # If no handlers are attached, configure the logger (prevent duplicates)
     if not logger.hasHandlers():
-        # Create a stream handler
-        stream_handler = logging.StreamHandler()
-
-        # Set the log format and level
-        formatter = logging.Formatter(fmt=LOGGING_FORMAT, datefmt=LOGGING_DATE_FORMAT)
-        stream_handler.setFormatter(formatter)
-        stream_handler.setLevel(LOGGING_LEVEL)
-
-        # Add the handler to the logger
-        logger.addHandler(stream_handler)
+        logger.addHandler(get_queue_handler())
+    logger.addFilter(PayloadCapFilter())
 
     # Set the logger's overall logging level and enable propagation
     logger.setLevel(LOGGING_LEVEL)
     logger.propagate = True
 
+    _configured_loggers[class_name] = logger
     return logger
 
 
@@ -0,0 +1,300 @@
+import json
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Sequence, Set
+
+from src.utils.logger import Logging
+
+"""
+memory_budget.py
+
+This module bounds the buffers of a sync to a memory budget (`--max-memory`), spilling the rest to disk.
+
+The two buffers that grow with the history are the set of IDs already exported (the dedup set) and the new rows held
+for the writers. Both are kept in memory up to their share of the budget; beyond it they move to a table of a
+private SQLite temporary database (created in the system temporary directory and deleted when closed), which has
+its own small page cache. Lookups then check the memory part first and the indexed table second.
+
+`MemoryReport` measures the peak resident set size (RSS) of every stage of a run.
+
+Classes:
+    MemoryBudget: Splits a byte budget between the buffers of a run and creates them.
+    SpillingIdSet: Set of IDs spilling to an SQLite temporary table beyond its budget.
+    SpillingRowBuffer: Ordered buffer of rows spilling to an SQLite temporary table beyond its budget.
+    StagePeak: Resident memory measured around one stage.
+    MemoryReport: Collects the peak RSS of each stage of a run.
+"""
+
+# Share of the budget given to the dedup set and to the buffered new rows; the rest is left to the row batches in
+# flight, the interpreter and the libraries
+ID_SET_SHARE = 0.5
+ROW_BUFFER_SHARE = 0.25
+
+# Approximate memory of a set entry besides the string itself: the hash table slot and its spare capacity
+SET_ENTRY_BYTES = 40
+
+# Page cache of a spill database, in KiB (SQLite takes negative cache sizes as KiB)
+SPILL_CACHE_KIB = 2048
+
+# Number of spilled rows or IDs written to the temporary table per statement
+SPILL_BATCH_SIZE = 1000
+
+
+def _open_spill_database() -> sqlite3.Connection:
+    """Opens a private temporary database on disk; SQLite deletes it when the connection is closed."""
+    connection = sqlite3.connect('')
+    connection.execute(f"PRAGMA cache_size = -{SPILL_CACHE_KIB}")
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    return connection
+
+
+class SpillingIdSet(Logging):
+    """
+    Set of transaction IDs bounded to `max_bytes` of memory.
+
+    IDs are added to an in-memory set. When its estimated size exceeds the budget, it is flushed into the
+    `ids` table of a temporary database and emptied, so memory stays bounded however many IDs are added.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        :param max_bytes: Memory the in-memory part may use before it is spilled.
+        """
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._memory: Set[str] = set()
+        self._memory_bytes = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._spilled = 0
+
+    def __enter__(self) -> "SpillingIdSet":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def __contains__(self, transaction_id: object) -> bool:
+        if transaction_id in self._memory:
+            return True
+        if self._connection is None:
+            return False
+        return self._connection.execute("SELECT 1 FROM ids WHERE id = ?", (transaction_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return len(self._memory) + self._spilled
+
+    @property
+    def spilled(self) -> bool:
+        """Whether part of the set lives on disk."""
+        return self._connection is not None
+
+    def add(self, transaction_id: str) -> None:
+        """Adds an ID, spilling the in-memory part when it outgrows the budget."""
+        if transaction_id in self:  # Also looks in the table, so a spilled ID is not counted twice
+            return
+        self._memory.add(transaction_id)
+        self._memory_bytes += sys.getsizeof(transaction_id) + SET_ENTRY_BYTES
+        if self._memory_bytes > self.max_bytes:
+            self._spill()
+
+    def update(self, transaction_ids: Iterable[str]) -> "SpillingIdSet":
+        """Adds every ID of an iterable, consuming it lazily."""
+        for transaction_id in transaction_ids:
+            self.add(transaction_id)
+        return self
+
+    def close(self) -> None:
+        """Drops the IDs and deletes the temporary database."""
+        self._memory.clear()
+        self._memory_bytes = 0
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _spill(self) -> None:
+        """Moves the in-memory IDs into the temporary table."""
+        if self._connection is None:
+            self._connection = _open_spill_database()
+            self._connection.execute("CREATE TABLE ids (id TEXT PRIMARY KEY) WITHOUT ROWID")
+            self.logger.info(f"ID set exceeded {self.max_bytes} bytes, spilling to a temporary table.")
+        with self._connection:
+            before = self._connection.total_changes
+            self._connection.executemany("INSERT OR IGNORE INTO ids (id) VALUES (?)",
+                                         ((transaction_id,) for transaction_id in self._memory))
+            self._spilled += self._connection.total_changes - before
+        self._memory.clear()
+        self._memory_bytes = 0
+
+
+class SpillingRowBuffer(Logging):
+    """
+    Ordered buffer of exported rows bounded to `max_bytes` of memory.
+
+    Rows are kept in a list until their estimated size exceeds the budget; from then on they are written, in order,
+    to the `rows` table of a temporary database. Iterating streams them back in insertion order, and can be repeated,
+    so the same buffer feeds several writers.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        :param max_bytes: Memory the buffered rows may use before they are spilled.
+        """
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._memory: List[List[str]] = []
+        self._memory_bytes = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._spilled = 0
+
+    def __enter__(self) -> "SpillingRowBuffer":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._memory) + self._spilled
+
+    def __iter__(self) -> Iterator[List[str]]:
+        if self._connection is not None:
+            self._flush()
+            cursor = self._connection.execute("SELECT row FROM rows ORDER BY seq")
+            while batch := cursor.fetchmany(SPILL_BATCH_SIZE):
+                for (row,) in batch:
+                    yield json.loads(row)
+        yield from self._memory
+
+    @property
+    def spilled(self) -> bool:
+        """Whether part of the buffer lives on disk."""
+        return self._connection is not None
+
+    def extend(self, rows: Iterable[Sequence[str]]) -> None:
+        """Appends rows, spilling the in-memory part whenever it outgrows the budget."""
+        for row in rows:
+            row = list(row)
+            self._memory.append(row)
+            self._memory_bytes += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+            if self._memory_bytes > self.max_bytes:
+                self._flush()
+
+    def close(self) -> None:
+        """Drops the rows and deletes the temporary database."""
+        self._memory.clear()
+        self._memory_bytes = 0
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _flush(self) -> None:
+        """Moves the in-memory rows to the end of the temporary table."""
+        if self._connection is None:
+            self._connection = _open_spill_database()
+            self._connection.execute("CREATE TABLE rows (seq INTEGER PRIMARY KEY, row TEXT NOT NULL)")
+            self.logger.info(f"Row buffer exceeded {self.max_bytes} bytes, spilling to a temporary table.")
+        with self._connection:
+            self._connection.executemany("INSERT INTO rows (row) VALUES (?)",
+                                         ((json.dumps(row, ensure_ascii=False),) for row in self._memory))
+        self._spilled += len(self._memory)
+        self._memory.clear()
+        self._memory_bytes = 0
+
+
+class MemoryBudget:
+    """Splits a memory budget between the dedup set and the row buffer of a run."""
+
+    def __init__(self, max_bytes: int):
+        """
+        :param max_bytes: Memory budget of the buffers of a run, in bytes.
+        """
+        self.max_bytes = max_bytes
+
+    def id_set(self) -> SpillingIdSet:
+        """Creates the dedup set of a run."""
+        return SpillingIdSet(int(self.max_bytes * ID_SET_SHARE))
+
+    def row_buffer(self) -> SpillingRowBuffer:
+        """Creates the buffer of the new rows of a run."""
+        return SpillingRowBuffer(int(self.max_bytes * ROW_BUFFER_SHARE))
+
+
+@dataclass
+class StagePeak:
+    """
+    Resident memory measured around one stage.
+
+    Attributes:
+        stage (str): Name of the stage.
+        rss_before (int): Resident memory when the stage started, in bytes.
+        peak_rss (int): Highest resident memory during the stage, in bytes.
+        seconds (float): Duration of the stage.
+    """
+    stage: str
+    rss_before: int
+    peak_rss: int
+    seconds: float
+
+
+class MemoryReport(Logging):
+    """
+    Collects the peak resident set size (RSS) of every stage of a run.
+
+    On Linux the kernel's high-water mark is reset when a stage starts (`/proc/self/clear_refs`), so every stage
+    reports its own peak. Elsewhere, or when the reset is not permitted, the process-wide peak from `getrusage` is
+    reported, which only grows. Stages of sinks run concurrently in one process share the same peak.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.stages: List[StagePeak] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Measures the peak RSS of the block it wraps, recorded as the stage `name`."""
+        self._reset_peak()
+        rss_before = self._status_bytes('VmRSS') or 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            peak = self._status_bytes('VmHWM') or self._process_peak()
+            self.stages.append(StagePeak(name, rss_before, peak, time.perf_counter() - start))
+            self.logger.info(f"Stage '{name}' peaked at {peak / 2**20:.1f} MiB RSS.")
+
+    def format(self) -> List[str]:
+        """Returns one line per stage: its name, peak RSS, RSS at its start and duration."""
+        return [f"{peak.stage}\tpeak {peak.peak_rss / 2**20:.1f} MiB\tstart {peak.rss_before / 2**20:.1f} MiB\t"
+                f"{peak.seconds * 1000:.1f} ms" for peak in self.stages]
+
+    @staticmethod
+    def _reset_peak() -> None:
+        """Resets the kernel's peak RSS of the process (Linux), ignored where unsupported."""
+        try:
+            with open('/proc/self/clear_refs', 'w') as file:
+                file.write('5')
+        except OSError:
+            pass
+
+    @staticmethod
+    def _status_bytes(field: str) -> Optional[int]:
+        """Reads a memory field (e.g. VmRSS) of `/proc/self/status` in bytes, None where unavailable."""
+        try:
+            with open('/proc/self/status') as file:
+                for line in file:
+                    if line.startswith(field + ':'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    @staticmethod
+    def _process_peak() -> int:
+        """Returns the process-wide peak RSS in bytes (`ru_maxrss` is in KiB on Linux, in bytes on macOS)."""
+        import resource  # POSIX only, so imported where the /proc files are missing
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
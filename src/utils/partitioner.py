@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+from typing import List, NamedTuple
+
+from src.utils.enums import Period
+
+"""
+partitioner.py
+
+This module splits date ranges into calendar-aligned partitions.
+
+Classes:
+    Partition: A single half-open [start, end) date range identified by its period key.
+    DatePartitioner: Splits a date range into consecutive partitions of a given period.
+"""
+
+
+class Partition(NamedTuple):
+    """A half-open [start, end) date range, e.g. ('2025-01', 2025-01-01, 2025-02-01) for a month."""
+    key: str
+    start: date
+    end: date
+
+
+class DatePartitioner:
+    """Splits date ranges into whole days, months or years."""
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def split(date_from: date, date_to: date, period: Period) -> List[Partition]:
+        """
+        Splits a date range into consecutive, calendar-aligned partitions.
+
+        Partitions always cover whole periods, so the first and last one may extend beyond the requested
+        range. This keeps the content of a partition independent of the range it was requested with.
+
+        :param date_from: First date that must be covered.
+        :param date_to: Last date that must be covered (inclusive).
+        :param period: Length of a single partition.
+        :return: The partitions in chronological order.
+        :raises ValueError: If `date_from` is after `date_to`.
+        """
+        if date_from > date_to:
+            raise ValueError(f"Invalid date range: {date_from} is after {date_to}.")
+
+        partitions = []
+        start = DatePartitioner.period_start(date_from, period)
+        while start <= date_to:
+            end = DatePartitioner.next_period_start(start, period)
+            partitions.append(Partition(DatePartitioner.period_key(start, period), start, end))
+            start = end
+        return partitions
+
+    @staticmethod
+    def period_start(day: date, period: Period) -> date:
+        """Returns the first day of the period containing `day`."""
+        if period is Period.YEAR:
+            return day.replace(month=1, day=1)
+        if period is Period.MONTH:
+            return day.replace(day=1)
+        return day
+
+    @staticmethod
+    def next_period_start(start: date, period: Period) -> date:
+        """Returns the first day of the period following the one starting at `start`."""
+        if period is Period.YEAR:
+            return start.replace(year=start.year + 1)
+        if period is Period.MONTH:
+            return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(
+                month=start.month + 1)
+        return start + timedelta(days=1)
+
+    @staticmethod
+    def period_key(start: date, period: Period) -> str:
+        """Returns the label of a period, e.g. '2025', '2025-01' or '2025-01-31'."""
+        if period is Period.YEAR:
+            return f"{start.year:04d}"
+        if period is Period.MONTH:
+            return f"{start.year:04d}-{start.month:02d}"
+        return start.isoformat()
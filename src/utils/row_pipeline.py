@@ -0,0 +1,143 @@
+from functools import partial
+from itertools import chain, islice
+from operator import itemgetter
+from typing import Callable, Container, Iterable, Iterator, List, Optional, TypeVar
+from zoneinfo import ZoneInfo
+
+import config
+from src.utils.fomatter import Formatter
+
+"""
+row_pipeline.py
+
+This module streams database rows to the writers in batches: source -> filter -> map -> sink.
+
+Every stage is a generator over batches (lists) of the tuples returned by the database cursor, so rows are never
+copied between stages and only one batch of them is in memory at a time. Mapping reorders a row into
+`COLUMN_ORDER` with a precomputed `operator.itemgetter` and formats it field by field, allocating only the output
+list, instead of an intermediate dict per row. Amounts are converted to cents and formatted, and timestamps are
+converted to dates, once per batch.
+
+Classes:
+    RowPipeline: Generator stages over batches of database rows.
+"""
+
+# Export column of every field of a database row, in query order
+DB_ROW_COLUMNS = ('id', 'opis', 'kwota', 'kategoria', 'data')
+
+# Formatter of every export column
+COLUMN_FORMATTERS: dict = {
+    'id': str,
+    'opis': str,
+    'kwota': Formatter.format_amount,
+    'kategoria': Formatter.map_category,
+    'data': Formatter.format_timestamp,
+}
+
+T = TypeVar('T')
+
+
+class RowPipeline:
+    """Generator stages streaming batches of database rows (tuples) into mapped export rows."""
+
+    # Picks the fields of a database row in export order, and the formatter of each of them
+    ORDER = itemgetter(*(DB_ROW_COLUMNS.index(column) for column in config.COLUMN_ORDER))
+    FORMATTERS = tuple(COLUMN_FORMATTERS[column] for column in config.COLUMN_ORDER)
+    # Position of the amount and the date in a database row and in an export row; both are formatted per batch
+    AMOUNT_FIELD = DB_ROW_COLUMNS.index('kwota')
+    AMOUNT_COLUMN = config.COLUMN_ORDER.index('kwota')
+    DATE_FIELD = DB_ROW_COLUMNS.index('data')
+    DATE_COLUMN = config.COLUMN_ORDER.index('data')
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def batches(rows: Iterable[T], size: int = config.PIPELINE_BATCH_SIZE) -> Iterator[List[T]]:
+        """
+        Source stage for rows already in memory (e.g. merged household or imported rows).
+
+        :param rows: The database rows.
+        :param size: Number of rows per batch.
+        :return: An iterator of batches, referencing the rows without copying them.
+        """
+        iterator = iter(rows)
+        while batch := list(islice(iterator, size)):
+            yield batch
+
+    @staticmethod
+    def drop_known(batches: Iterable[List[tuple]], known_ids: Container[str]) -> Iterator[List[tuple]]:
+        """
+        Filter stage dropping the rows whose ID (first field) was already exported.
+
+        :param batches: Batches of database rows.
+        :param known_ids: IDs of the exported rows, as strings.
+        :return: An iterator of the non-empty batches of new rows.
+        """
+        for batch in batches:
+            new_rows = [row for row in batch if str(row[0]) not in known_ids]
+            if new_rows:
+                yield new_rows
+
+    @staticmethod
+    def map_batches(batches: Iterable[List[tuple]], on_error: Optional[Callable[[tuple, Exception], None]] = None,
+                    zone: Optional[ZoneInfo] = None) -> Iterator[List[List[str]]]:
+        """
+        Map stage turning database rows into export rows in `COLUMN_ORDER`.
+
+        The amounts of a batch go through `Formatter.to_cents_batch` and `format_cents_batch` in one pass, and its
+        timestamps through `Formatter.format_timestamps`. A batch holding an invalid amount or timestamp formats that
+        column row by row instead, so only the bad rows are skipped (or, for dates, kept as the raw timestamp).
+
+        The person stamped on household and imported rows (a sixth field) is kept after the exported columns.
+
+        :param batches: Batches of database rows.
+        :param on_error: Called with every row that cannot be mapped, which is then skipped.
+        :param zone: Time zone of the dates, defaults to the configured one.
+        :return: An iterator of batches of export rows.
+        """
+        order, formatters = RowPipeline.ORDER, RowPipeline.FORMATTERS
+        amount_field, amount_column = RowPipeline.AMOUNT_FIELD, RowPipeline.AMOUNT_COLUMN
+        date_field, date_column = RowPipeline.DATE_FIELD, RowPipeline.DATE_COLUMN
+        if zone is not None:
+            formatters = tuple(partial(Formatter.format_timestamp, zone=zone) if column == 'data' else formatter
+                               for column, formatter in zip(config.COLUMN_ORDER, formatters))
+        # Columns filled in from a batch conversion only pass through their per-row formatter, keyed by which
+        # conversions succeeded (amounts, dates)
+        batch_formatters = {
+            (by_amount, by_date): tuple(
+                (lambda value: value) if (column == 'kwota' and by_amount) or (column == 'data' and by_date)
+                else formatter for column, formatter in zip(config.COLUMN_ORDER, formatters))
+            for by_amount in (False, True) for by_date in (False, True)}
+        for batch in batches:
+            try:
+                amounts: Optional[List[str]] = Formatter.format_cents_batch(
+                    Formatter.to_cents_batch([row[amount_field] for row in batch]))
+            except (TypeError, ValueError, IndexError, OverflowError):
+                amounts = None
+            try:
+                dates: Optional[List[str]] = Formatter.format_timestamps([row[date_field] for row in batch], zone)
+            except (TypeError, ValueError, IndexError, OverflowError, OSError):
+                dates = None
+            row_formatters = batch_formatters[amounts is not None, dates is not None]
+            mapped = []
+            for position, row in enumerate(batch):
+                try:
+                    values = [format_value(value) for format_value, value in zip(row_formatters, order(row))]
+                    if amounts is not None:
+                        values[amount_column] = amounts[position]
+                    if dates is not None:
+                        values[date_column] = dates[position]
+                except Exception as e:
+                    if on_error is not None:
+                        on_error(row, e)
+                    continue
+                if len(row) > 5 and row[5]:
+                    values.append(str(row[5]))
+                mapped.append(values)
+            yield mapped
+
+    @staticmethod
+    def rows(batches: Iterable[List[List[str]]]) -> Iterator[List[str]]:
+        """Sink adapter flattening batches into the row iterator the CSV writers consume."""
+        return chain.from_iterable(batches)
@@ -0,0 +1,141 @@
+import hashlib
+import os
+from typing import IO, Callable, List, Optional, Sequence
+
+from src.utils.logger import Logging
+
+try:
+    import fcntl  # POSIX advisory locks
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+"""
+run_lock.py
+
+This module keeps overlapping runs of a sync (e.g. cron starting a sync before the previous one finished) from
+writing the same targets at once.
+
+A run holds an advisory lock (`flock`) on a lock file per target: its output directory and its spreadsheet. Locks are
+released by the kernel when the process exits, so a crashed run never leaves a stale lock behind. A second run of the
+same job does not wait: it leaves a rerun request next to the lock and exits, and the running one runs once more
+before releasing it, so any number of overlapping requests cost one extra run. A different job sharing a target waits
+for the lock instead.
+
+Classes:
+    RunLock: Runs an action under the locks of its targets, coalescing overlapping runs of the same job.
+"""
+
+
+class RunLock(Logging):
+    """
+    Advisory locks on the targets of a run, with overlapping runs of the same job coalesced into the running one.
+
+    The lock files hold the key of the job holding them, which tells a second run whether it can hand its work over.
+    A rerun request is only consumed by a run holding the locks, and the holder checks for requests again after
+    releasing them, so no request is lost between its last run and the release.
+    """
+
+    def __init__(self, lock_files: Sequence[str], job: str):
+        """
+        :param lock_files: Lock file of every target of the run; they are created when missing and never deleted.
+        :param job: Description of the job (e.g. its command line); runs of equal jobs are coalesced.
+        """
+        super().__init__()
+        self.lock_files = sorted({os.path.abspath(path) for path in lock_files})  # One order for every run
+        self.job = hashlib.sha1(job.encode('utf-8')).hexdigest()[:16]
+        self.rerun_file = f"{self.lock_files[0]}.{self.job}.rerun"
+        self._handles: List[IO[str]] = []
+
+    def run(self, action: Callable[[], None]) -> bool:
+        """
+        Runs an action under the locks, or hands it over to a run of the same job in progress.
+
+        :param action: The sync to run; it runs again as long as reruns were requested while it ran.
+        :return: False when the run was handed over to another process or thread, True when it ran here.
+        """
+        if fcntl is None:  # pragma: no cover
+            self.logger.warning("File locks are not supported on this platform; running without a lock.")
+            action()
+            return True
+
+        ran = False
+        while True:
+            busy = self._try_acquire()
+            if busy is not None:
+                if self._holder(busy) != self.job:
+                    self.logger.info(f"{busy} is locked by another job, waiting for it to finish.")
+                    self._acquire()
+                else:
+                    self._request_rerun()
+                    if self._try_acquire() is not None:
+                        self.logger.info(f"A run of this job holds {busy}; queued a rerun after it finishes.")
+                        return ran
+            try:
+                self._clear_rerun()  # This run covers every request made so far
+                action()
+                ran = True
+                while self._clear_rerun():
+                    self.logger.info("A rerun was requested while running, running again.")
+                    action()
+            finally:
+                self._release()
+            if not os.path.exists(self.rerun_file):
+                return ran
+
+    def _try_acquire(self) -> Optional[str]:
+        """Takes every lock without waiting; returns the first lock file held elsewhere, with none taken, or None."""
+        for path in self.lock_files:
+            handle = open(path, 'a+', encoding='utf-8')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                self._release()
+                return path
+            self._handles.append(handle)
+        self._write_holder()
+        return None
+
+    def _acquire(self) -> None:
+        """Takes every lock, waiting for each in turn."""
+        for path in self.lock_files:
+            handle = open(path, 'a+', encoding='utf-8')
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            self._handles.append(handle)
+        self._write_holder()
+
+    def _release(self) -> None:
+        """Releases the locks taken so far."""
+        for handle in self._handles:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+        self._handles = []
+
+    def _write_holder(self) -> None:
+        """Records the job holding the locks in the lock files."""
+        for handle in self._handles:
+            handle.seek(0)
+            handle.truncate()
+            handle.write(self.job)
+            handle.flush()
+
+    @staticmethod
+    def _holder(path: str) -> str:
+        """Returns the key of the job holding a lock file, empty when unknown."""
+        try:
+            with open(path, encoding='utf-8') as file:
+                return file.read().strip()
+        except OSError:
+            return ''
+
+    def _request_rerun(self) -> None:
+        """Asks the run in progress to run once more."""
+        open(self.rerun_file, 'a').close()
+
+    def _clear_rerun(self) -> bool:
+        """Consumes the rerun request; returns whether there was one."""
+        try:
+            os.remove(self.rerun_file)
+            return True
+        except FileNotFoundError:
+            return False
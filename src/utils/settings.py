@@ -0,0 +1,191 @@
+import dataclasses
+import os
+import re
+import sys
+from dataclasses import dataclass
+from datetime import date
+from functools import cached_property
+from typing import Any, ClassVar, Dict, List, Mapping, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import config
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:  # Python 3.10: the same parser, installed from PyPI
+    import tomli as tomllib
+
+"""
+settings.py
+
+This module holds the deployment settings of a sync: which sheet, which dates, which files.
+
+Settings are loaded once, from the defaults in `config.py`, a TOML file and `BUDGET_SYNC_*` environment variables,
+and the values derived from them (compiled file name patterns, the time zone, parsed date bounds) are computed once
+and cached on the object. Each profile of the TOML file is its own `Settings`, so several syncs can run in one process.
+
+Classes:
+    Settings: Typed, immutable settings with cached derived values.
+"""
+
+# Compression values accepted for the history file
+HISTORY_COMPRESSIONS = ('', 'gzip', 'zstd')
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Settings of one sync profile.
+
+    Values are resolved in this order, later ones winning: `config.py` defaults, the top level of the TOML file,
+    the `[profiles.<name>]` table of the TOML file, and `BUDGET_SYNC_<FIELD>` environment variables.
+
+    Attributes:
+        name (str): Profile name, "default" for the top level of the file.
+        spreadsheet_id (str): Google Sheets document the transactions are synced to.
+        default_range (str): Range in A1 notation holding the transactions.
+        credentials_file (str): Google service account file, relative to the working directory or absolute.
+        timezone (str): IANA time zone used to turn timestamps into dates.
+        date_filter (str): Inclusive start date, 'YYYY-MM-DD'.
+        date_to (Optional[str]): Inclusive upper date bound, 'YYYY-MM-DD'.
+        db_directory (Optional[str]): Directory holding the Cashew backups.
+        output_dir (Optional[str]): Directory of the CSV files.
+        history_compression (str): "", "gzip" or "zstd".
+        db_file_prefix (str): Prefix of the backup file names.
+        db_file_suffix (str): Extension of the backup file names.
+    """
+    name: str = "default"
+    spreadsheet_id: str = config.MY_SPREADSHEET_ID
+    default_range: str = config.MY_DEFAULT_RANGE
+    credentials_file: str = config.GSHEETS_AUTH_CREDENTIALS_FILE
+    timezone: str = config.TIMEZONE
+    date_filter: str = config.DATE_FILTER
+    date_to: Optional[str] = None
+    db_directory: Optional[str] = None
+    output_dir: Optional[str] = None
+    history_compression: str = config.HISTORY_COMPRESSION
+    db_file_prefix: str = config.DB_FILE_PREFIX
+    db_file_suffix: str = config.DB_FILE_SUFFIX
+
+    _current: ClassVar[Optional["Settings"]] = None
+
+    def __post_init__(self):
+        """
+        Validates the settings, so a bad value fails when it is loaded rather than in the middle of a sync.
+
+        :raises ValueError: If a date, the time zone or the compression is invalid.
+        """
+        if self.history_compression not in HISTORY_COMPRESSIONS:
+            raise ValueError(f"Invalid history_compression '{self.history_compression}', "
+                             f"expected one of {list(HISTORY_COMPRESSIONS)}.")
+        for field in ('date_filter', 'date_to'):
+            value = getattr(self, field)
+            if value is not None:
+                try:
+                    date.fromisoformat(value)
+                except ValueError:
+                    raise ValueError(f"Invalid {field} '{value}', expected YYYY-MM-DD.")
+        try:
+            self.__dict__['zone'] = ZoneInfo(self.timezone)  # Resolved once, cached like the other derived values
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown timezone '{self.timezone}'.")
+
+    @cached_property
+    def zone(self) -> ZoneInfo:
+        """The resolved time zone."""
+        return ZoneInfo(self.timezone)
+
+    @cached_property
+    def sql_file_name_pattern(self) -> re.Pattern:
+        """Compiled pattern of the backup file names, with the timestamp as its first group."""
+        return re.compile(rf"^{re.escape(self.db_file_prefix)}.*"
+                          rf"(\d{{4}}-\d{{2}}-\d{{2}}-\d{{2}}-\d{{2}}-\d{{2}}-\d{{3}}Z)"
+                          rf"\.{re.escape(self.db_file_suffix)}$")
+
+    @cached_property
+    def sql_file_datetime_pattern(self) -> re.Pattern:
+        """Compiled pattern of the timestamp within a backup file name."""
+        return re.compile(config.SQL_FILE_DATETIME_REGEX)
+
+    @cached_property
+    def date_bounds(self) -> Tuple[date, Optional[date]]:
+        """The parsed (date_filter, date_to) bounds."""
+        return date.fromisoformat(self.date_filter), date.fromisoformat(self.date_to) if self.date_to else None
+
+    def replace(self, **changes: Any) -> "Settings":
+        """Returns a copy with some values changed; the derived values of the copy are computed again."""
+        return dataclasses.replace(self, **changes)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None, profile: Optional[str] = None,
+             environ: Optional[Mapping[str, str]] = None) -> "Settings":
+        """
+        Loads the settings of a profile.
+
+        :param path: TOML file; defaults to `$BUDGET_SYNC_CONFIG`, then `config.SETTINGS_FILE` when it exists.
+        :param profile: Name of a `[profiles.<name>]` table, or None for the top level only.
+        :param environ: Environment variables, defaults to `os.environ`.
+        :return: The validated settings.
+        :raises ValueError: If the profile does not exist or a value is invalid.
+        """
+        environ = os.environ if environ is None else environ
+        document = cls._read_file(cls._file_path(path, environ))
+        values: Dict[str, Any] = {key: value for key, value in document.items() if key != 'profiles'}
+        if profile is not None:
+            profiles = document.get('profiles', {})
+            if profile not in profiles:
+                raise ValueError(f"Unknown settings profile '{profile}', expected one of {list(profiles)}.")
+            values.update(profiles[profile])
+        values['name'] = profile or cls.name
+
+        fields = dataclasses.fields(cls)
+        for field in fields:
+            variable = config.SETTINGS_ENV_PREFIX + field.name.upper()
+            if variable in environ and field.name != 'name':
+                values[field.name] = environ[variable]
+        unknown = set(values) - {field.name for field in fields}
+        if unknown:
+            raise ValueError(f"Unknown settings {sorted(unknown)}.")
+
+        # Every value is a string; an empty one unsets an optional value such as date_to
+        optional = {field.name for field in fields if field.default is None}
+        arguments: Dict[str, Any] = {key: None if key in optional and value in (None, '') else str(value)
+                                     for key, value in values.items()}
+        return cls(**arguments)
+
+    @classmethod
+    def profiles(cls, path: Optional[str] = None, environ: Optional[Mapping[str, str]] = None) -> List[str]:
+        """Returns the profile names defined in the settings file, in file order."""
+        environ = os.environ if environ is None else environ
+        return list(cls._read_file(cls._file_path(path, environ)).get('profiles', {}))
+
+    @classmethod
+    def current(cls) -> "Settings":
+        """Returns the settings of the process, loading them on first use."""
+        if cls._current is None:
+            cls._current = cls.load()
+        return cls._current
+
+    @classmethod
+    def reset(cls) -> None:
+        """Drops the process settings, so the next use loads them again."""
+        cls._current = None
+
+    @staticmethod
+    def _file_path(path: Optional[str], environ: Mapping[str, str]) -> Optional[str]:
+        """Returns the settings file to read, or None when there is none."""
+        path = path or environ.get(config.SETTINGS_ENV_PREFIX + 'CONFIG')
+        if path:
+            return path
+        return config.SETTINGS_FILE if os.path.exists(config.SETTINGS_FILE) else None
+
+    @staticmethod
+    def _read_file(path: Optional[str]) -> Dict[str, Any]:
+        """Parses a TOML settings file; no file means no overrides."""
+        if path is None:
+            return {}
+        try:
+            with open(path, 'rb') as file:
+                return tomllib.load(file)
+        except (OSError, tomllib.TOMLDecodeError) as e:
+            raise ValueError(f"Failed to read the settings file {path}: {e}")
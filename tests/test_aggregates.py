@@ -0,0 +1,40 @@
+from src.utils.aggregates import MonthlySummary
+
+
+def test_totals_by_month_category_and_person_are_exact():
+    """Test that rows are grouped by month, category and person, with totals summed in cents."""
+    summary = MonthlySummary.from_transactions([
+        ['1', 'a', '0,10', 'inne', '2025-01-03'],
+        ['2', 'b', '0,20', 'inne', '2025-01-31'],
+        ['', 'c', '-7,50', 'przyjemności', '2025-01-20', 'Daga'],
+        ['3', 'd', '1 000,00', 'rachunki', '2025-02-01'],
+        ['', 'note', 'n/a', 'inne', '2025-02-02'],
+        ['', '', '', '', ''],
+    ])
+
+    assert summary.to_rows() == [
+        ['2025-01', 'inne', '', '0,30', '2'],
+        ['2025-01', 'przyjemności', 'Daga', '-7,50', '1'],
+        ['2025-02', 'rachunki', '', '1000,00', '1'],
+    ]
+
+
+def test_deltas_update_a_loaded_summary():
+    """Test that a summary read back from its rows can be updated with new and replaced rows."""
+    summary = MonthlySummary.from_rows([['miesiąc', 'kategoria', 'kto', 'suma', 'liczba'],
+                                        ['2025-01', 'inne', '', '10,00', '1']])
+
+    summary.add([['2', 'b', '5,25', 'transport', '2025-01-04']])
+    summary.remove([['1', 'a', '10,00', 'inne', '2025-01-02']])
+
+    assert summary.to_rows() == [['2025-01', 'transport', '', '5,25', '1']]
+
+
+def test_mark_row_round_trips():
+    """Test that the mark written after the totals is read back and not taken for a group."""
+    summary = MonthlySummary.from_transactions([['1', 'a', '10,00', 'inne', '2025-01-02']])
+    summary.mark = 42
+
+    loaded = MonthlySummary.from_rows(summary.to_rows())
+
+    assert (loaded.totals, loaded.mark) == (summary.totals, 42)
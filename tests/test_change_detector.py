@@ -0,0 +1,33 @@
+from src.utils.change_detector import ChangeDetector, ChangeSet
+
+
+def test_fingerprint_is_stable_and_field_aware():
+    """Test that fingerprints depend on the content and field boundaries only."""
+    assert ChangeDetector.fingerprint(['1', 'ab', 'c']) == ChangeDetector.fingerprint(['1', 'ab', 'c'])
+    assert ChangeDetector.fingerprint(['1', 'ab', 'c']) != ChangeDetector.fingerprint(['1', 'a', 'bc'])
+    assert len(ChangeDetector.fingerprint(['1'])) == 16
+
+
+def test_diff_classifies_rows():
+    """Test that rows are classified as new, changed, deleted or untracked."""
+    unchanged = ['1', 'Groceries', '50,00']
+    edited = ['2', 'Fuel', '35,00']
+    known = {
+        '1': ChangeDetector.fingerprint(unchanged),
+        '2': ChangeDetector.fingerprint(['2', 'Fuel', '30,00']),
+        '3': ChangeDetector.fingerprint(['3', 'Gone', '1,00']),
+        '4': '',
+    }
+    rows = [unchanged, edited, ['4', 'Old', '1,00'], ['5', 'New', '2,00']]
+
+    changes = ChangeDetector.diff(rows, known)
+
+    assert changes == ChangeSet(new=[['5', 'New', '2,00']], changed=[edited], deleted=['3'],
+                                untracked=[['4', 'Old', '1,00']])
+
+
+def test_diff_limits_deletions_to_deletable_ids():
+    """Test that only IDs in the deletable set are reported as deleted."""
+    changes = ChangeDetector.diff([], {'1': 'a', '2': 'b'}, deletable={'2'})
+
+    assert changes.deleted == ['2']
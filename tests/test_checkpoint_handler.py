@@ -0,0 +1,41 @@
+import json
+
+from src.handlers.checkpoint_handler import CheckpointHandler
+
+
+def test_checkpoint_round_trip(tmp_path):
+    """Test that acknowledged progress survives a reload, and that checkpoints of other ranges are ignored."""
+    checkpoint_file = str(tmp_path / "checkpoint.json")
+    handler = CheckpointHandler(checkpoint_file, "sheet|wydatki_2025!G2:M")
+
+    checkpoint = handler.start(["a", "b", "c"], next_row=10)
+    handler.acknowledge(checkpoint, 2)
+
+    loaded = handler.load()
+    assert loaded is not None
+    assert (loaded.pending_ids, loaded.last_id, loaded.next_row) == (["c"], "b", 12)
+    assert CheckpointHandler(checkpoint_file, "sheet|wydatki_2024!G2:M").load() is None
+
+    handler.clear()
+    assert handler.load() is None
+
+
+def test_acknowledge_rewrites_only_the_progress(tmp_path):
+    """Test that the plan is written once, and that a progress file of another plan is ignored."""
+    checkpoint_file = str(tmp_path / "checkpoint.json")
+    handler = CheckpointHandler(checkpoint_file, "sheet|wydatki_2025!G2:M")
+    checkpoint = handler.start([str(i) for i in range(1000)], next_row=2)
+    with open(handler.plan_path, encoding='utf-8') as file:
+        plan = file.read()
+
+    handler.acknowledge(checkpoint, 500)
+
+    with open(handler.plan_path, encoding='utf-8') as file:
+        assert file.read() == plan
+    with open(checkpoint_file, encoding='utf-8') as file:
+        assert json.load(file) == {'target': "sheet|wydatki_2025!G2:M", 'planned': 1000, 'written': 500,
+                                   'last_id': "499", 'next_row': 502}
+
+    # A new plan saved, then a crash before its progress replaced the old one
+    CheckpointHandler._save(handler.plan_path, {'target': handler.target, 'ids': ["a", "b"]})
+    assert handler.load() is None
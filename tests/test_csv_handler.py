@@ -1,7 +1,13 @@
+import io
+import os
+import stat
 from unittest.mock import patch, mock_open
 
+import pytest
+
 from config import CSV_DELIMITER
-from src.handlers.csv_handler import CSVHandler
+from src.handlers.csv_handler import CSVHandler, CSVWriter, JOURNAL_SUFFIX, WriteStats
+from src.utils.error_handling import CSVError
 
 
 def test_read_existing_csv(test_csv):
@@ -40,4 +46,96 @@ def test_append_to_csv(mock_file):
     CSVHandler.append_to_csv("test.csv", ["col1", "col2"], [["data1", "data2"]])
 
     # Validate appending rows
-    mock_file().write.assert_any_call("data1\tdata2\r\n")
+    mock_file().write.assert_any_call(b"col1\tcol2\r\ndata1\tdata2\r\n")
+
+
+def test_rewrite_csv_is_atomic(test_csv):
+    """Test that a failed rewrite leaves the previous file and no temporary files behind."""
+    CSVHandler.rewrite_csv(test_csv, ['id'], [['1']])
+
+    with patch('os.replace', side_effect=OSError("disk full")), pytest.raises(CSVError):
+        CSVHandler.rewrite_csv(test_csv, ['id'], [['2']])
+
+    with open(test_csv, encoding='utf-8') as f:
+        assert f.read().splitlines() == ['id', '1']
+    assert os.listdir(os.path.dirname(test_csv)) == [os.path.basename(test_csv)]
+
+
+def test_append_to_csv_with_journal(test_csv):
+    """Test that a journaled append writes the header once and removes its journal."""
+    CSVHandler.append_to_csv(test_csv, ['id', 'opis'], [['1', 'a']], journal=True)
+    CSVHandler.append_to_csv(test_csv, ['id', 'opis'], [['2', 'b']], journal=True)
+
+    with open(test_csv, encoding='utf-8') as f:
+        assert f.read().splitlines() == ['id\topis', '1\ta', '2\tb']
+    assert not os.path.exists(test_csv + JOURNAL_SUFFIX)
+
+
+def test_recover_journal_rolls_back_interrupted_append(test_csv):
+    """Test that a partial append left by a crash is truncated to the size saved in the journal."""
+    with open(test_csv, 'w', encoding='utf-8', newline='') as f:
+        f.write('id\r\n1\r\n2\r')  # The append of rows 2 and 3 was interrupted
+    with open(test_csv + JOURNAL_SUFFIX, 'w', encoding='utf-8', newline='') as f:
+        f.write('7\n')
+
+    assert CSVHandler.recover_journal(test_csv)
+
+    with open(test_csv, encoding='utf-8') as f:
+        assert f.read().splitlines() == ['id', '1']
+    assert not CSVHandler.recover_journal(test_csv)
+
+
+def test_journaled_append_writes_the_rows_once(test_csv):
+    """Test that a journaled append writes its payload to the file only, with a single fsync of the file."""
+    synced_sizes = []
+
+    def record_file_sync(fd: int) -> None:
+        info = os.fstat(fd)
+        if stat.S_ISREG(info.st_mode):  # Directories are fsynced too, to persist renames
+            synced_sizes.append(info.st_size)
+
+    CSVHandler.append_to_csv(test_csv, ['id'], [['1']])
+    with patch('os.fsync', side_effect=record_file_sync):
+        CSVHandler.append_to_csv(test_csv, ['id'], [[str(i)] for i in range(2, 1000)], journal=True)
+
+    # The journal only holds the size before the append ("6\n"), then the rows are fsynced once in the file
+    assert synced_sizes == [2, os.path.getsize(test_csv)]
+
+
+@pytest.mark.parametrize('suffix, magic', [('.gz', b'\x1f\x8b'), ('.zst', b'\x28\xb5\x2f\xfd')])
+def test_compressed_history_round_trip(tmp_path, suffix, magic):
+    """Test that compressed files are rewritten, appended to as new frames and streamed back."""
+    if suffix == '.zst':
+        pytest.importorskip('zstandard')
+    history = str(tmp_path / f'history.csv{suffix}')
+
+    CSVHandler.rewrite_csv(history, ['id', 'opis'], [['1', 'a']])
+    CSVHandler.append_to_csv(history, ['id', 'opis'], [['2', 'b']])
+    CSVHandler.append_to_csv(history, ['id', 'opis'], [['3', 'c']], journal=True)
+
+    with open(history, 'rb') as f:
+        assert f.read(len(magic)) == magic  # Stored compressed
+    assert CSVHandler.read_existing_csv(history) == [['1', 'a'], ['2', 'b'], ['3', 'c']]
+    assert CSVHandler.read_ids(history) == {'1', '2', '3'}
+    assert not os.path.exists(history + JOURNAL_SUFFIX)
+
+
+def test_convert_file_compresses_plain_history(test_csv):
+    """Test that a plain file is converted to gzip and reads back identically."""
+    CSVHandler.rewrite_csv(test_csv, ['id'], [['1'], ['2']])
+
+    CSVHandler.convert_file(test_csv, test_csv + '.gz')
+
+    assert CSVHandler.compression_of(test_csv + '.gz') == 'gzip'
+    assert CSVHandler.read_existing_csv(test_csv + '.gz') == CSVHandler.read_existing_csv(test_csv)
+
+
+def test_csv_writer_buffers_rows_and_reports_stats():
+    """Test that the writer streams an iterator in chunks, using the configured delimiter, and counts its output."""
+    file = io.BytesIO()
+    writer = CSVWriter(file, buffer_size=16)
+    writer.writerows(iter([['1', 'zł'], ['2', 'b']]))
+    writer.flush()
+
+    assert file.getvalue() == f"1{CSV_DELIMITER}zł\r\n2{CSV_DELIMITER}b\r\n".encode('utf-8')
+    assert writer.stats == WriteStats(rows=2, bytes=len(file.getvalue()))
@@ -0,0 +1,117 @@
+import sqlite3
+from datetime import datetime, timezone
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from conftest import INSERT_TEST_TRANSACTIONS
+from src.handlers.db_handler import DBHandler, TransactionCache
+from src.transaction_entity import TransactionEntity
+from src.transaction_exporter import TransactionExporter
+from src.utils.date_converter import DateConverter
+from src.utils.fomatter import Formatter
+from src.utils.row_pipeline import RowPipeline
+from src.utils.settings import Settings
+
+
+@pytest.mark.parametrize("zone", ["Europe/Warsaw", "America/New_York", "Australia/Lord_Howe", "Asia/Kolkata"])
+def test_dates_match_the_zone_rules_around_every_transition(zone):
+    """Test that the offset table gives the zoneinfo date of every hour around the DST changes of several years."""
+    converter = DateConverter(zone, 1672531200, 1735689599)  # 2023-2024
+    timestamps = list(range(1640995200, 1767225600, 1800))  # 2022-2025, beyond the precomputed range
+
+    expected = [datetime.fromtimestamp(timestamp, ZoneInfo(zone)).date().isoformat() for timestamp in timestamps]
+
+    assert converter.format_dates(timestamps) == expected
+    assert [converter.format_date(timestamp) for timestamp in timestamps[::97]] == expected[::97]
+
+
+def test_day_bounds_are_local_midnights():
+    """Test that day bounds are the UTC timestamps of local midnights, including on DST days."""
+    converter = DateConverter("Europe/Warsaw")
+
+    assert converter.day_start("2023-01-02") == 1672614000  # 2023-01-01 23:00 UTC
+    assert converter.day_end("2023-03-25") == converter.day_start("2023-03-26") == 1679785200
+    assert converter.day_end("2023-03-26") - converter.day_start("2023-03-26") == 23 * 3600
+    assert DateConverter("America/Havana").day_start("2023-03-12") == 1678597200  # Midnight falls in the DST gap
+
+
+def test_sql_filter_entity_and_csv_paths_agree_on_the_local_day(test_db):
+    """Test that a transaction made after midnight in Warsaw but before midnight UTC is dated the same everywhere."""
+    late = int(datetime(2023, 1, 4, 23, 30, tzinfo=timezone.utc).timestamp())  # 2023-01-05 00:30 in Warsaw
+    with sqlite3.connect(test_db) as conn:
+        conn.execute(INSERT_TEST_TRANSACTIONS, (5, 'Late', 10.0, '4', late))
+
+    up_to_the_4th = DBHandler.fetch_transactions(test_db, '2023-01-01', '2023-01-04')
+    from_the_5th = DBHandler.fetch_transactions(test_db, '2023-01-05')
+    [row] = from_the_5th
+
+    assert 5 not in [row[0] for row in up_to_the_4th]
+    assert row[0] == 5
+    assert Formatter.format_timestamp(row[4]) == '2023-01-05'
+    assert TransactionEntity.from_db_row(row).date == TransactionEntity.from_db_rows([row])[0].date == '2023-01-05'
+    assert list(RowPipeline.rows(RowPipeline.map_batches([[row]])))[0][4] == '2023-01-05'
+    assert DBHandler.fetch_transactions_between(test_db, '2023-01-05', '2023-01-06') == from_the_5th
+
+
+def test_date_from_keeps_its_whole_local_day(test_db):
+    """Test that a transaction made at noon on date_from is selected by every path, partitions included."""
+    noon = int(datetime(2023, 1, 2, 12, tzinfo=ZoneInfo("Europe/Warsaw")).timestamp())
+    with sqlite3.connect(test_db) as conn:
+        conn.execute(INSERT_TEST_TRANSACTIONS, (6, 'Noon', 10.0, '4', noon))
+
+    incremental = [row[0] for row in DBHandler.fetch_transactions(test_db, '2023-01-02')]
+    streamed = [row[0] for batch in DBHandler.iter_transactions(test_db, '2023-01-02') for row in batch]
+    partition = [row[0] for row in DBHandler.fetch_transactions_between(test_db, '2023-01-02', '2023-01-03')]
+
+    assert 6 in incremental and 6 in streamed and 6 in partition
+    assert sorted(partition) == sorted(row[0] for row in DBHandler.fetch_transactions(test_db, '2023-01-02', '2023-01-02'))
+    assert TransactionExporter(test_db, date_from='2023-01-02')._in_date_range('2023-01-02')
+
+
+def test_each_profile_dates_rows_in_its_own_time_zone(test_db):
+    """Test that exporters of profiles in different zones filter and date the same late-UTC transaction differently."""
+    late = int(datetime(2023, 1, 4, 23, 30, tzinfo=timezone.utc).timestamp())  # 5th in Warsaw, 4th in New York
+    with sqlite3.connect(test_db) as conn:
+        conn.execute(INSERT_TEST_TRANSACTIONS, (5, 'Late', 10.0, '4', late))
+    imported = [('import-1', 'Cash', 5.0, '4', late, 'Ala')]
+
+    warsaw = TransactionExporter(test_db, date_from='2023-01-05', imported=imported,
+                                 settings=Settings(timezone='Europe/Warsaw'))
+    new_york = TransactionExporter(test_db, date_from='2023-01-05', imported=imported,
+                                   settings=Settings(timezone='America/New_York'))
+    [row, _] = warsaw.fetch_transactions(test_db)
+
+    assert [row[0] for row in warsaw.fetch_transactions(test_db)] == [5, 'import-1']
+    assert new_york.fetch_transactions(test_db) == []
+    assert [row[4] for row in RowPipeline.rows(new_york.map_batches([[row]]))] == ['2023-01-04']
+    assert [txn.date for txn in TransactionEntity.from_db_rows([row], new_york.settings.zone)] == ['2023-01-04']
+    assert TransactionExporter.map_row(row, warsaw.settings.zone)['data'] == '2023-01-05'
+
+    cache = TransactionCache()
+    cache.reserve(test_db, '2023-01-05')
+    assert [row[0] for row in cache.fetch(test_db, '2023-01-05', zone=warsaw.settings.zone)] == [5]
+    assert cache.fetch(test_db, '2023-01-05', zone=new_york.settings.zone) == []
+
+
+def test_batch_mapping_formats_dates_once_per_batch(test_db):
+    """Test that mapped batches date their rows through the bulk converter, falling back per row on a bad timestamp."""
+    rows = DBHandler.fetch_transactions(test_db, '2023-01-02')
+    zone = ZoneInfo('America/New_York')
+
+    with patch.object(DateConverter, 'format_dates', autospec=True, side_effect=DateConverter.format_dates) as bulk:
+        mapped = list(RowPipeline.map_batches([rows, [(9, 'Bad', 1.0, '4', 'x')]], zone=zone))
+
+    assert bulk.call_count == 2
+    assert [row[4] for row in mapped[0]] == [Formatter.format_timestamp(row[4], zone) for row in rows]
+    assert mapped[1] == [['9', 'Bad', '1,00', 'inne', 'x']]
+
+
+def test_today_is_the_local_date_of_the_zone():
+    """Test that the default end of a partitioned export is today in the profile zone, not on the host."""
+    late = datetime(2023, 1, 4, 23, 30, tzinfo=timezone.utc).timestamp()  # The 5th in Warsaw, the 4th in New York
+
+    with patch('src.utils.date_converter.time.time', return_value=late):
+        assert DateConverter.of(ZoneInfo('Europe/Warsaw')).today().isoformat() == '2023-01-05'
+        assert DateConverter.of(ZoneInfo('America/New_York')).today().isoformat() == '2023-01-04'
@@ -1,12 +1,14 @@
+import shutil
+import sqlite3
 from unittest.mock import patch
 
-from src.handlers.db_handler import DBHandler
+from src.handlers.db_handler import DBHandler, TransactionCache
 
 
 def test_fetch_transactions(test_db):
     """Test that transactions are fetched properly from the database."""
     db_path = str(test_db)
-    date_filter = "2023-01-01"  # Date after records should exist
+    date_filter = "2023-01-02"  # First day of the expected records
 
     rows = DBHandler.fetch_transactions(db_path, date_filter)
 
@@ -16,9 +18,66 @@ def test_fetch_transactions(test_db):
     assert rows.__contains__((4, 'Thing', 25.00, 'Unknown Category', 1672790400))
 
 
+def test_fetch_transactions_with_upper_bound(test_db):
+    """Test that the optional upper date bound excludes later transactions."""
+    rows = DBHandler.fetch_transactions(str(test_db), "2023-01-02", "2023-01-02")
+
+    assert [row[0] for row in rows] == [2]
+
+
 @patch('sqlite3.connect')
 def test_fetch_transactions_no_data(mock_connect):
     mock_cursor = mock_connect.return_value.cursor.return_value
     mock_cursor.fetchall.return_value = []  # Mock empty query result
     transactions = DBHandler.fetch_transactions("/mock/db/path", "2022-01-01")
     assert transactions == []
+
+
+def test_fetch_household_transactions(test_db, tmp_path):
+    """Test that backups are merged with their owner stamped, and a transaction in two backups is kept once."""
+    other_db = str(tmp_path / "other.db")
+    with sqlite3.connect(test_db) as conn:
+        conn.execute("ATTACH DATABASE ? AS other", (other_db,))
+        conn.execute("CREATE TABLE other.categories AS SELECT * FROM categories")
+        conn.execute("CREATE TABLE other.transactions AS SELECT * FROM transactions WHERE transaction_pk = 3")
+        conn.execute("INSERT INTO other.transactions VALUES (7, 'Cinema', 40.0, '999', 1672790400)")
+        conn.commit()
+
+    rows = DBHandler.fetch_household_transactions({'Ala': test_db, 'Olek': other_db}, "2023-01-02")
+
+    assert [(row[0], row[5]) for row in rows] == [(2, 'Ala'), (3, 'Ala'), (4, 'Ala'), (7, 'Olek')]
+
+
+def test_transaction_cache_reads_a_backup_once_for_every_reserved_range(test_db):
+    """Test that ranges reserved up front are served from one read, with the bounds of the SQL queries."""
+    cache = TransactionCache()
+    cache.reserve(test_db, "2023-01-02", "2023-01-03")
+    cache.reserve(test_db, "2022-12-31")
+
+    with patch.object(DBHandler, 'fetch_transactions', wraps=DBHandler.fetch_transactions) as mock_fetch:
+        ranges = [("2023-01-02", "2023-01-03"), ("2022-12-31", None), ("2023-01-01", "2023-01-02")]
+        cached = [cache.fetch(test_db, *date_range) for date_range in ranges]
+        assert mock_fetch.call_count == 1
+        assert cached == [DBHandler.fetch_transactions(test_db, *date_range) for date_range in ranges]
+
+        cache.fetch(test_db, "2020-01-01")  # Not reserved: queried directly
+        assert mock_fetch.call_count == 5
+
+
+def test_iter_backup_diff_lists_added_removed_and_modified_rows(test_db, tmp_path):
+    """Test that the attached-database query returns every change between two backups, with the old values."""
+    new_db = shutil.copy(test_db, tmp_path / "new.sql")
+    with sqlite3.connect(new_db) as conn:
+        conn.execute("DELETE FROM transactions WHERE transaction_pk = 3")
+        conn.execute("UPDATE transactions SET name = 'Train' WHERE transaction_pk = 2")
+        conn.execute("INSERT INTO transactions VALUES (5, 'Taxi', 30.0, '4', 1672876800)")
+
+    batches = list(DBHandler.iter_backup_diff(test_db, new_db, "2023-01-01", batch_size=2))
+    changes = sorted(row for batch in batches for row in batch)
+
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert changes == [
+        ('added', 5, 'Taxi', 30.0, 'Transport', 1672876800, None, None, None, None),
+        ('modified', 2, 'Train', 2.5, 'Transport', 1672617600, 'Bus Ticket', 2.5, 'Transport', 1672617600),
+        ('removed', 3, 'Therapy21', 100.0, 'Therapy', 1672704000, None, None, None, None)]
+    assert list(DBHandler.iter_backup_diff(test_db, test_db)) == []
@@ -0,0 +1,75 @@
+import random
+import timeit
+from datetime import datetime
+
+import pytest
+
+from src.transaction_entity import TransactionEntity
+from src.utils.category_resolver import CategoryResolver
+from src.utils.fomatter import Formatter
+from src.utils.settings import Settings
+
+
+@pytest.mark.parametrize(
+    "amount, expected",
+    [(0.0, "0,00"), (2.5, "2,50"), (-0.5, "-0,50"), (1234.56, "1234,56"), (-17.05, "-17,05"), (0.1 + 0.2, "0,30")],
+)
+def test_format_amount(amount, expected):
+    """Test the comma-decimal output, including negative amounts and float noise."""
+    assert Formatter.format_amount(amount) == expected
+    assert Formatter.format_cents_batch([Formatter.to_cents(amount)]) == [expected]
+
+
+def test_cents_sum_is_exact():
+    """Test that cents add up exactly where floats drift."""
+    amounts = [0.1] * 10 + [0.2] * 5
+
+    assert sum(amounts) != 2.0
+    assert Formatter.format_cents(sum(Formatter.to_cents_batch(amounts))) == "2,00"
+
+
+def test_from_db_rows_converts_amounts_in_batch():
+    """Test that batch-mapped entities carry integer cents and format like single rows."""
+    rows = [(1, 'Bus', 2.5, 'transport', 1672617600), (2, 'Refund', -10.1, 'inne', 1672704000)]
+
+    entities = TransactionEntity.from_db_rows(rows)
+
+    assert [entity.amount_cents for entity in entities] == [250, -1010]
+    assert [entity.to_list() for entity in entities] == [TransactionEntity.from_db_row(row).to_list() for row in rows]
+    assert entities[0].date == datetime.fromtimestamp(1672617600, Settings.current().zone).date().isoformat()
+
+
+def test_cents_formatter_matches_float_path():
+    """Test that the batch cents path, conversion included, formats like each amount on its own."""
+    rng = random.Random(7)
+    amounts = [round(rng.uniform(-5000, 5000), 2) for _ in range(10_000)]
+
+    expected = [f"{amount:.2f}".replace(".", ",") for amount in amounts]
+
+    assert Formatter.format_cents_batch(Formatter.to_cents_batch(amounts)) == expected
+    assert [Formatter.format_amount(amount) for amount in amounts] == expected
+
+
+@pytest.mark.benchmark
+def test_cents_formatter_outpaces_float_path():
+    """Benchmark the batch cents path against formatting each amount; run with `pytest -m benchmark`."""
+    rng = random.Random(7)
+    amounts = [round(rng.uniform(-5000, 5000), 2) for _ in range(100_000)]
+
+    per_row_seconds = min(timeit.repeat(lambda: [Formatter.format_amount(amount) for amount in amounts],
+                                        number=1, repeat=5))
+    cents_seconds = min(timeit.repeat(lambda: Formatter.format_cents_batch(Formatter.to_cents_batch(amounts)),
+                                      number=1, repeat=5))
+
+    assert cents_seconds < per_row_seconds
+
+
+def test_category_resolver_aliases_and_memoizes():
+    """Test that names resolve through the alias table case-insensitively, and each raw name is looked up once."""
+    resolver = CategoryResolver({'Bills & Fees': 'rachunki'})
+
+    assert [resolver.resolve(name) for name in ['Transport', 'bills & fees', 'BILLS & FEES', 'Therapy']] == \
+        ['transport', 'rachunki', 'rachunki', 'inne']
+    assert len(resolver._cache) == 4
+    with pytest.raises(ValueError):
+        CategoryResolver({'Dining': 'restauracje'})
@@ -100,3 +100,120 @@ def test_extract_column_and_row(cell_reference, expected_result):
     """Test extracting column and row from a cell reference."""
     column, row = GoogleSheetsHandler._extract_column_and_row(cell_reference)
     assert (column, row) == expected_result
+
+
+@patch("src.handlers.google_sheets_handler.GoogleSheetsHandler._authenticate_service")
+def test_ensure_tabs_creates_only_missing_tabs(mock_auth_service, g_handler):
+    """Test that missing tabs are created in a single batchUpdate request."""
+    mock_service = MagicMock()
+    g_handler.service = mock_service
+    mock_service.spreadsheets().get.return_value.execute.return_value = {
+        "sheets": [{"properties": {"title": "wydatki_2024"}}]
+    }
+
+    created = g_handler.ensure_tabs(["wydatki_2024", "wydatki_2025"])
+
+    assert created == ["wydatki_2025"]
+    mock_service.spreadsheets().batchUpdate.assert_called_once_with(
+        spreadsheetId=SPREADSHEET_ID,
+        body={"requests": [{"addSheet": {"properties": {"title": "wydatki_2025"}}}]},
+    )
+
+
+@patch("src.handlers.google_sheets_handler.GoogleSheetsHandler._authenticate_service")
+def test_read_tabs(mock_auth_service, g_handler):
+    """Test that all tabs are read with a single batchGet request."""
+    mock_service = MagicMock()
+    g_handler.service = mock_service
+    mock_batch_get = mock_service.spreadsheets().values().batchGet
+    mock_batch_get.return_value.execute.return_value = {"valueRanges": [{"values": DATA_MOCK}, {}]}
+
+    result = g_handler.read_tabs(["wydatki_2024", "wydatki_2025"])
+
+    assert result == {"wydatki_2024": DATA_MOCK, "wydatki_2025": []}
+    mock_batch_get.assert_called_once_with(
+        spreadsheetId=SPREADSHEET_ID, ranges=["'wydatki_2024'!G2:M", "'wydatki_2025'!G2:M"]
+    )
+
+
+@patch("src.handlers.google_sheets_handler.GoogleSheetsHandler._authenticate_service")
+def test_append_transactions_by_tab(mock_auth_service, g_handler):
+    """Test that rows of several tabs are written below the existing rows in one batchUpdate request."""
+    mock_service = MagicMock()
+    g_handler.service = mock_service
+    rows_by_tab = {"wydatki_2024": [["a"]], "wydatki_2025": [["b"], ["c"]]}
+
+    g_handler.append_transactions_by_tab(rows_by_tab, {"wydatki_2024": DATA_MOCK})
+
+    mock_service.spreadsheets().values().batchUpdate.assert_called_once_with(
+        spreadsheetId=SPREADSHEET_ID,
+        body={
+            "valueInputOption": "RAW",
+            "data": [
+                {"range": "'wydatki_2024'!G4:M4", "values": [["a"]]},
+                {"range": "'wydatki_2025'!G2:M3", "values": [["b"], ["c"]]},
+            ],
+        },
+    )
+
+
+@patch("src.handlers.google_sheets_handler.GoogleSheetsHandler._authenticate_service")
+def test_read_columns(mock_auth_service, g_handler):
+    """Test that only the requested columns are read, unformatted and column-major."""
+    mock_service = MagicMock()
+    g_handler.service = mock_service
+    mock_batch_get = mock_service.spreadsheets().values().batchGet
+    mock_batch_get.return_value.execute.return_value = {"valueRanges": [{"values": [[1, 2]]}, {"values": [[5.5, 7]]}]}
+
+    result = g_handler.read_columns(["B", "D"], RANGE_NAME)
+
+    assert result == {"B": [1, 2], "D": [5.5, 7]}
+    mock_batch_get.assert_called_once_with(
+        spreadsheetId=SPREADSHEET_ID,
+        ranges=[f"{SHEET_NAME}!B10:B", f"{SHEET_NAME}!D10:D"],
+        majorDimension="COLUMNS",
+        valueRenderOption="UNFORMATTED_VALUE",
+        fields="valueRanges.values",
+    )
+
+
+@patch("src.handlers.google_sheets_handler.GoogleSheetsHandler._authenticate_service")
+def test_read_ids(mock_auth_service, g_handler):
+    """Test that IDs are read from the first column only and normalized to strings."""
+    mock_service = MagicMock()
+    g_handler.service = mock_service
+    mock_batch_get = mock_service.spreadsheets().values().batchGet
+    mock_batch_get.return_value.execute.return_value = {"valueRanges": [{"values": [[12.0, "abc-1", 3]]}]}
+
+    assert g_handler.read_ids(RANGE_NAME) == ["12", "abc-1", "3"]
+    assert mock_batch_get.call_args.kwargs["ranges"] == [f"{SHEET_NAME}!B10:B"]
+
+
+@pytest.mark.parametrize(
+    "range_name, column, expected_range",
+    [
+        ("wydatki_2025!G2:M", "G", "wydatki_2025!G2:G"),
+        ("Sheet1!B10:G200", "D", "Sheet1!D10:D200"),
+        ("A1:C", "B", "B1:B"),
+    ],
+)
+def testproject_range(range_name, column, expected_range):
+    """Test narrowing a range to a single column."""
+    assert GoogleSheetsHandler.project_range(range_name, column) == expected_range
+
+
+def test_build_row_ranges_merges_consecutive_rows(g_handler):
+    """Test that consecutive rows are written as one range and gaps start a new one."""
+    data = g_handler.build_row_ranges({5: ["a"], 3: ["b"], 4: ["c"], 9: ["d"]}, "wydatki_2025!G2:M")
+
+    assert data == [
+        {"range": "wydatki_2025!G3:M5", "values": [["b"], ["c"], ["a"]]},
+        {"range": "wydatki_2025!G9:M9", "values": [["d"]]},
+    ]
+
+
+@pytest.mark.parametrize("letter, index", [("A", 0), ("N", 13), ("Z", 25), ("AA", 26), ("AZ", 51)])
+def test_column_letter_round_trip(letter, index):
+    """Test converting between column letters and indexes."""
+    assert GoogleSheetsHandler.column_index(letter) == index
+    assert GoogleSheetsHandler.column_letter(index) == letter
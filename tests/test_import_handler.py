@@ -0,0 +1,41 @@
+import pytest
+
+from src.handlers.import_handler import ImportHandler, IMPORT_ID_PREFIX
+from src.utils.category_resolver import CategoryResolver
+from src.utils.error_handling import TransactionProcessingError
+from src.utils.fomatter import Formatter
+
+
+def test_load_csv_generates_stable_ids(tmp_path):
+    """Test that CSV records are validated, aliased and given IDs that survive a re-import."""
+    file_path = tmp_path / "adjustments.csv"
+    file_path.write_text("description;amount;category;date;who\n"
+                         "Coffee;-12,50;Dining;2025-01-20;Ala\n"
+                         "Coffee;-12,50;Dining;2025-01-20;Ala\n"
+                         "Refund;7.5;inne;2025-01-21;\n", encoding='utf-8')
+
+    resolver = CategoryResolver({'Dining': 'przyjemności'})
+    rows = ImportHandler.load(str(file_path), resolver)
+
+    assert [row[0] for row in rows] == [row[0] for row in ImportHandler.load(str(file_path), resolver)]
+    assert len({row[0] for row in rows}) == 3 and rows[0][0].startswith(IMPORT_ID_PREFIX)
+    assert [row[1:4] + row[5:] for row in rows] == [
+        ('Coffee', -12.5, 'przyjemności', 'Ala'), ('Coffee', -12.5, 'przyjemności', 'Ala'), ('Refund', 7.5, 'inne', '')]
+    assert Formatter.format_timestamp(rows[2][4]) == '2025-01-21'
+
+
+def test_load_jsonl_reports_every_invalid_record(tmp_path):
+    """Test that all invalid records are reported together and nothing is returned."""
+    file_path = tmp_path / "adjustments.jsonl"
+    file_path.write_text('{"id": "a1", "opis": "Rent", "kwota": 1500, "kategoria": "rachunki", "data": "2025-02-01"}\n'
+                         '{"description": "Gift", "amount": "x", "category": "inne", "date": "2025-02-02"}\n'
+                         '{"description": "Gym", "amount": 10, "category": "sport!", "date": "2025-02-30"}\n',
+                         encoding='utf-8')
+
+    with pytest.raises(TransactionProcessingError) as error:
+        ImportHandler.load(str(file_path))
+
+    message = str(error.value)
+    assert message.startswith("2 invalid records")
+    assert "adjustments.jsonl:2: Invalid amount: 'x'" in message
+    assert "adjustments.jsonl:3: unknown category 'sport!'" in message
@@ -0,0 +1,67 @@
+import io
+import json
+import logging
+
+from src.transaction_exporter import TransactionExporter
+from src.utils.logger import create_queue_handler, JsonFormatter, LogSampler, PayloadCapFilter
+
+
+def _capture(logger: logging.Logger, stream: io.StringIO):
+    """Routes a logger at DEBUG through a queue handler writing JSON to `stream`."""
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(JsonFormatter())
+    queue_handler, listener = create_queue_handler(stream_handler)
+    logger.addHandler(queue_handler)
+    return queue_handler, listener
+
+
+def test_json_records_are_capped_and_carry_extra_fields():
+    """Test that logged row lists are shortened and extra fields end up in the JSON record."""
+    logger = logging.getLogger('test_logger.capped')
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    logger.addFilter(PayloadCapFilter(max_length=50))
+    stream = io.StringIO()
+    queue_handler, listener = _capture(logger, stream)
+
+    logger.debug("Appending transactions: %s", [['1', 'Bus', '2,50']] * 1000, extra={'rows': 1000})
+    logger.info("x" * 100)
+    listener.stop()
+    logger.removeHandler(queue_handler)
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first['rows'] == 1000 and first['level'] == 'DEBUG'
+    assert len(first['message']) < 250 and first['message'].endswith('...]')
+    assert second['message'] == "x" * 50 + "... [50 characters cut]"
+
+
+def test_log_sampler():
+    """Test that the first event and then every n-th one is let through."""
+    sampler = LogSampler(every=3)
+
+    assert [sampler() for _ in range(7)] == [True, False, False, True, False, False, True]
+
+
+def test_debug_logging_formats_a_bounded_number_of_records(exporter):
+    """Test that mapping 100k rows, a tenth of them invalid, with DEBUG queue logging formats only a few records."""
+    rows = [(i, f'Row {i}', 1.5, 'Transport', 1672617600) if i % 10 else (i, 'Bad', None, 'Transport', None)
+            for i in range(100_000)]
+    logger = TransactionExporter.get_logger()
+    level, propagate = logger.level, logger.propagate
+
+    stream = io.StringIO()
+    queue_handler, listener = _capture(logger, stream)
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    try:
+        mapped = exporter.process_rows(rows)
+    finally:
+        listener.stop()
+        logger.removeHandler(queue_handler)
+        logger.setLevel(level)
+        logger.propagate = propagate
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(mapped) == 90_000
+    assert sum(record['message'].startswith('Skipping row') for record in records) == 10  # Sampled from 10k skips
+    assert len(records) <= 15  # The skips and a few summary lines, however many rows are skipped
@@ -1,14 +1,24 @@
-import sys
+import shutil
+import sqlite3
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
-from main import add_custom, fetch_and_append
+import pytest
+
+from config import CSV_DELIMITER, MY_DEFAULT_RANGE, SNAPSHOT_DIFF_COLUMNS, SNAPSHOT_DIFF_FILE
+from main import add_custom, build_parser, fetch_and_append, main
 from main import fetch_and_export
+from src.handlers.csv_handler import CSVHandler
+from src.handlers.db_handler import DBHandler
+from src.handlers.sheets_emulator import SheetsEmulator
+
+ADD_ARGS = ['add', '--description', 'wyrównanie', '--amount', '-7.5', '--category', 'przyjemności',
+            '--date', '2025-01-20', '--who', 'Michał', '--who', 'Daga']
 
 
 @patch('src.handlers.google_sheets_handler.GoogleSheetsHandler.append_transactions')
 def test_add_custom(mock_append_transactions):
-    add_custom()
+    add_custom(build_parser().parse_args(ADD_ARGS))
     mock_append_transactions.assert_called_once()
 
     res, args = mock_append_transactions.call_args
@@ -67,9 +77,10 @@ def test_fetch_and_append():
         fetch_and_append()
 
         # Assertions
-        MockFileHandler.get_db_directory.assert_called_once_with(sys.argv)
+        MockFileHandler.get_db_directory.assert_called_once_with(None)
         MockFileHandler.find_latest_sql_file.assert_called_once_with('/mock/db_directory')
-        mock_exporter_instance.fetch_and_append.assert_called_once_with('/mock/latest_db_file.sql', mock_gs_handler)
+        mock_exporter_instance.fetch_and_append.assert_called_once_with('/mock/latest_db_file.sql', mock_gs_handler,
+                                                                        None)
 
 
 def test_fetch_and_append_with_real_instance(tmp_path):
@@ -85,3 +96,131 @@ def test_fetch_and_append_with_real_instance(tmp_path):
         fetch_and_append()
 
         mock_fetch_and_append.assert_called_once()
+
+
+def test_main_defaults_to_sync_sheets():
+    with patch('main.fetch_and_append') as mock_fetch_and_append:
+        main(['/mock/db_directory', '--batch-size', '50'])
+
+        args = mock_fetch_and_append.call_args[0][0]
+        assert args.command == 'sync-sheets'
+        assert args.db_directory == '/mock/db_directory'
+        assert args.batch_size == 50
+
+
+def test_main_runs_every_selected_sink(tmp_path):
+    with patch('main.fetch_and_append') as mock_fetch_and_append, \
+            patch('main.fetch_and_export') as mock_fetch_and_export:
+        main(['export-csv', '--sinks', 'csv', 'sheets', '--workers', '2', '--output-dir', str(tmp_path)])
+
+        mock_fetch_and_append.assert_called_once()
+        mock_fetch_and_export.assert_called_once()
+
+
+def test_max_memory_rejects_options_holding_their_working_set(capsys):
+    with patch('main.sync') as mock_sync, pytest.raises(SystemExit):
+        main(['sync-sheets', '--max-memory', '16', '--sheet-index', '--checkpoint'])
+
+    mock_sync.assert_not_called()
+    assert "--max-memory cannot be combined with --checkpoint, --sheet-index" in capsys.readouterr().err
+
+
+def test_dry_run_prints_diff_without_authenticating(tmp_path, capsys):
+    with patch('main.FileHandler') as MockFileHandler, \
+            patch('main.GoogleSheetsHandler') as MockGoogleSheetsHandler, \
+            patch('main.TransactionExporter') as MockTransactionExporter:
+        MockFileHandler.get_output_directory.return_value = str(tmp_path)
+        mock_exporter_instance = MockTransactionExporter.return_value
+        mock_exporter_instance.define_file_paths.return_value = {'history_file': str(tmp_path / 'history.csv')}
+        mock_exporter_instance.preview_new_transactions.return_value = (
+            [['1', 'Groceries', '50,00', 'spożywcze', '2025-01-02']], {'fetch': 0.001, 'diff': 0.0, 'map': 0.002})
+
+        main(['sync-sheets', '--dry-run', '--date-from', '2025-01-01', '--date-to', '2025-01-31'])
+
+        MockGoogleSheetsHandler.assert_not_called()
+        mock_exporter_instance.fetch_and_append.assert_not_called()
+        assert MockTransactionExporter.call_args.kwargs['date_to'] == '2025-01-31'
+        output = capsys.readouterr().out
+        assert '1\tGroceries\t50,00\tspożywcze\t2025-01-02' in output
+        assert '1 new transactions' in output
+        assert 'map: 2.0 ms' in output
+
+
+def test_household_backups_are_passed_to_the_exporter(tmp_path):
+    phone_dir = tmp_path / "olek"
+    phone_dir.mkdir()
+    latest_backup = phone_dir / "cashew-2025-01-02-10-00-00-000Z.sql"
+    latest_backup.touch()
+    (phone_dir / "cashew-2025-01-01-10-00-00-000Z.sql").touch()
+    ala_backup = tmp_path / "ala.sql"
+    ala_backup.touch()
+
+    with patch('main.TransactionExporter') as MockTransactionExporter:
+        main(['export-csv', '--output-dir', str(tmp_path), '--household', f'Ala={ala_backup}',
+              '--household', f'Olek={phone_dir}'])
+
+        assert MockTransactionExporter.call_args.args[0] == str(ala_backup)
+        assert MockTransactionExporter.call_args.kwargs['sources'] == {'Ala': str(ala_backup),
+                                                                       'Olek': str(latest_backup)}
+
+
+def test_batch_syncs_profiles_with_one_read_per_backup(test_db, tmp_path, capsys):
+    backup_dir = tmp_path / "backups"
+    backup_dir.mkdir()
+    shutil.copy(test_db, backup_dir / "cashew-2025-01-02-10-00-00-000Z.sql")
+    (tmp_path / "empty").mkdir()
+    settings_file = tmp_path / "budget_sync.toml"
+    settings_file.write_text(f"""
+date_filter = "2022-12-31"
+db_directory = "{backup_dir}"
+
+[profiles.ala]
+spreadsheet_id = "ala-sheet"
+
+[profiles.olek]
+spreadsheet_id = "olek-sheet"
+date_to = "2023-01-02"
+
+[profiles.broken]
+db_directory = "{tmp_path / 'empty'}"
+""", encoding='utf-8')
+    state_file = str(tmp_path / "sheets.json")
+
+    with patch.object(DBHandler, 'fetch_transactions', wraps=DBHandler.fetch_transactions) as mock_fetch, \
+            pytest.raises(SystemExit):
+        main(['batch', '--config', str(settings_file), '--sheets-emulator', state_file, '--parallel', '2'])
+
+    assert mock_fetch.call_count == 1
+    emulator = SheetsEmulator(persist_path=state_file)
+    tab = MY_DEFAULT_RANGE.split('!')[0]
+    assert [row[6] for row in emulator.tab_rows("ala-sheet", tab) if len(row) > 6] == ['1', '2', '3', '4']
+    assert [row[6] for row in emulator.tab_rows("olek-sheet", tab) if len(row) > 6] == ['1', '2']
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split('\t')[:2] for line in lines[:3]] == [['ala', 'ok'], ['olek', 'ok'], ['broken', 'failed']]
+    assert lines[3] == "2 of 3 profiles synced"
+
+
+def test_snapshot_diff_compares_the_two_latest_backups(test_db, tmp_path, capsys):
+    backup_dir = tmp_path / "backups"
+    backup_dir.mkdir()
+    shutil.copy(test_db, backup_dir / "cashew-2025-01-01-10-00-00-000Z.sql")
+    shutil.copy(test_db, backup_dir / "cashew-2025-01-02-10-00-00-000Z.sql")
+    latest = backup_dir / "cashew-2025-01-03-10-00-00-000Z.sql"
+    shutil.copy(test_db, latest)
+    with sqlite3.connect(latest) as conn:
+        conn.execute("DELETE FROM transactions WHERE transaction_pk = 3")
+        conn.execute("UPDATE transactions SET amount = 3.0 WHERE transaction_pk = 2")
+        conn.execute("INSERT INTO transactions VALUES (5, 'Taxi', 30.0, '4', 1672876800)")
+
+    main(['diff', str(backup_dir), '--snapshot', '--date-from', '2023-01-01'])
+    main(['diff', str(backup_dir), '--snapshot', '--date-from', '2023-01-01', '--sinks', 'csv',
+          '--output-dir', str(tmp_path)])
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == CSV_DELIMITER.join(SNAPSHOT_DIFF_COLUMNS)
+    assert sorted(lines[1:4]) == [
+        'added\t5\tTaxi\t30,00\ttransport\t2023-01-05\t\t\t\t',
+        'modified\t2\tBus Ticket\t3,00\ttransport\t2023-01-02\tBus Ticket\t2,50\ttransport\t2023-01-02',
+        'removed\t3\tTherapy21\t100,00\tinne\t2023-01-03\t\t\t\t']
+    assert lines[4] == lines[5] == "1 added, 1 removed, 1 modified"
+    assert len(CSVHandler.read_existing_csv(str(tmp_path / SNAPSHOT_DIFF_FILE))) == 3
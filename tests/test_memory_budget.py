@@ -0,0 +1,41 @@
+from src.utils.memory_budget import MemoryBudget, MemoryReport, SpillingIdSet
+
+
+def test_id_set_spills_beyond_its_budget():
+    """Test that IDs beyond the budget move to the temporary table and are still found."""
+    with SpillingIdSet(max_bytes=4096) as ids:
+        ids.update(str(i) for i in range(1000))
+        ids.add('5')
+
+        assert ids.spilled
+        assert len(ids) == 1000
+        assert all(str(i) in ids for i in range(0, 1000, 7))
+        assert '1000' not in ids
+
+    assert SpillingIdSet(max_bytes=2**20).update(['a']).spilled is False
+
+
+def test_row_buffer_streams_rows_back_in_order():
+    """Test that a spilled buffer returns every row in insertion order, as many times as it is read."""
+    rows = [[str(i), f'Row {i}', '1,50', 'transport', '2023-01-02'] for i in range(500)]
+    with MemoryBudget(8192).row_buffer() as buffer:
+        buffer.extend(rows[:300])
+        buffer.extend(rows[300:])
+
+        assert buffer.spilled
+        assert len(buffer) == 500
+        assert list(buffer) == rows
+        assert list(buffer) == rows
+
+
+def test_memory_report_measures_every_stage():
+    """Test that each stage records a peak RSS at least as high as its starting RSS."""
+    report = MemoryReport()
+    with report.stage('allocate'):
+        block = bytearray(16 * 2**20)
+    del block
+
+    [stage] = report.stages
+    assert stage.stage == 'allocate'
+    assert stage.peak_rss >= stage.rss_before > 0
+    assert report.format()[0].startswith('allocate\tpeak ')
@@ -0,0 +1,41 @@
+import pytest
+
+from src.handlers.mirror_handler import MirrorHandler, SINK_CSV, SINK_SHEETS
+
+ROWS = [['1', 'Bus', '2,50', 'transport', '2023-01-02'],
+        ['2', 'Therapy', '100,00', 'inne', '2023-01-03'],
+        ['3', 'Taxi', '30,00', 'transport', '2023-02-01', 'Ala']]
+
+
+def test_upsert_only_writes_new_and_changed_rows(tmp_path):
+    """Test that unchanged rows are not rewritten and exports are recorded per sink."""
+    with MirrorHandler(str(tmp_path / 'mirror.sqlite')) as mirror:
+        assert mirror.upsert(ROWS, SINK_CSV) == 3
+        assert mirror.upsert(ROWS[:1] + [['2', 'Therapy', '90,00', 'inne', '2023-01-03']], SINK_CSV) == 1
+
+        assert mirror.exported_ids(SINK_CSV) == {'1', '2', '3'}
+        assert not mirror.has_exports(SINK_SHEETS)
+
+
+def test_malformed_rows_are_recorded_as_exported_but_not_mirrored(tmp_path):
+    """Test that seeding from a sheet with a short row and a non-numeric amount keeps the valid rows."""
+    sheet_rows = ROWS + [['4', 'Note'], ['5', 'Typo', 'n/a', 'inne', '2023-01-04']]
+    with MirrorHandler(str(tmp_path / 'mirror.sqlite')) as mirror:
+        assert mirror.upsert(sheet_rows, SINK_SHEETS) == 3
+
+        assert mirror.exported_ids(SINK_SHEETS) == {'1', '2', '3', '4', '5'}
+        assert mirror.total_cents() == 13250
+
+
+def test_totals_and_filters(tmp_path):
+    """Test grouped totals in cents and the date, category and person filters."""
+    with MirrorHandler(str(tmp_path / 'mirror.sqlite')) as mirror:
+        mirror.upsert(ROWS)
+
+        assert mirror.totals('month') == [('2023-01', 10250, 2), ('2023-02', 3000, 1)]
+        assert mirror.totals('category', date_to='2023-01-31') == [('inne', 10000, 1), ('transport', 250, 1)]
+        assert mirror.total_cents(category='transport') == 3250
+        assert mirror.total_cents(who='Ala', date_from='2023-02-01') == 3000
+        assert mirror.total_cents(date_from='2024-01-01') == 0
+        with pytest.raises(ValueError):
+            mirror.totals('year')
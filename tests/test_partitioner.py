@@ -0,0 +1,37 @@
+from datetime import date
+
+import pytest
+
+from src.utils.enums import Period
+from src.utils.partitioner import DatePartitioner, Partition
+
+
+def test_split_by_month_covers_whole_months():
+    """Test that a range is split into calendar months, including across a year boundary."""
+    partitions = DatePartitioner.split(date(2024, 11, 15), date(2025, 1, 3), Period.MONTH)
+
+    assert partitions == [
+        Partition('2024-11', date(2024, 11, 1), date(2024, 12, 1)),
+        Partition('2024-12', date(2024, 12, 1), date(2025, 1, 1)),
+        Partition('2025-01', date(2025, 1, 1), date(2025, 2, 1)),
+    ]
+
+
+@pytest.mark.parametrize(
+    "period, expected_keys",
+    [
+        (Period.DAY, ['2025-02-27', '2025-02-28', '2025-03-01']),
+        (Period.YEAR, ['2025']),
+    ],
+)
+def test_split_by_other_periods(period, expected_keys):
+    """Test day and year partitions."""
+    partitions = DatePartitioner.split(date(2025, 2, 27), date(2025, 3, 1), period)
+
+    assert [partition.key for partition in partitions] == expected_keys
+    assert all(left.end == right.start for left, right in zip(partitions, partitions[1:]))
+
+
+def test_split_rejects_reversed_range():
+    with pytest.raises(ValueError):
+        DatePartitioner.split(date(2025, 2, 1), date(2025, 1, 1), Period.MONTH)
@@ -0,0 +1,77 @@
+import sqlite3
+import tracemalloc
+
+import pytest
+
+from conftest import INSERT_TEST_TRANSACTIONS
+from src.handlers.db_handler import DBHandler
+from src.transaction_exporter import TransactionExporter
+from src.utils.row_pipeline import RowPipeline
+
+
+def test_pipeline_matches_the_row_mapping(test_db):
+    """Test that streamed, filtered and mapped batches give the rows of the list-based path, in order."""
+    exporter = TransactionExporter(test_db)
+    transactions = DBHandler.fetch_transactions(test_db, '2023-01-02') + [(9, 'Bad', None, '4', None)]
+    known = {'3'}
+
+    batches = list(DBHandler.iter_transactions(test_db, '2023-01-02', batch_size=2))
+    streamed = list(RowPipeline.rows(exporter.map_batches(
+        RowPipeline.drop_known(batches + [[(9, 'Bad', None, '4', None)]], known))))
+
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert streamed == exporter.process_rows([row for row in transactions if str(row[0]) not in known])
+    assert streamed == [['2', 'Bus Ticket', '2,50', 'transport', '2023-01-02'],
+                        ['4', 'Thing', '25,00', 'inne', '2023-01-04']]
+
+
+def test_batches_are_read_lazily(test_db):
+    """Test that the pipeline pulls one database batch per mapped batch instead of reading the backup up front."""
+    with sqlite3.connect(test_db) as conn:
+        conn.executemany(INSERT_TEST_TRANSACTIONS, [(i, f'Row {i}', 1.5, '4', 1672617600 + i) for i in range(100, 350)])
+    exporter = TransactionExporter(test_db)
+    pulled = []
+
+    def counted(batches):
+        for batch in batches:
+            pulled.append(len(batch))
+            yield batch
+
+    known = {str(i) for i in range(100, 200)}
+    mapped = exporter.map_batches(RowPipeline.drop_known(
+        counted(DBHandler.iter_transactions(test_db, '2023-01-02', batch_size=100)), known))
+
+    assert pulled == []
+    first = next(mapped)
+    assert len(pulled) < 3
+    assert len(first) + sum(len(batch) for batch in mapped) == 153
+    assert pulled == [100, 100, 53]
+
+
+@pytest.mark.benchmark
+def test_streaming_peak_memory_benchmark(test_db):
+    """Benchmark the peak memory of deduplicating 50k rows, 90% already exported: fetchall and copy vs streaming."""
+    with sqlite3.connect(test_db) as conn:
+        conn.executemany(INSERT_TEST_TRANSACTIONS,
+                         [(i, f'Row {i}', 1.5, '4', 1672617600 + i) for i in range(100, 50_100)])
+    known = {str(i) for i in range(100, 45_100)}
+    exporter = TransactionExporter(test_db)
+
+    def fetch_all():
+        transactions = DBHandler.fetch_transactions(test_db, '2023-01-02')
+        new_transactions = [tuple(row) for row in transactions if str(row[0]) not in known]
+        return [list(exporter.map_row(row).values()) for row in new_transactions]
+
+    def stream():
+        batches = RowPipeline.drop_known(DBHandler.iter_transactions(test_db, '2023-01-02'), known)
+        return list(RowPipeline.rows(exporter.map_batches(batches)))
+
+    peaks = {}
+    for name, run in (('fetchall', fetch_all), ('stream', stream)):
+        tracemalloc.start()
+        rows = run()
+        peaks[name] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert len(rows) == 5_003
+
+    assert peaks['stream'] < peaks['fetchall'] / 2
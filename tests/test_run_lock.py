@@ -0,0 +1,61 @@
+import threading
+
+from src.utils.run_lock import RunLock
+
+
+def _run_in_thread(lock: RunLock, action, results: list) -> threading.Thread:
+    thread = threading.Thread(target=lambda: results.append(lock.run(action)))
+    thread.start()
+    return thread
+
+
+def test_overlapping_runs_of_a_job_coalesce_into_one_rerun(tmp_path):
+    """Test that runs of the same job started during a run return at once and cause a single extra run."""
+    lock_files = [str(tmp_path / "output.lock"), str(tmp_path / "sheet.lock")]
+    started, finish = threading.Event(), threading.Event()
+    runs: list = []
+
+    def slow_sync():
+        runs.append(len(runs))
+        started.set()
+        finish.wait(5)
+
+    results: list = []
+    running = _run_in_thread(RunLock(lock_files, "sync-sheets"), slow_sync, results)
+    assert started.wait(5)
+
+    assert RunLock(lock_files, "sync-sheets").run(lambda: runs.append('overlap')) is False
+    assert RunLock(list(reversed(lock_files)), "sync-sheets").run(lambda: runs.append('overlap')) is False
+    finish.set()
+    running.join(5)
+
+    assert results == [True]
+    assert runs == [0, 1]  # The original run, then one rerun for both requests
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["output.lock", "sheet.lock"]
+
+
+def test_a_different_job_waits_for_the_lock(tmp_path):
+    """Test that a run of another job sharing a target waits for the running one instead of coalescing."""
+    lock_files = [str(tmp_path / "output.lock")]
+    started, finish = threading.Event(), threading.Event()
+    events: list = []
+
+    def slow_sync():
+        events.append('export-csv')
+        started.set()
+        finish.wait(5)
+        events.append('export-csv done')
+
+    results: list = []
+    running = _run_in_thread(RunLock(lock_files, "export-csv"), slow_sync, results)
+    assert started.wait(5)
+    waiting = _run_in_thread(RunLock(lock_files, "export-csv --partition month"),
+                             lambda: events.append('partitioned'), results)
+    waiting.join(0.2)
+
+    assert waiting.is_alive()
+    finish.set()
+    running.join(5)
+    waiting.join(5)
+    assert results == [True, True]
+    assert events == ['export-csv', 'export-csv done', 'partitioned']
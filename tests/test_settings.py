@@ -0,0 +1,68 @@
+from datetime import date
+
+import pytest
+
+import config
+from src.handlers.file_handler import FileHandler
+from src.utils.settings import Settings
+
+SETTINGS_TOML = """
+date_filter = "2024-01-01"
+spreadsheet_id = "household-sheet"
+
+[profiles.archive]
+date_filter = "2020-01-01"
+date_to = "2020-12-31"
+default_range = "wydatki_2020!G2:M"
+
+[profiles.work]
+spreadsheet_id = "work-sheet"
+db_file_prefix = "work"
+"""
+
+
+@pytest.fixture
+def settings_file(tmp_path):
+    path = tmp_path / "budget_sync.toml"
+    path.write_text(SETTINGS_TOML, encoding='utf-8')
+    return str(path)
+
+
+def test_profiles_override_the_file_and_environment_overrides_both(settings_file):
+    """Test the precedence: config.py defaults, file top level, profile, then environment variables."""
+    environ = {'BUDGET_SYNC_SPREADSHEET_ID': 'env-sheet', 'BUDGET_SYNC_DATE_TO': ''}
+
+    top_level = Settings.load(settings_file, environ={})
+    archive = Settings.load(settings_file, 'archive', environ=environ)
+
+    assert Settings.profiles(settings_file, environ={}) == ['archive', 'work']
+    assert (top_level.name, top_level.spreadsheet_id) == ('default', 'household-sheet')
+    assert top_level.date_filter == '2024-01-01'
+    assert top_level.timezone == config.TIMEZONE
+    assert (archive.name, archive.spreadsheet_id) == ('archive', 'env-sheet')
+    assert archive.default_range == 'wydatki_2020!G2:M'
+    assert archive.date_bounds == (date(2020, 1, 1), None)
+
+
+def test_invalid_settings_fail_when_loaded(settings_file):
+    """Test that unknown profiles, keys and bad values are rejected up front."""
+    with pytest.raises(ValueError, match="Unknown settings profile"):
+        Settings.load(settings_file, 'missing', environ={})
+    with pytest.raises(ValueError, match="timezone"):
+        Settings.load(settings_file, environ={'BUDGET_SYNC_TIMEZONE': 'Mars/Olympus'})
+    with pytest.raises(ValueError, match="date_filter"):
+        Settings(date_filter='2024-13-01')
+    with pytest.raises(TypeError):
+        Settings(spreadsheet_idd='x')  # type: ignore[call-arg]
+
+
+def test_derived_values_are_cached_per_profile(settings_file, tmp_path):
+    """Test that patterns and the zone are computed once per settings object, and used to find backups."""
+    work = Settings.load(settings_file, 'work', environ={})
+    (tmp_path / "work-2025-01-02-10-00-00-000Z.sql").touch()
+    (tmp_path / "cashew-2025-01-03-10-00-00-000Z.sql").touch()
+
+    assert work.sql_file_name_pattern is work.sql_file_name_pattern
+    assert work.zone is work.zone
+    assert FileHandler.find_latest_sql_file(str(tmp_path), work).endswith("work-2025-01-02-10-00-00-000Z.sql")
+    assert FileHandler.find_latest_sql_file(str(tmp_path), Settings()).endswith("cashew-2025-01-03-10-00-00-000Z.sql")
@@ -0,0 +1,299 @@
+import json
+import os
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from src.handlers.google_sheets_handler import GoogleSheetsHandler
+from src.handlers.mirror_handler import MirrorHandler, SINK_SHEETS
+from src.handlers.sheets_emulator import SheetsEmulator
+from src.transaction_exporter import TransactionExporter
+from src.utils.category_resolver import CategoryResolver
+
+SPREADSHEET_ID = "emulated_spreadsheet_id"
+RANGE_NAME = "wydatki_2025!G2:M"
+
+
+@pytest.fixture
+def emulator():
+    """Creates an emulator with an empty `wydatki_2025` tab."""
+    service = SheetsEmulator()
+    service.add_tab(SPREADSHEET_ID, "wydatki_2025")
+    return service
+
+
+@pytest.fixture
+def emulated_handler(emulator):
+    """Creates a GoogleSheetsHandler backed by the emulator."""
+    return GoogleSheetsHandler(SPREADSHEET_ID, service=emulator)
+
+
+def test_append_and_read_round_trip(emulated_handler, emulator):
+    """Test that appended rows land in the requested columns and can be read back."""
+    emulated_handler.append_transactions([["1", "a", "1,00"], ["2", "b", "2,00"]], RANGE_NAME)
+    emulated_handler.append_transactions([["3", "c", "3,00"]], RANGE_NAME)
+
+    assert emulated_handler.read_transactions(RANGE_NAME) == [["1", "a", "1,00"], ["2", "b", "2,00"],
+                                                              ["3", "c", "3,00"]]
+    assert emulated_handler.read_ids(RANGE_NAME) == ["1", "2", "3"]
+    assert emulated_handler.find_first_empty_row(RANGE_NAME) == "wydatki_2025!G5:M5"
+    assert emulator.tab_rows(SPREADSHEET_ID, "wydatki_2025")[1][6:9] == ["1", "a", "1,00"]
+
+
+def test_tabs_are_created_and_written_in_batches(emulated_handler, emulator):
+    """Test per-tab routing against the emulator, one request per API call type."""
+    emulated_handler.ensure_tabs(["wydatki_2024", "wydatki_2025"])
+    emulated_handler.append_transactions_by_tab({"wydatki_2024": [["1"]], "wydatki_2025": [["2"], ["3"]]})
+
+    assert emulated_handler.read_tabs(["wydatki_2024", "wydatki_2025"]) == {
+        "wydatki_2024": [["1"]], "wydatki_2025": [["2"], ["3"]]}
+    assert emulator.request_counts == {"get": 1, "batchUpdate": 1, "values.batchGet": 2, "values.batchUpdate": 1}
+
+
+def test_quota_errors_are_injected(emulated_handler, emulator):
+    """Test that injected quota errors surface as HTTP 429 errors."""
+    emulator.inject_quota_errors(1)
+
+    with pytest.raises(HttpError) as error:
+        emulated_handler.read_tabs(["wydatki_2025"])
+
+    assert error.value.status_code == 429
+    assert emulated_handler.read_tabs(["wydatki_2025"]) == {"wydatki_2025": []}
+
+
+def test_state_is_persisted(tmp_path):
+    """Test that writes are journaled to the state file without rewriting it, and reloaded into one snapshot."""
+    state_file = str(tmp_path / "sheet.json")
+    emulator = SheetsEmulator(persist_path=state_file)
+    emulator.add_tab(SPREADSHEET_ID, "wydatki_2025")
+    handler = GoogleSheetsHandler(SPREADSHEET_ID, service=emulator)
+    handler.append_transactions([["1", "a"]], RANGE_NAME)
+    with open(state_file, encoding='utf-8') as file:
+        snapshot = file.read()
+
+    for row_id in range(2, 5):
+        handler.append_transactions([[str(row_id), "b"]], RANGE_NAME)
+
+    with open(state_file, encoding='utf-8') as file:
+        journal = file.read()
+    assert journal.startswith(snapshot) and len(journal.splitlines()) == len(snapshot.splitlines()) + 3
+
+    reloaded = GoogleSheetsHandler(SPREADSHEET_ID, service=SheetsEmulator(persist_path=state_file))
+
+    assert reloaded.read_transactions(RANGE_NAME) == [["1", "a"], ["2", "b"], ["3", "b"], ["4", "b"]]
+    with open(state_file, encoding='utf-8') as file:
+        assert len(file.read().splitlines()) == 1
+
+
+def test_sync_large_history_without_network(test_db, emulated_handler, emulator):
+    """Test a full sync against a sheet that already holds many rows."""
+    existing = [[str(i), "old", "1,00", "inne", "2023-01-01"] for i in range(100, 20100)]
+    emulator.add_tab(SPREADSHEET_ID, "wydatki_2025", [[]] + [[""] * 6 + row for row in existing])
+    exporter = TransactionExporter(test_db, date_from="2023-01-02")
+
+    exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+    exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+
+    ids = emulated_handler.read_ids(RANGE_NAME)
+    assert len(ids) == 20003
+    assert ids[-3:] == ["2", "3", "4"]
+
+
+def test_upsert_updates_edited_rows_in_place(test_db, emulated_handler, emulator):
+    """Test that an edited transaction is rewritten in its existing sheet row, with one batchUpdate per run."""
+    exporter = TransactionExporter(test_db, date_from="2023-01-02")
+    exporter.upsert_to_sheet(test_db, emulated_handler, RANGE_NAME)
+
+    with sqlite3.connect(test_db) as conn:
+        conn.execute("UPDATE transactions SET amount = 3.75 WHERE transaction_pk = 2")
+        conn.execute("DELETE FROM transactions WHERE transaction_pk = 4")
+    changes = exporter.upsert_to_sheet(test_db, emulated_handler, RANGE_NAME)
+
+    assert (len(changes.new), len(changes.changed), changes.deleted) == (0, 1, ["4"])
+    assert [row[:3] for row in emulated_handler.read_transactions(RANGE_NAME)] == [
+        ["2", "Bus Ticket", "3,75"], ["3", "Therapy21", "100,00"], ["4", "Thing", "25,00"]]
+    assert emulator.request_counts["values.batchUpdate"] == 2
+    assert exporter.upsert_to_sheet(test_db, emulated_handler, RANGE_NAME).changed == []
+    assert emulator.request_counts["values.batchUpdate"] == 2
+
+
+def test_summary_tab_follows_appends_and_edits(test_db, emulated_handler, emulator):
+    """Test that the summary tab is built once, then updated from the rows each run writes."""
+    exporter = TransactionExporter(test_db, date_from="2023-01-02", summary=True)
+    exporter.upsert_to_sheet(test_db, emulated_handler, RANGE_NAME)
+    assert emulator.tab_rows(SPREADSHEET_ID, "podsumowanie") == [
+        ["miesiąc", "kategoria", "kto", "suma", "liczba"],
+        ["2023-01", "inne", "", "125,00", "2"], ["2023-01", "transport", "", "2,50", "1"],
+        ["#pokrycie", "3", "", "", ""]]
+
+    with sqlite3.connect(test_db) as conn:
+        conn.execute("UPDATE transactions SET category_fk = '2' WHERE transaction_pk = 2")
+    with patch.object(CategoryResolver, '_default_resolver', CategoryResolver({'Groceries': 'spożywcze'})):
+        exporter.upsert_to_sheet(test_db, emulated_handler, RANGE_NAME)
+
+    assert emulator.tab_rows(SPREADSHEET_ID, "podsumowanie")[1:] == [
+        ["2023-01", "inne", "", "125,00", "2"], ["2023-01", "spożywcze", "", "2,50", "1"],
+        ["#pokrycie", "3", "", "", ""]]
+
+
+def test_summary_tab_catches_up_with_rows_written_before_a_crash(test_db, emulated_handler, emulator):
+    """Test that rows appended by a run that stopped before its summary update are summarized by the next run."""
+    exporter = TransactionExporter(test_db, date_from="2023-01-02", summary=True)
+    exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+    emulated_handler.append_transactions([["9", "Taxi", "30,00", "transport", "2023-01-05"]], RANGE_NAME)
+
+    with sqlite3.connect(test_db) as conn:
+        conn.execute("INSERT INTO transactions VALUES (5, 'Bus', 1.5, '4', 1672876800)")
+    exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+
+    assert emulator.tab_rows(SPREADSHEET_ID, "podsumowanie")[1:] == [
+        ["2023-01", "inne", "", "125,00", "2"], ["2023-01", "transport", "", "34,00", "3"],
+        ["#pokrycie", "5", "", "", ""]]
+
+
+def test_checkpointed_backfill_resumes_without_reading_the_sheet(test_db, tmp_path, emulated_handler, emulator):
+    """Test that a backfill failing halfway resumes at its checkpoint and writes every row exactly once."""
+    emulator.add_tab(SPREADSHEET_ID, "wydatki_2025", [[]] + [[""] * 6 + ["100", "old", "1,00", "inne", "2023-01-01"]])
+    checkpoint_file = str(tmp_path / "checkpoint.json")
+    exporter = TransactionExporter(test_db, date_from="2023-01-02", batch_size=1, checkpoint_file=checkpoint_file)
+    write_rows = emulated_handler.write_rows
+
+    def fail_second_write(rows, first_row, range_name=None):
+        if emulator.request_counts.get("values.batchUpdate", 0) == 1:
+            raise emulator._bad_request("Connection reset")
+        write_rows(rows, first_row, range_name)
+
+    with patch.object(emulated_handler, 'write_rows', side_effect=fail_second_write), pytest.raises(HttpError):
+        exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+    with open(checkpoint_file, encoding='utf-8') as file:
+        assert json.load(file)['written'] == 1
+
+    with patch.object(emulated_handler, 'read_ids', wraps=emulated_handler.read_ids) as mock_read_ids:
+        exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+        mock_read_ids.assert_not_called()
+
+    assert emulated_handler.read_ids(RANGE_NAME) == ["100", "2", "3", "4"]
+    assert not os.path.exists(checkpoint_file)
+
+
+def test_failed_append_is_not_mirrored_and_is_retried(test_db, tmp_path, emulated_handler, emulator):
+    """Test that rows of a batch rejected by the API are left out of the mirror, so the next run appends them."""
+    emulator.add_tab(SPREADSHEET_ID, "wydatki_2025", [[]] + [[""] * 6 + ["100", "old", "1,00", "inne", "2023-01-01"]])
+    exporter = TransactionExporter(test_db, date_from="2023-01-02", batch_size=1)
+    exporter.mirror_file = str(tmp_path / "mirror.sqlite")
+    append_transactions = emulated_handler.append_transactions
+
+    def fail_second_append(rows, range_name=None):
+        if emulator.request_counts.get("values.append", 0) == 1:
+            emulator.inject_quota_errors(1)
+        append_transactions(rows, range_name)
+
+    with patch.object(emulated_handler, 'append_transactions', side_effect=fail_second_append), \
+            pytest.raises(HttpError):
+        exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+    with MirrorHandler(exporter.mirror_file) as mirror:
+        assert mirror.exported_ids(SINK_SHEETS) == {"100", "2"}
+
+    exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+
+    assert emulated_handler.read_ids(RANGE_NAME) == ["100", "2", "3", "4"]
+
+
+def test_sheet_index_looks_up_small_deltas(test_db, emulated_handler, emulator):
+    """Test that the ID index replaces the ID column download, and is rebuilt after a write that bypassed it."""
+    existing = [[str(i), "old", "1,00", "inne", "2023-01-01"] for i in range(100, 5100)]
+    emulator.add_tab(SPREADSHEET_ID, "wydatki_2025", [[]] + [[""] * 6 + row for row in existing])
+    exporter = TransactionExporter(test_db, date_from="2023-01-02", sheet_index=True)
+
+    exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)  # Builds the index from the ID column
+    with patch.object(emulated_handler, 'read_ids', wraps=emulated_handler.read_ids) as mock_read_ids:
+        TransactionExporter(test_db, date_from="2022-12-31", sheet_index=True).fetch_and_append(
+            test_db, emulated_handler, RANGE_NAME)
+        mock_read_ids.assert_not_called()
+
+    emulated_handler.append_transactions([["9999", "manual", "1,00", "inne", "2023-01-05"]], RANGE_NAME)
+    exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)  # Stale index: rebuilt, nothing duplicated
+
+    ids = emulated_handler.read_ids(RANGE_NAME)
+    assert ids[5000:] == ["2", "3", "4", "1", "9999"]
+    assert emulator.tab_rows(SPREADSHEET_ID, "_indeks_wydatki_2025")[0] == ["5005", "5007", RANGE_NAME]
+
+
+def test_sheet_index_skips_rows_of_a_failed_append(test_db, emulated_handler, emulator):
+    """Test that a rejected append leaves the ID index untouched, so the next run neither skips nor repeats rows."""
+    emulator.add_tab(SPREADSHEET_ID, "wydatki_2025", [[]] + [[""] * 6 + ["100", "old", "1,00", "inne", "2023-01-01"]])
+    exporter = TransactionExporter(test_db, date_from="2023-01-02", batch_size=1, sheet_index=True)
+    append_transactions = emulated_handler.append_transactions
+
+    def fail_second_append(rows, range_name=None):
+        if emulator.request_counts.get("values.append", 0) == 1:
+            emulator.inject_quota_errors(1)
+        append_transactions(rows, range_name)
+
+    with patch.object(emulated_handler, 'append_transactions', side_effect=fail_second_append), \
+            pytest.raises(HttpError):
+        exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+    assert emulator.tab_rows(SPREADSHEET_ID, "_indeks_wydatki_2025")[0] == ["1", "3", RANGE_NAME]
+
+    exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+
+    assert emulated_handler.read_ids(RANGE_NAME) == ["100", "2", "3", "4"]
+    assert emulator.tab_rows(SPREADSHEET_ID, "_indeks_wydatki_2025")[0] == ["4", "6", RANGE_NAME]
+
+
+def test_sheet_index_reads_the_whole_index_for_large_deltas(test_db, tmp_path, emulated_handler, emulator):
+    """Test that candidates spanning many buckets read the whole index, and that the mirror narrows the candidates."""
+    existing = [[str(i), "old", "1,00", "inne", "2023-01-01"] for i in range(100, 2100)]
+    emulator.add_tab(SPREADSHEET_ID, "wydatki_2025", [[]] + [[""] * 6 + row for row in existing])
+    TransactionExporter(test_db, date_from="2023-01-02", sheet_index=True).fetch_and_append(
+        test_db, emulated_handler, RANGE_NAME)
+
+    exporter = TransactionExporter(test_db, date_from="2022-12-31", sheet_index=True)
+    with patch('src.handlers.google_sheets_handler.SHEET_INDEX_MAX_LOOKUP', 1), \
+            patch.object(emulated_handler, 'read_ids', wraps=emulated_handler.read_ids) as mock_read_ids, \
+            patch.object(emulated_handler, 'read_ranges', wraps=emulated_handler.read_ranges) as mock_read_ranges:
+        exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+        mock_read_ids.assert_not_called()
+        assert mock_read_ranges.call_args_list[0].args[0][1] == "'_indeks_wydatki_2025'!A2:A1025"
+
+        exporter.mirror_file = str(tmp_path / "mirror.sqlite")
+        mock_read_ranges.reset_mock()
+        exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)  # Every fetched ID is in the mirror
+        assert len(mock_read_ranges.call_args_list[0].args[0]) == 1  # Only the index header
+    assert emulated_handler.read_ids(RANGE_NAME)[2000:] == ["2", "3", "4", "1"]
+    assert emulator.tab_rows(SPREADSHEET_ID, "_indeks_wydatki_2025")[0] == ["2004", "2006", RANGE_NAME]
+
+
+def test_sync_within_a_memory_budget(test_db, emulated_handler, emulator):
+    """Test that a budgeted sync reads the ID column in chunks, spills the dedup set and appends the same rows."""
+    existing = [[str(i), "old", "1,00", "inne", "2023-01-01"] for i in range(100, 12100)]
+    emulator.add_tab(SPREADSHEET_ID, "wydatki_2025", [[]] + [[""] * 6 + row for row in existing])
+    exporter = TransactionExporter(test_db, date_from="2023-01-02", max_memory=2**16)
+
+    with patch.object(emulated_handler, 'read_ids', wraps=emulated_handler.read_ids) as mock_read_ids:
+        exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+        exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+
+    assert mock_read_ids.call_count == 2 * 3  # 5000-row chunks
+    assert emulated_handler.read_ids(RANGE_NAME)[12000:] == ["2", "3", "4"]
+    assert [stage.stage for stage in exporter.memory_report.stages] == [
+        "read sheet ids", "fetch and diff", "append", "read sheet ids", "fetch and diff"]
+
+
+def test_budgeted_sync_seeds_the_mirror_in_chunks(test_db, tmp_path, emulated_handler, emulator):
+    """Test that a budgeted sync seeds the mirror from row chunks instead of downloading the whole sheet at once."""
+    existing = [[str(i), "old", "1,00", "inne", "2023-01-01"] for i in range(100, 12100)]
+    emulator.add_tab(SPREADSHEET_ID, "wydatki_2025", [[]] + [[""] * 6 + row for row in existing])
+    exporter = TransactionExporter(test_db, date_from="2023-01-02", max_memory=2**16)
+    exporter.mirror_file = str(tmp_path / "mirror.sqlite")
+
+    with patch.object(emulated_handler, 'read_transactions', wraps=emulated_handler.read_transactions) as mock_read:
+        exporter.fetch_and_append(test_db, emulated_handler, RANGE_NAME)
+
+    assert [call.args[0] for call in mock_read.call_args_list] == [
+        "wydatki_2025!G2:M5001", "wydatki_2025!G5002:M10001", "wydatki_2025!G10002:M15001"]
+    with MirrorHandler(exporter.mirror_file) as mirror:
+        assert len(mirror.exported_ids(SINK_SHEETS)) == 12003
+    assert emulated_handler.read_ids(RANGE_NAME)[12000:] == ["2", "3", "4"]
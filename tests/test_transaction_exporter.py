@@ -1,7 +1,14 @@
+import os
+import sqlite3
 import unittest
 from unittest.mock import patch, MagicMock
 
+import config
+from src.handlers.csv_handler import CSVHandler, JOURNAL_SUFFIX
+from src.handlers.import_handler import ImportHandler
+from src.handlers.mirror_handler import MirrorHandler, SINK_CSV
 from src.transaction_exporter import TransactionExporter
+from src.utils.enums import Period
 
 
 class TestTransactionExporter(unittest.TestCase):
@@ -67,10 +74,53 @@ class TestTransactionExporter(unittest.TestCase):
              ['2', 'Description2', '200,00', 'inne', '2023-10-02']]
         )
 
+    @patch('src.handlers.db_handler.DBHandler.fetch_transactions')
+    def test_fetch_and_append_in_batches(self, mock_fetch_transactions):
+        """
+        Test fetch_and_append splits the new rows into append requests of at most `batch_size` rows.
+        """
+        mock_fetch_transactions.return_value = [
+            (i, f'Description{i}', 10.0, 'transport', 1696118400) for i in range(5)
+        ]
+        sheet_handler_mock = MagicMock()
+        sheet_handler_mock.read_ids.return_value = []
+
+        exporter = TransactionExporter(self.db_file, date_to='2023-12-31', batch_size=2)
+        exporter.fetch_and_append(self.db_file, sheet_handler_mock)
+
+        mock_fetch_transactions.assert_called_once_with(self.db_file, config.DATE_FILTER, '2023-12-31',
+                                                        exporter.settings.zone)
+        self.assertEqual([len(call.args[0]) for call in sheet_handler_mock.append_transactions.call_args_list],
+                         [2, 2, 1])
+
+    @patch('src.handlers.db_handler.DBHandler.fetch_transactions')
+    def test_fetch_and_append_by_tab(self, mock_fetch_transactions):
+        """
+        Test fetch_and_append_by_tab routes new rows to per-year tabs with batched sheet calls.
+        """
+        mock_fetch_transactions.return_value = [
+            (1, 'Description1', 100.0, 'transport', 1696118400),  # 2023-10-01
+            (2, 'Description2', 200.0, 'transport', 1735819200),  # 2025-01-02
+            (3, 'Description3', 300.0, 'transport', 1735905600),  # 2025-01-03
+        ]
+        sheet_handler_mock = MagicMock()
+        existing = {'wydatki_2023': [], 'wydatki_2025': [['2', 'Description2', '200,00', 'transport', '2025-01-02']]}
+        sheet_handler_mock.read_tabs.return_value = existing
+
+        counts = self.exporter.fetch_and_append_by_tab(self.db_file, sheet_handler_mock)
+
+        self.assertEqual(counts, {'wydatki_2023': 1, 'wydatki_2025': 1})
+        sheet_handler_mock.ensure_tabs.assert_called_once_with(['wydatki_2023', 'wydatki_2025'])
+        sheet_handler_mock.append_transactions_by_tab.assert_called_once_with(
+            {'wydatki_2023': [['1', 'Description1', '100,00', 'transport', '2023-10-01']],
+             'wydatki_2025': [['3', 'Description3', '300,00', 'transport', '2025-01-03']]},
+            existing
+        )
+
     @patch('os.path.exists', return_value=False)
-    @patch('src.handlers.csv_handler.CSVHandler.read_existing_csv', return_value=[])
+    @patch('src.handlers.csv_handler.CSVHandler.read_ids', return_value=set())
     @patch('src.handlers.db_handler.DBHandler.fetch_transactions')
-    def test_extract_new_transactions(self, mock_fetch_transactions, mock_read_existing_csv, mock_exists):
+    def test_extract_new_transactions(self, mock_fetch_transactions, mock_read_ids, mock_exists):
         """
         Test extract_new_transactions to ensure it identifies only new transactions.
         """
@@ -86,7 +136,7 @@ class TestTransactionExporter(unittest.TestCase):
         # Verify that all transactions are new
         self.assertEqual(new_transactions, mock_fetch_transactions.return_value)
 
-    @patch('shutil.copy')
+    @patch('src.handlers.csv_handler.CSVHandler.copy_file')
     @patch('os.path.exists', side_effect=lambda x: x == 'history.csv')
     def test_backup_history_file(self, mock_exists, mock_copy):
         """
@@ -97,7 +147,7 @@ class TestTransactionExporter(unittest.TestCase):
 
         self.exporter.backup_history_file(history_file, backup_file)
 
-        # Ensure shutil.copy is called only when the history file exists
+        # Ensure the file is copied only when the history file exists
         mock_copy.assert_called_once_with(history_file, backup_file)
 
     @patch('src.handlers.csv_handler.CSVHandler.rewrite_csv')
@@ -122,3 +172,213 @@ class TestTransactionExporter(unittest.TestCase):
         mock_rewrite_csv.assert_called_once()
         # Ensure new transactions are appended to the history file
         mock_append_csv.assert_called_once()
+
+
+def test_fetch_and_export_partitioned(test_db, tmp_path):
+    """
+    Test that a partitioned export writes one file per period using parallel workers.
+    """
+    exporter = TransactionExporter(test_db, str(tmp_path), date_from='2023-01-02', date_to='2023-01-03')
+
+    counts = exporter.fetch_and_export_partitioned(Period.DAY, workers=2)
+
+    assert counts == {'2023-01-02': 1, '2023-01-03': 1}
+    with open(tmp_path / 'transactions_2023-01-03.csv', encoding='utf-8') as file:
+        lines = file.read().splitlines()
+    assert lines == ['\t'.join(config.COLUMN_ORDER), '3\tTherapy21\t100,00\tinne\t2023-01-03']
+    assert not (tmp_path / 'transactions_2023-01-04.csv').exists()
+
+
+def test_fetch_and_upsert_csv(test_db, tmp_path):
+    """
+    Test that only new and edited transactions are written, and edits supersede older history lines.
+    """
+    exporter = TransactionExporter(test_db, str(tmp_path), date_from='2023-01-02')
+    first = exporter.fetch_and_upsert_csv()
+
+    with sqlite3.connect(test_db) as conn:
+        conn.execute("UPDATE transactions SET name = 'Tram Ticket' WHERE transaction_pk = 2")
+    second = exporter.fetch_and_upsert_csv()
+
+    assert (len(first.new), len(second.new), len(second.changed)) == (3, 0, 1)
+    with open(tmp_path / config.NEW_TRANSACTION_FILE, encoding='utf-8') as file:
+        assert file.read().splitlines()[1:] == ['2\tTram Ticket\t2,50\ttransport\t2023-01-02']
+    with open(tmp_path / config.TRANSACTION_HISTORY_FILE, encoding='utf-8') as file:
+        lines = file.read().splitlines()
+    assert lines.count('\t'.join(config.COLUMN_ORDER)) == 1
+    assert lines[-1] == '2\tTram Ticket\t2,50\ttransport\t2023-01-02'
+    assert exporter.fetch_and_upsert_csv() == ([], [], [], [])
+
+
+def test_fetch_and_export_migrates_to_compressed_history(test_db, tmp_path):
+    """
+    Test that a plain history is converted once when compression is enabled, and later exports dedup against it.
+    """
+    exporter = TransactionExporter(test_db, str(tmp_path), date_from='2023-01-02')
+    exporter.fetch_and_export()
+
+    exporter.settings = exporter.settings.replace(history_compression='gzip')
+    history_file = exporter.define_file_paths()['history_file']
+    with sqlite3.connect(test_db) as conn:
+        conn.execute("INSERT INTO transactions VALUES (5, 'Taxi', 30.0, '4', 1672876800)")
+    exporter.fetch_and_export()
+
+    assert history_file.endswith('.csv.gz')
+    assert [row[0] for row in CSVHandler.read_existing_csv(history_file)] == ['2', '3', '4', '5']
+
+
+def test_preview_reads_the_history_without_writing(test_db, tmp_path):
+    """
+    Test that a dry run dedups against a plain history not yet compressed, and leaves it and its journal alone.
+    """
+    exporter = TransactionExporter(test_db, str(tmp_path), date_from='2023-01-02')
+    exporter.fetch_and_export()
+    plain_file = exporter.define_file_paths()['history_file']
+    open(plain_file + JOURNAL_SUFFIX, 'w').close()
+    exporter.settings = exporter.settings.replace(history_compression='gzip')
+    before = sorted(os.listdir(tmp_path))
+
+    history_file = exporter.readable_history_file(exporter.define_file_paths()['history_file'])
+    rows, _ = exporter.preview_new_transactions(history_file)
+
+    assert history_file == plain_file
+    assert rows == []
+    assert sorted(os.listdir(tmp_path)) == before
+
+
+def test_summary_csv_is_updated_incrementally(test_db, tmp_path):
+    """
+    Test that the summary CSV is built from the history once, then updated with each run's new rows.
+    """
+    exporter = TransactionExporter(test_db, str(tmp_path), date_from='2023-01-02', summary=True)
+    exporter.fetch_and_export()
+    with sqlite3.connect(test_db) as conn:
+        conn.execute("INSERT INTO transactions VALUES (5, 'Taxi', 30.0, '4', 1672876800)")
+    exporter.fetch_and_export()
+
+    file_paths = exporter.define_file_paths()
+    summary_file = file_paths['summary_file']
+    expected = [['2023-01', 'inne', '', '125,00', '2'], ['2023-01', 'transport', '', '32,50', '2'],
+                [config.SUMMARY_MARK_LABEL, str(os.path.getsize(file_paths['history_file'])), '', '', '']]
+    assert CSVHandler.read_existing_csv(summary_file) == expected
+
+    os.remove(summary_file)
+    exporter.update_summary_csv(file_paths, [])
+    assert CSVHandler.read_existing_csv(summary_file) == expected
+
+
+def test_summary_csv_catches_up_with_rows_appended_before_a_crash(test_db, tmp_path):
+    """
+    Test that history rows appended by a run that stopped before its summary update are summarized by the next run.
+    """
+    exporter = TransactionExporter(test_db, str(tmp_path), date_from='2023-01-02', summary=True)
+    exporter.fetch_and_export()
+    file_paths = exporter.define_file_paths()
+    CSVHandler.append_to_csv(file_paths['history_file'], config.COLUMN_ORDER,
+                             [['9', 'Taxi', '30,00', 'transport', '2023-01-05']], journal=True)
+
+    with sqlite3.connect(test_db) as conn:
+        conn.execute("INSERT INTO transactions VALUES (5, 'Bus', 1.5, '4', 1672876800)")
+    exporter.fetch_and_export()
+
+    assert CSVHandler.read_existing_csv(file_paths['summary_file'])[:-1] == [
+        ['2023-01', 'inne', '', '125,00', '2'], ['2023-01', 'transport', '', '34,00', '3']]
+
+
+def test_fetch_and_export_dedups_through_mirror(test_db, tmp_path):
+    """
+    Test that the mirror is seeded from an existing history once, then replaces reading the history back.
+    """
+    exporter = TransactionExporter(test_db, str(tmp_path), date_from='2023-01-02')
+    exporter.fetch_and_export()
+
+    exporter.mirror_file = str(tmp_path / config.MIRROR_FILE)
+    with sqlite3.connect(test_db) as conn:
+        conn.execute("INSERT INTO transactions VALUES (5, 'Taxi', 30.0, '4', 1672876800)")
+    with patch.object(TransactionExporter, 'extract_new_transactions') as mock_extract:
+        exporter.fetch_and_export()
+        exporter.fetch_and_export()
+
+    mock_extract.assert_not_called()
+    history = CSVHandler.read_existing_csv(exporter.define_file_paths()['history_file'])
+    assert [row[0] for row in history] == ['2', '3', '4', '5']
+    with MirrorHandler(exporter.mirror_file) as mirror:
+        assert mirror.exported_ids(SINK_CSV) == {'2', '3', '4', '5'}
+
+
+def test_fetch_and_export_household(test_db, tmp_path):
+    """
+    Test that a household export writes one merged stream with the owner after the exported columns.
+    """
+    exporter = TransactionExporter(test_db, str(tmp_path), date_from='2023-01-02', date_to='2023-01-02',
+                                   sources={'Ala': test_db, 'Olek': test_db})
+    exporter.fetch_and_export()
+
+    with open(tmp_path / config.NEW_TRANSACTION_FILE, encoding='utf-8') as file:
+        assert file.read().splitlines()[1:] == ['2\tBus Ticket\t2,50\ttransport\t2023-01-02\tAla']
+
+
+def test_household_csv_round_trip(test_db, tmp_path):
+    """
+    Test that household CSV files carry the person under a `kto` header, and that reading them back dedups the rows.
+    """
+    exporter = TransactionExporter(test_db, str(tmp_path), date_from='2023-01-02',
+                                   sources={'Ala': test_db}, imported=[('import-1', 'Cash', 5.0, '4', 1672617600, '')])
+    exporter.fetch_and_export()
+    history_file = exporter.define_file_paths()['history_file']
+
+    with open(history_file, encoding='utf-8') as file:
+        lines = file.read().splitlines()
+    assert lines[0] == '\t'.join(config.HOUSEHOLD_COLUMN_ORDER)
+    assert lines[1:] == ['2\tBus Ticket\t2,50\ttransport\t2023-01-02\tAla', '3\tTherapy21\t100,00\tinne\t2023-01-03\tAla',
+                         '4\tThing\t25,00\tinne\t2023-01-04\tAla', 'import-1\tCash\t5,00\tinne\t2023-01-02\t']
+    assert set(TransactionExporter._latest_history_rows(history_file)) == {'2', 'import-1', '3', '4'}
+
+    changes = exporter.fetch_and_upsert_csv()
+    assert (changes.new, changes.changed) == ([], [])
+
+
+def test_imported_rows_are_merged_into_the_sheet_append(test_db, tmp_path):
+    """
+    Test that imported custom transactions are appended with the database rows in one request, and only once.
+    """
+    file_path = tmp_path / "adjustments.jsonl"
+    file_path.write_text('{"description": "Cash", "amount": "-20,00", "category": "inne", "date": "2023-01-02"}\n'
+                         '{"description": "Old", "amount": 5, "category": "inne", "date": "2022-12-01"}\n',
+                         encoding='utf-8')
+    sheet_handler = MagicMock()
+    sheet_handler.read_ids.return_value = []
+    exporter = TransactionExporter(test_db, str(tmp_path), date_from='2023-01-02',
+                                   imported=ImportHandler.load(str(file_path)))
+
+    exporter.fetch_and_append(test_db, sheet_handler)
+
+    rows = sheet_handler.append_transactions.call_args.args[0]
+    sheet_handler.append_transactions.assert_called_once()
+    assert [row[1] for row in rows] == ['Bus Ticket', 'Therapy21', 'Thing', 'Cash']
+    assert rows[-1][2:] == ['-20,00', 'inne', '2023-01-02']
+
+
+def test_fetch_and_export_within_a_memory_budget(test_db, tmp_path):
+    """
+    Test that a budgeted export spills the dedup set and the new rows, and writes what an unbounded one writes.
+    """
+    with sqlite3.connect(test_db) as conn:
+        conn.executemany("INSERT INTO transactions VALUES (?, ?, 1.5, '4', ?)",
+                         [(i, f'Row {i}', 1672617600 + i) for i in range(100, 3100)])
+    history = [[str(i), 'old', '1,00', 'inne', '2023-01-01'] for i in range(100, 2100)]
+    for directory in ('bounded', 'unbounded'):
+        os.makedirs(tmp_path / directory)
+        CSVHandler.rewrite_csv(str(tmp_path / directory / config.TRANSACTION_HISTORY_FILE), config.COLUMN_ORDER,
+                               history)
+
+    bounded = TransactionExporter(test_db, str(tmp_path / 'bounded'), date_from='2023-01-02', max_memory=2**15)
+    bounded.fetch_and_export()
+    TransactionExporter(test_db, str(tmp_path / 'unbounded'), date_from='2023-01-02').fetch_and_export()
+
+    for file_name in (config.NEW_TRANSACTION_FILE, config.TRANSACTION_HISTORY_FILE):
+        with open(tmp_path / 'bounded' / file_name, encoding='utf-8') as bounded_file, \
+                open(tmp_path / 'unbounded' / file_name, encoding='utf-8') as unbounded_file:
+            assert bounded_file.read() == unbounded_file.read()
+    assert len(CSVHandler.read_existing_csv(str(tmp_path / 'bounded' / config.NEW_TRANSACTION_FILE))) == 1003
+    assert [stage.stage for stage in bounded.memory_report.stages] == ['read exported ids', 'fetch and diff', 'write']